@@ -1,44 +1,27 @@
-import json
+import os
+import sys
 from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType
-from sentence_transformers import SentenceTransformer
 from pymilvus import utility
 
+# Shared embedding registry lives with the backend agents
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from retrieval.compression import create_dense_index, dense_fields
+from retrieval.embed_pool import embed_workers
+from retrieval.embeddings import get_model
+from retrieval.fallback import FallbackWriter
+from retrieval.filters import create_scalar_indexes, normalize_date
+from retrieval.hybrid import TEXT_FIELD, bm25_fields, bm25_function, create_bm25_index, search_text
+from retrieval.incremental import HASH_FIELD, can_sync, content_hash_fields, sync_collection
+from retrieval.ingest import IngestStats, read_records
+from retrieval.milvus import NON_OUTPUT_FIELDS
+from retrieval.semantic_cache import mark_collection_changed
+
 # Milvus Config
 MILVUS_HOSTS = ["172.17.204.5", "127.0.0.1"]  # Try multiple hosts
 MILVUS_PORT = "19530"
 COLLECTION_NAME = "change_request_history"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
-# Connect to Milvus with error handling and fallback hosts
-connection_successful = False
-for host in MILVUS_HOSTS:
-    try:
-        print(f"Trying to connect to {host}:{MILVUS_PORT}")
-        connections.connect(
-            alias="default",
-            host=host, 
-            port=MILVUS_PORT,
-            timeout=10
-        )
-        print(f"✅ Connected to Milvus at {host}:{MILVUS_PORT}")
-        MILVUS_HOST = host  # Store successful host for later use
-        connection_successful = True
-        break
-    except Exception as e:
-        print(f"❌ Failed to connect to {host}:{MILVUS_PORT}: {e}")
-        continue
-
-if not connection_successful:
-    print("❌ Could not connect to Milvus on any host")
-    print("Please check:")
-    print("1. Container health: docker ps")
-    print("2. Container logs: docker logs milvus-standalone") 
-    print("3. Try restarting: docker restart milvus-standalone")
-    exit(1)
-
-# Load model
-model = SentenceTransformer(EMBEDDING_MODEL)
-
 # Define schema for Change Requests
 fields = [
     FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
@@ -65,74 +48,30 @@ fields = [
     FieldSchema(name="created_by", dtype=DataType.VARCHAR, max_length=100),
     FieldSchema(name="closed_by", dtype=DataType.VARCHAR, max_length=100),
     FieldSchema(name="domain", dtype=DataType.VARCHAR, max_length=50),
-    FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384)
+    # Hash of the normalized record, so INGEST_MODE=incremental re-embeds only what changed
+    *content_hash_fields(),
+    # FLOAT_VECTOR "embedding", or its compressed form when VECTOR_STORAGE is sq8/binary
+    *dense_fields(384),
+    # Raw text for the server-side BM25 index used by hybrid search
+    *bm25_fields()
 ]
 
-schema = CollectionSchema(fields, description="ServiceNow Change Requests with embeddings")
-
-# Drop if exists and create new
-if utility.has_collection(COLLECTION_NAME):
-    Collection(COLLECTION_NAME).drop()
-    print(f"Dropped existing collection: {COLLECTION_NAME}")
-
-collection = Collection(name=COLLECTION_NAME, schema=schema)
-
-# Create index
-index_params = {
-    "index_type": "IVF_FLAT",
-    "metric_type": "COSINE",
-    "params": {"nlist": 128}
-}
-
-collection.create_index(
-    field_name="embedding",
-    index_params=index_params
+schema = CollectionSchema(
+    fields,
+    description="ServiceNow Change Requests with embeddings",
+    functions=[bm25_function()]
 )
 
-# Load the collection
-collection.load()
-
-# Load data from ServiceNow Change Request JSON
+# Load data from ServiceNow Change Request JSON (array, wrapped array or NDJSON)
 # Update this path to your change request JSON file
 json_file_path = "E:\\stack-overflow-scraping\\snow\\change_request_data.json"
 
-try:
-    with open(json_file_path) as f:
-        data = json.load(f)
-except FileNotFoundError:
-    print(f"❌ File not found: {json_file_path}")
-    print("Please update the json_file_path variable to point to your change request JSON file")
-    exit(1)
-
-# Prepare data lists
-numbers = []
-short_descriptions = []
-descriptions = []
-types = []
-states = []
-impacts = []
-urgencies = []
-priorities = []
-requested_bys = []
-assigned_tos = []
-assignment_groups = []
-configuration_items = []
-planned_start_dates = []
-planned_end_dates = []
-change_plans = []
-backout_plans = []
-test_plans = []
-implementation_plans = []
-justifications = []
-cab_requireds = []
-created_bys = []
-closed_bys = []
-domains = []
-embeddings = []
-
-print("Processing Change Request data...")
-
-for i, item in enumerate(data):
+# Entity columns in schema order, before the vector; also what the fallback index keeps
+scalar_fields = [field.name for field in fields if field.name not in NON_OUTPUT_FIELDS]
+
+
+def normalize_change_request(item):
+    """Milvus row and embedding text for one exported change request."""
     # Create comprehensive text for embedding from key fields
     embedding_text_parts = [
         item.get('Short description', ''),
@@ -145,87 +84,137 @@ for i, item in enumerate(data):
         item.get('Backout plan', ''),
         item.get('Test plan', '')
     ]
-    
+
     # Filter out empty parts and join
     embedding_text = '. '.join([part for part in embedding_text_parts if part and part != 'NA'])
-    
-    # Generate embedding
-    emb = model.encode(embedding_text).tolist()
-    
+
     # Extract data with fallbacks for missing values
-    numbers.append(item.get("Number", ""))
-    short_descriptions.append(item.get("Short description", ""))
-    descriptions.append(item.get("Description", ""))
-    types.append(item.get("Type", ""))
-    states.append(item.get("State", ""))
-    impacts.append(item.get("Impact", ""))
-    urgencies.append(item.get("Urgency", ""))
-    priorities.append(item.get("Priority", ""))  # Some change requests might have priority
-    requested_bys.append(item.get("Requested by", ""))
-    assigned_tos.append(item.get("Assigned to", ""))
-    assignment_groups.append(item.get("Assignment group", ""))
-    configuration_items.append(item.get("Configuration item", ""))
-    planned_start_dates.append(item.get("Planned start date", ""))
-    planned_end_dates.append(item.get("Planned end date", ""))
-    change_plans.append(item.get("Change plan", ""))
-    backout_plans.append(item.get("Backout plan", ""))
-    test_plans.append(item.get("Test plan", ""))
-    implementation_plans.append(item.get("Implementation plan", ""))
-    justifications.append(item.get("Justification", ""))
-    cab_requireds.append(bool(item.get("CAB required", False)))
-    created_bys.append(item.get("Created by", ""))
-    closed_bys.append(item.get("Closed by", ""))
-    domains.append(item.get("Domain", ""))
-    embeddings.append(emb)
-    
-    if (i + 1) % 10 == 0:
-        print(f"Processed {i + 1} change requests...")
-
-# Insert data
-entities = [
-    numbers,
-    short_descriptions,
-    descriptions,
-    types,
-    states,
-    impacts,
-    urgencies,
-    priorities,
-    requested_bys,
-    assigned_tos,
-    assignment_groups,
-    configuration_items,
-    planned_start_dates,
-    planned_end_dates,
-    change_plans,
-    backout_plans,
-    test_plans,
-    implementation_plans,
-    justifications,
-    cab_requireds,
-    created_bys,
-    closed_bys,
-    domains,
-    embeddings
-]
+    row = {
+        "number": item.get("Number", ""),
+        "short_description": item.get("Short description", ""),
+        "description": item.get("Description", ""),
+        "type": item.get("Type", ""),
+        "state": item.get("State", ""),
+        "impact": item.get("Impact", ""),
+        "urgency": item.get("Urgency", ""),
+        "priority": item.get("Priority", ""),  # Some change requests might have priority
+        "requested_by": item.get("Requested by", ""),
+        "assigned_to": item.get("Assigned to", ""),
+        "assignment_group": item.get("Assignment group", ""),
+        "configuration_item": item.get("Configuration item", ""),
+        "planned_start_date": normalize_date(item.get("Planned start date", "")),
+        "planned_end_date": normalize_date(item.get("Planned end date", "")),
+        "change_plan": item.get("Change plan", ""),
+        "backout_plan": item.get("Backout plan", ""),
+        "test_plan": item.get("Test plan", ""),
+        "implementation_plan": item.get("Implementation plan", ""),
+        "justification": item.get("Justification", ""),
+        "cab_required": bool(item.get("CAB required", False)),
+        "created_by": item.get("Created by", ""),
+        "closed_by": item.get("Closed by", ""),
+        "domain": item.get("Domain", ""),
+        TEXT_FIELD: search_text(embedding_text),
+    }
+    return row, embedding_text
+
+
+# Everything that connects, creates or writes stays under this guard: with
+# INGEST_EMBED_WORKERS > 1 the embedding workers are spawned processes that
+# import this script again
+if __name__ == "__main__":
+    # Connect to Milvus with error handling and fallback hosts
+    connection_successful = False
+    for host in MILVUS_HOSTS:
+        try:
+            print(f"Trying to connect to {host}:{MILVUS_PORT}")
+            connections.connect(
+                alias="default",
+                host=host, 
+                port=MILVUS_PORT,
+                timeout=10
+            )
+            print(f"✅ Connected to Milvus at {host}:{MILVUS_PORT}")
+            MILVUS_HOST = host  # Store successful host for later use
+            connection_successful = True
+            break
+        except Exception as e:
+            print(f"❌ Failed to connect to {host}:{MILVUS_PORT}: {e}")
+            continue
+
+    if not connection_successful:
+        print("❌ Could not connect to Milvus on any host")
+        print("Please check:")
+        print("1. Container health: docker ps")
+        print("2. Container logs: docker logs milvus-standalone") 
+        print("3. Try restarting: docker restart milvus-standalone")
+        exit(1)
+
+    # Load the model up front only when encoding in-process; pool workers load their own
+    if embed_workers() <= 1:
+        get_model(EMBEDDING_MODEL)
+
+    # INGEST_MODE=incremental syncs the existing collection by change number;
+    # otherwise drop if exists and create new
+    incremental = can_sync(COLLECTION_NAME, "number")
+    if incremental:
+        collection = Collection(COLLECTION_NAME)
+    else:
+        if utility.has_collection(COLLECTION_NAME):
+            Collection(COLLECTION_NAME).drop()
+            print(f"Dropped existing collection: {COLLECTION_NAME}")
+
+        collection = Collection(name=COLLECTION_NAME, schema=schema)
+
+        # Create index (retrieval.tuning config; IVF_FLAT nlist=128 until tuned)
+        create_dense_index(collection, COLLECTION_NAME)
+        create_bm25_index(collection)
+
+        # Scalar indexes so search filters prune candidates before the vector search
+        create_scalar_indexes(
+            collection,
+            ["state", "type", "configuration_item", "assignment_group", "domain", "planned_start_date"]
+        )
+
+    # Load the collection
+    collection.load()
+
+    if not os.path.exists(json_file_path):
+        print(f"❌ File not found: {json_file_path}")
+        print("Please update the json_file_path variable to point to your change request JSON file")
+        exit(1)
+
+    print("Processing Change Request data...")
 
-try:
-    collection.insert(entities)
-    print(f"✅ Successfully inserted {len(numbers)} ServiceNow Change Requests into Milvus collection '{COLLECTION_NAME}'")
+    # Stream the export through normalize -> embed -> insert, INGEST_STREAM_ROWS records at a
+    # time, so memory follows the batch size rather than the size of the export; in
+    # incremental mode only new and changed change requests get that far. Inserts go
+    # in bounded chunks (INGEST_CHUNK_ROWS / INGEST_CHUNK_MB) to stay under the gRPC limit
+    ingest_stats = IngestStats()
+    try:
+        # Full-precision local copy keyed by primary key: fallback search while Milvus is
+        # unreachable, and re-ranking when the vectors in Milvus are compressed
+        report = sync_collection(
+            collection, COLLECTION_NAME, read_records(json_file_path), normalize_change_request,
+            scalar_fields + [HASH_FIELD], "number", incremental, EMBEDDING_MODEL,
+            fallback=FallbackWriter(COLLECTION_NAME, scalar_fields), stats=ingest_stats,
+        )
+        if report.changed:
+            mark_collection_changed(COLLECTION_NAME)
+        print(f"✅ Synced ServiceNow Change Requests into Milvus collection '{COLLECTION_NAME}': {report.summary()}")
+        print(f"[Ingest] {ingest_stats.summary()}")
     
-    # Print some stats
-    print(f"\nSample Change Request: {numbers[0]} - {short_descriptions[0]}")
-    print(f"Collection stats: {collection.num_entities} entities")
+        # Print some stats
+        print(f"Collection stats: {collection.num_entities} entities")
     
-    # Print schema info
-    print(f"\nCollection schema created with fields:")
-    for field in fields:
-        if field.name != "embedding":
-            print(f"  - {field.name}: {field.dtype}")
+        # Print schema info
+        print(f"\nCollection schema created with fields:")
+        for field in fields:
+            if field.name not in ("embedding", "embedding_bits", "sparse_embedding"):
+                print(f"  - {field.name}: {field.dtype}")
     
-except Exception as e:
-    print(f"❌ Error inserting data: {e}")
-    exit(1)
+    except Exception as e:
+        print(f"❌ Error inserting data: {e}")
+        exit(1)
 
-print(f"\n🎉 Change Request data successfully loaded into Milvus!")
-print(f"You can now search for similar change requests using the collection: '{COLLECTION_NAME}'")
\ No newline at end of file
+    print(f"\n🎉 Change Request data successfully loaded into Milvus!")
+    print(f"You can now search for similar change requests using the collection: '{COLLECTION_NAME}'")
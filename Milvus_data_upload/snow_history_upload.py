@@ -1,34 +1,28 @@
-import json
+import os
+import sys
 from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType
-from sentence_transformers import SentenceTransformer
 from pymilvus import utility
 
+# Shared embedding registry lives with the backend agents
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from retrieval.compression import create_dense_index, dense_fields
+from retrieval.embed_pool import embed_workers
+from retrieval.embeddings import get_model
+from retrieval.fallback import FallbackWriter
+from retrieval.filters import create_scalar_indexes, normalize_date
+from retrieval.hybrid import TEXT_FIELD, bm25_fields, bm25_function, create_bm25_index, search_text
+from retrieval.incremental import HASH_FIELD, can_sync, content_hash_fields, sync_collection
+from retrieval.ingest import IngestStats, read_records
+from retrieval.milvus import NON_OUTPUT_FIELDS
+from retrieval.partitions import insert_partitioned, partition_scheme
+from retrieval.semantic_cache import mark_collection_changed
+
 # Milvus Config - try localhost if running locally
 MILVUS_HOST = "172.17.204.5"  # or "127.0.0.1"
 MILVUS_PORT = "19530"
 COLLECTION_NAME = "incident_history"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
-# Connect to Milvus with error handling
-try:
-    connections.connect(
-         "default",
-        host=MILVUS_HOST, 
-        port=MILVUS_PORT,
-        timeout=10  # Add timeout
-    )
-    print(f"✅ Connected to Milvus at {MILVUS_HOST}:{MILVUS_PORT}")
-except Exception as e:
-    print(f"❌ Failed to connect to Milvus: {e}")
-    print("Please check:")
-    print("1. Is Milvus server running?")
-    print("2. Is the host/port correct?")
-    print("3. Are there firewall restrictions?")
-    exit(1)
-
-# Load model
-model = SentenceTransformer(EMBEDDING_MODEL)
-
 # Define schema - updated for ServiceNow incident fields
 fields = [
     FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
@@ -43,32 +37,21 @@ fields = [
     FieldSchema(name="severity", dtype=DataType.VARCHAR, max_length=50),
     FieldSchema(name="opened", dtype=DataType.VARCHAR, max_length=50),
     FieldSchema(name="opened_by", dtype=DataType.VARCHAR, max_length=100),
-    FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384)
+    FieldSchema(name="assignment_group", dtype=DataType.VARCHAR, max_length=100),
+    # Hash of the normalized record, so INGEST_MODE=incremental re-embeds only what changed
+    *content_hash_fields(),
+    # FLOAT_VECTOR "embedding", or its compressed form when VECTOR_STORAGE is sq8/binary
+    *dense_fields(384),
+    # Raw text for the server-side BM25 index used by hybrid search
+    *bm25_fields()
 ]
 
-schema = CollectionSchema(fields, description="ServiceNow incidents with embeddings")
-
-# Drop if exists and create new
-if utility.has_collection("incident_history"):
-    Collection("incident_history").drop()
-
-collection = Collection(name=COLLECTION_NAME, schema=schema)
-
-# Create index
-index_params = {
-    "index_type": "IVF_FLAT",
-    "metric_type": "COSINE",
-    "params": {"nlist": 128}
-}
-
-collection.create_index(
-    field_name="embedding",
-    index_params=index_params
+schema = CollectionSchema(
+    fields,
+    description="ServiceNow incidents with embeddings",
+    functions=[bm25_function()]
 )
 
-# Load the collection
-collection.load()
-
 # Function to parse priority/impact/urgency values to get numeric part
 def parse_priority_field(field_value):
     """Extract numeric value from fields like '1 - Critical' or return default"""
@@ -79,64 +62,109 @@ def parse_priority_field(field_value):
             return 1
     return 1
 
-# Load data from ServiceNow JSON
-with open("E:\\chatops-repo\\blcpdev1\\chatops\\OnPrem\\pre-process\\processed_data\\xlconversion\\incident_snow.json") as f:
-    data = json.load(f)
-
-# Prepare data lists
-numbers = []
-short_descriptions = []
-descriptions = []
-priorities = []
-states = []
-categories = []
-impacts = []
-urgencies = []
-severities = []
-openeds = []
-opened_bys = []
-embeddings = []
-
-for item in data:
+# ServiceNow JSON export (array, wrapped array or NDJSON)
+DATA_FILE = "E:\\chatops-repo\\blcpdev1\\chatops\\OnPrem\\pre-process\\processed_data\\xlconversion\\incident_snow.json"
+
+# Entity columns in schema order, before the vector; also what the fallback index keeps
+scalar_fields = [field.name for field in fields if field.name not in NON_OUTPUT_FIELDS]
+
+
+def normalize_incident(item):
+    """Milvus row and embedding text for one exported incident."""
     # Create text for embedding from key fields
     embedding_text = f"{item.get('Short description', '')}. {item.get('Description', '')}. Category: {item.get('Category', '')}. Priority: {item.get('Priority', '')}"
-    
-    # Generate embedding
-    emb = model.encode(embedding_text).tolist()
-    
+
     # Extract data with fallbacks for missing values
-    numbers.append(item.get("Number", ""))
-    short_descriptions.append(item.get("Short description", ""))
-    descriptions.append(item.get("Description", ""))
-    priorities.append(item.get("Priority", ""))
-    states.append(item.get("State", ""))
-    categories.append(item.get("Category", ""))
-    impacts.append(item.get("Impact", ""))
-    urgencies.append(item.get("Urgency", ""))
-    severities.append(item.get("Severity", ""))
-    openeds.append(item.get("Opened", ""))
-    opened_bys.append(item.get("Opened by", ""))
-    embeddings.append(emb)
-
-# Insert data
-entities = [
-    numbers,
-    short_descriptions, 
-    descriptions,
-    priorities,
-    states,
-    categories,
-    impacts,
-    urgencies,
-    severities,
-    openeds,
-    opened_bys,
-    embeddings
-]
+    row = {
+        "number": item.get("Number", ""),
+        "short_description": item.get("Short description", ""),
+        "description": item.get("Description", ""),
+        "priority": item.get("Priority", ""),
+        "state": item.get("State", ""),
+        "category": item.get("Category", ""),
+        "impact": item.get("Impact", ""),
+        "urgency": item.get("Urgency", ""),
+        "severity": item.get("Severity", ""),
+        "opened": normalize_date(item.get("Opened", "")),
+        "opened_by": item.get("Opened by", ""),
+        "assignment_group": item.get("Assignment group", ""),
+        TEXT_FIELD: search_text(f"{item.get('Number', '')} {embedding_text}"),
+    }
+    return row, embedding_text
+
+
+def insert_rows(entities, rows):
+    # One partition per opened month and/or category (INCIDENT_PARTITIONS), so searches
+    # with a time window or category only touch the partitions that can match; each
+    # partition is inserted in bounded chunks (INGEST_CHUNK_ROWS / INGEST_CHUNK_MB)
+    return insert_partitioned(
+        collection, entities, [row["opened"] for row in rows], [row["category"] for row in rows], stats=ingest_stats
+    )
 
-collection.insert(entities)
-print(f"✅ Inserted {len(numbers)} ServiceNow incidents into Milvus collection '{COLLECTION_NAME}'")
 
-# Optional: Print some stats
-print(f"Sample incident: {numbers[0]} - {short_descriptions[0]}")
-print(f"Collection stats: {collection.num_entities} entities")
\ No newline at end of file
+# Everything that connects, creates or writes stays under this guard: with
+# INGEST_EMBED_WORKERS > 1 the embedding workers are spawned processes that
+# import this script again
+if __name__ == "__main__":
+    # Connect to Milvus with error handling
+    try:
+        connections.connect(
+             "default",
+            host=MILVUS_HOST, 
+            port=MILVUS_PORT,
+            timeout=10  # Add timeout
+        )
+        print(f"✅ Connected to Milvus at {MILVUS_HOST}:{MILVUS_PORT}")
+    except Exception as e:
+        print(f"❌ Failed to connect to Milvus: {e}")
+        print("Please check:")
+        print("1. Is Milvus server running?")
+        print("2. Is the host/port correct?")
+        print("3. Are there firewall restrictions?")
+        exit(1)
+
+    # Load the model up front only when encoding in-process; pool workers load their own
+    if embed_workers() <= 1:
+        get_model(EMBEDDING_MODEL)
+
+    # INGEST_MODE=incremental syncs the existing collection by incident number;
+    # otherwise drop if exists and create new
+    incremental = can_sync(COLLECTION_NAME, "number")
+    if incremental:
+        collection = Collection(COLLECTION_NAME)
+    else:
+        if utility.has_collection("incident_history"):
+            Collection("incident_history").drop()
+
+        collection = Collection(name=COLLECTION_NAME, schema=schema)
+
+        # Create index (retrieval.tuning config; IVF_FLAT nlist=128 until tuned)
+        create_dense_index(collection, COLLECTION_NAME)
+        create_bm25_index(collection)
+
+        # Scalar indexes so search filters prune candidates before the vector search
+        create_scalar_indexes(collection, ["category", "state", "priority", "opened"])
+
+    # Load the collection, every partition included so a sync sees all existing rows
+    collection.load()
+
+    # Stream the export through normalize -> embed -> insert, INGEST_STREAM_ROWS records at a
+    # time, so memory follows the batch size rather than the size of the export; in
+    # incremental mode only new and changed incidents get that far. The full-precision
+    # local copy keyed by primary key (fallback search while Milvus is unreachable,
+    # re-ranking when the vectors in Milvus are compressed) is spooled alongside
+    ingest_stats = IngestStats()
+    report = sync_collection(
+        collection, COLLECTION_NAME, read_records(DATA_FILE), normalize_incident, scalar_fields + [HASH_FIELD], "number",
+        incremental, EMBEDDING_MODEL, insert=insert_rows, fallback=FallbackWriter(COLLECTION_NAME, scalar_fields),
+        stats=ingest_stats,
+    )
+    # Partitions created after load() are not loaded yet
+    collection.load()
+    if report.changed:
+        mark_collection_changed(COLLECTION_NAME)
+    print(f"✅ Synced ServiceNow incidents into Milvus collection '{COLLECTION_NAME}': {report.summary()}")
+    print(f"[Ingest] {ingest_stats.summary()}")
+
+    # Optional: Print some stats
+    print(f"Collection stats: {collection.num_entities} entities in {len(collection.partitions)} partitions ({partition_scheme()})")
@@ -1,11 +1,30 @@
 import json
 import numpy as np
 import os
+import sys
 from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterable, Iterator, List
 import uuid
 
+# Shared embedding registry lives with the backend agents
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from retrieval.compression import (
+    BINARY_FIELD,
+    binary_search_params,
+    create_dense_index,
+    dense_fields,
+    pack_binary,
+    vector_storage,
+)
+from retrieval.embeddings import encode, get_model
+from retrieval.fallback import FallbackWriter
+from retrieval.filters import create_scalar_indexes
+from retrieval.hybrid import TEXT_FIELD, bm25_fields, bm25_function, create_bm25_index, search_text
+from retrieval.incremental import HASH_FIELD, SyncReport, can_sync, content_hash_fields, sync_collection
+from retrieval.ingest import IngestStats, embed_texts, read_records
+from retrieval.semantic_cache import mark_collection_changed
+from retrieval.tuning import search_params
+
 # Configuration
 MILVUS_HOST = "172.17.204.5"
 MILVUS_PORT = "19530"
@@ -13,10 +32,15 @@ EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 COLLECTION_NAME = "rca"
 EMBEDDING_DIM = 384  # Dimension for all-MiniLM-L6-v2 model
 JSON_FILE_PATH = r"E:\\stack-overflow-scraping\\snow\\rca_data.json"
+# Entity columns in schema order, before the vector
+RECORD_FIELDS = [
+    "id", "title", "description", "category", "severity",
+    "symptoms", "root_cause_analysis", "resolution_steps", "prevention", HASH_FIELD,
+]
 
 class MilvusRCAUploader:
     def __init__(self):
-        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        self.embedding_model = get_model(EMBEDDING_MODEL)
         self.connect_to_milvus()
     
     def connect_to_milvus(self):
@@ -47,225 +71,189 @@ class MilvusRCAUploader:
             FieldSchema(name="root_cause_analysis", dtype=DataType.VARCHAR, max_length=3000),
             FieldSchema(name="resolution_steps", dtype=DataType.VARCHAR, max_length=5000),
             FieldSchema(name="prevention", dtype=DataType.VARCHAR, max_length=2000),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=EMBEDDING_DIM)
+            # Hash of the normalized record, so INGEST_MODE=incremental re-embeds only what changed
+            *content_hash_fields(),
+            # FLOAT_VECTOR "embedding", or its compressed form when VECTOR_STORAGE is sq8/binary
+            *dense_fields(EMBEDDING_DIM),
+            # Raw text for the server-side BM25 index used by hybrid search
+            *bm25_fields()
         ]
         
-        schema = CollectionSchema(fields, f"RCA Knowledge Base Collection")
+        schema = CollectionSchema(fields, f"RCA Knowledge Base Collection", functions=[bm25_function()])
         collection = Collection(COLLECTION_NAME, schema)
         
         print(f"✅ Created collection: {COLLECTION_NAME}")
         return collection
     
-    def create_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for the given texts."""
+    def create_embeddings(self, texts: List[str], stats: IngestStats = None) -> List[List[float]]:
+        """Generate embeddings for the given texts in length-sorted batches."""
         try:
-            embeddings = self.embedding_model.encode(texts)
+            embeddings = embed_texts(texts, EMBEDDING_MODEL, stats=stats)
             return embeddings.tolist()
         except Exception as e:
             print(f"❌ Error generating embeddings: {e}")
             raise
     
+    def process_record(self, problem: Dict[str, Any], i: int) -> Dict[str, Any]:
+        """Flatten one exported problem into the string fields of the collection."""
+        # Handle symptoms (can be array or string)
+        symptoms = problem.get("symptoms", [])
+        if isinstance(symptoms, list):
+            symptoms_str = " | ".join(symptoms)
+        else:
+            symptoms_str = str(symptoms)
+
+        # Handle root cause analysis (can be object or string)
+        rca = problem.get("root_cause_analysis", {})
+        if isinstance(rca, dict):
+            rca_str = f"Primary Cause: {rca.get('primary_cause', 'Unknown')}. "
+
+            # Handle investigation steps
+            investigation_steps = rca.get('investigation_steps', [])
+            if isinstance(investigation_steps, list):
+                rca_str += f"Investigation Steps: {' | '.join(investigation_steps)}. "
+
+            # Handle common causes
+            common_causes = rca.get('common_causes', [])
+            if isinstance(common_causes, list):
+                rca_str += f"Common Causes: {' | '.join(common_causes)}"
+        else:
+            rca_str = str(rca)
+
+        # Handle resolution steps (can be array of objects or string)
+        resolution_steps = problem.get("resolution_steps", [])
+        resolution_str = ""
+
+        if isinstance(resolution_steps, list) and len(resolution_steps) > 0:
+            if isinstance(resolution_steps[0], dict):
+                # Structured resolution steps
+                for step in resolution_steps:
+                    step_num = step.get('step', '')
+                    action = step.get('action', '')
+                    command = step.get('command', '')
+                    expected = step.get('expected_output', '')
+                    resolution_str += f"Step {step_num}: {action} - Command: {command} - Expected: {expected} | "
+            else:
+                # Simple string array
+                resolution_str = " | ".join([str(step) for step in resolution_steps])
+        else:
+            resolution_str = str(resolution_steps)
+
+        # Handle prevention (can be array or string)
+        prevention = problem.get("prevention", [])
+        if isinstance(prevention, list):
+            prevention_str = " | ".join(prevention)
+        else:
+            prevention_str = str(prevention)
+
+        # Generate ID if not provided
+        record_id = problem.get("id")
+        if not record_id:
+            record_id = f"RCA-{i+1:03d}"
+
+        return {
+            "id": record_id,
+            "title": problem.get("title", "Unknown Issue"),
+            "description": problem.get("description", ""),
+            "category": problem.get("category", "General"),
+            "severity": problem.get("severity", "Medium"),
+            "symptoms": symptoms_str,
+            "root_cause_analysis": rca_str,
+            "resolution_steps": resolution_str.rstrip(" | "),
+            "prevention": prevention_str
+        }
+    
+    def iter_data_from_json(self, json_file_path: str) -> Iterator[Dict[str, Any]]:
+        """Stream processed RCA records from a JSON file with flexible structure support.
+
+        The export may be an array, an object wrapping one under kubernetes_problems,
+        problems or rca_data, NDJSON, or a single record; it is read incrementally.
+        """
+        # Check if file exists and is not empty
+        if not os.path.exists(json_file_path):
+            raise FileNotFoundError(f"JSON file not found: {json_file_path}")
+        
+        if os.path.getsize(json_file_path) == 0:
+            raise ValueError(f"JSON file is empty: {json_file_path}")
+        
+        print(f"📁 Loading data from: {json_file_path}")
+        processed = 0
+        for i, problem in enumerate(read_records(json_file_path)):
+            try:
+                record = self.process_record(problem, i)
+            except Exception as e:
+                print(f"⚠️ Error processing record {i+1}: {e}")
+                continue
+            print(f"✅ Processed record {i+1}: {problem.get('title', 'Unknown')}")
+            processed += 1
+            yield record
+        
+        print(f"📊 Successfully processed {processed} records")
+    
     def load_data_from_json(self, json_file_path: str) -> List[Dict[str, Any]]:
-        """Load RCA data from a JSON file with flexible structure support."""
+        """Load every processed RCA record into memory; prefer iter_data_from_json for large exports."""
         try:
-            # Check if file exists and is not empty
-            if not os.path.exists(json_file_path):
-                raise FileNotFoundError(f"JSON file not found: {json_file_path}")
-            
-            if os.path.getsize(json_file_path) == 0:
-                raise ValueError(f"JSON file is empty: {json_file_path}")
-            
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                if not content:
-                    raise ValueError(f"JSON file contains no content: {json_file_path}")
-                
-                data = json.loads(content)
-            
-            print(f"📁 Loading data from: {json_file_path}")
-            processed_data = []
-            
-            # Support multiple JSON structures
-            problems_list = []
-            
-            # Check different possible structures
-            if "kubernetes_problems" in data:
-                problems_list = data["kubernetes_problems"]
-                print(f"Found {len(problems_list)} kubernetes problems")
-            elif "problems" in data:
-                problems_list = data["problems"]
-                print(f"Found {len(problems_list)} problems")
-            elif "rca_data" in data:
-                problems_list = data["rca_data"]
-                print(f"Found {len(problems_list)} RCA records")
-            elif isinstance(data, list):
-                problems_list = data
-                print(f"Found {len(problems_list)} records in array format")
-            else:
-                print("⚠️ Unknown JSON structure, treating as single record")
-                problems_list = [data]
-            
-            for i, problem in enumerate(problems_list):
-                try:
-                    # Handle symptoms (can be array or string)
-                    symptoms = problem.get("symptoms", [])
-                    if isinstance(symptoms, list):
-                        symptoms_str = " | ".join(symptoms)
-                    else:
-                        symptoms_str = str(symptoms)
-                    
-                    # Handle root cause analysis (can be object or string)
-                    rca = problem.get("root_cause_analysis", {})
-                    if isinstance(rca, dict):
-                        rca_str = f"Primary Cause: {rca.get('primary_cause', 'Unknown')}. "
-                        
-                        # Handle investigation steps
-                        investigation_steps = rca.get('investigation_steps', [])
-                        if isinstance(investigation_steps, list):
-                            rca_str += f"Investigation Steps: {' | '.join(investigation_steps)}. "
-                        
-                        # Handle common causes
-                        common_causes = rca.get('common_causes', [])
-                        if isinstance(common_causes, list):
-                            rca_str += f"Common Causes: {' | '.join(common_causes)}"
-                    else:
-                        rca_str = str(rca)
-                    
-                    # Handle resolution steps (can be array of objects or string)
-                    resolution_steps = problem.get("resolution_steps", [])
-                    resolution_str = ""
-                    
-                    if isinstance(resolution_steps, list) and len(resolution_steps) > 0:
-                        if isinstance(resolution_steps[0], dict):
-                            # Structured resolution steps
-                            for step in resolution_steps:
-                                step_num = step.get('step', '')
-                                action = step.get('action', '')
-                                command = step.get('command', '')
-                                expected = step.get('expected_output', '')
-                                resolution_str += f"Step {step_num}: {action} - Command: {command} - Expected: {expected} | "
-                        else:
-                            # Simple string array
-                            resolution_str = " | ".join([str(step) for step in resolution_steps])
-                    else:
-                        resolution_str = str(resolution_steps)
-                    
-                    # Handle prevention (can be array or string)
-                    prevention = problem.get("prevention", [])
-                    if isinstance(prevention, list):
-                        prevention_str = " | ".join(prevention)
-                    else:
-                        prevention_str = str(prevention)
-                    
-                    # Generate ID if not provided
-                    record_id = problem.get("id")
-                    if not record_id:
-                        record_id = f"RCA-{i+1:03d}"
-                    
-                    processed_data.append({
-                        "id": record_id,
-                        "title": problem.get("title", "Unknown Issue"),
-                        "description": problem.get("description", ""),
-                        "category": problem.get("category", "General"),
-                        "severity": problem.get("severity", "Medium"),
-                        "symptoms": symptoms_str,
-                        "root_cause_analysis": rca_str,
-                        "resolution_steps": resolution_str.rstrip(" | "),
-                        "prevention": prevention_str
-                    })
-                    
-                    print(f"✅ Processed record {i+1}: {problem.get('title', 'Unknown')}")
-                    
-                except Exception as e:
-                    print(f"⚠️ Error processing record {i+1}: {e}")
-                    continue
-            
-            print(f"📊 Successfully processed {len(processed_data)} records")
-            return processed_data
-            
+            return list(self.iter_data_from_json(json_file_path))
         except FileNotFoundError:
             print(f"❌ JSON file not found: {json_file_path}")
             raise
-        except ValueError as e:
-            print(f"❌ {e}")
-            raise
         except json.JSONDecodeError as e:
             print(f"❌ Invalid JSON format: {e}")
             print(f"💡 Please check your JSON file syntax at line {e.lineno if hasattr(e, 'lineno') else 'unknown'}")
             raise
+        except ValueError as e:
+            print(f"❌ {e}")
+            raise
         except Exception as e:
             print(f"❌ Error loading JSON file: {e}")
             raise
     
-    def upload_data_to_milvus(self, data: List[Dict[str, Any]]):
-        """Upload processed data to Milvus collection."""
+    def upload_data_to_milvus(self, data: Iterable[Dict[str, Any]], incremental: bool = False) -> SyncReport:
+        """Upload processed records to the Milvus collection; returns the sync counts.
+
+        data may be a generator: records are embedded and inserted INGEST_STREAM_ROWS
+        at a time, so memory follows the batch size rather than the size of the export.
+        With incremental, the existing collection is synced by RCA id instead: only new
+        and changed records are embedded, and records gone from the export are deleted.
+        """
         collection = Collection(COLLECTION_NAME)
-        
-        # Prepare data for insertion
-        ids = []
-        titles = []
-        descriptions = []
-        categories = []
-        severities = []
-        symptoms_list = []
-        root_cause_analyses = []
-        resolution_steps_list = []
-        preventions = []
-        embedding_texts = []
-        
-        for item in data:
-            ids.append(item["id"])
-            titles.append(item["title"])
-            descriptions.append(item["description"])
-            categories.append(item["category"])
-            severities.append(item["severity"])
-            symptoms_list.append(item["symptoms"])
-            root_cause_analyses.append(item["root_cause_analysis"])
-            resolution_steps_list.append(item["resolution_steps"])
-            preventions.append(item["prevention"])
-            
+
+        def normalize(item):
             # Create comprehensive text for embedding
             embedding_text = f"{item['title']} {item['description']} {item['symptoms']} {item['category']}"
-            embedding_texts.append(embedding_text)
-        
-        # Generate embeddings
-        print("🔄 Generating embeddings...")
-        embeddings = self.create_embeddings(embedding_texts)
+            row = dict(item)
+            row[TEXT_FIELD] = search_text(f"{embedding_text} {item['root_cause_analysis']}")
+            return row, embedding_text
         
-        # Prepare data for insertion
-        data_to_insert = [
-            ids,
-            titles,
-            descriptions,
-            categories,
-            severities,
-            symptoms_list,
-            root_cause_analyses,
-            resolution_steps_list,
-            preventions,
-            embeddings
-        ]
-        
-        # Insert data
-        print(f"📤 Uploading {len(data)} records to Milvus...")
-        mr = collection.insert(data_to_insert)
-        print(f"✅ Inserted {len(mr.primary_keys)} records")
+        print(f"📤 Uploading records to Milvus...")
+        ingest_stats = IngestStats()
+        # Full-precision local copy: fallback search while Milvus is unreachable,
+        # and re-ranking when the vectors in Milvus are compressed
+        report = sync_collection(
+            collection, COLLECTION_NAME, data, normalize, RECORD_FIELDS, "id", incremental, EMBEDDING_MODEL,
+            fallback=FallbackWriter(COLLECTION_NAME, RECORD_FIELDS[1:-1]), stats=ingest_stats,
+        )
+        if report.changed:
+            mark_collection_changed(COLLECTION_NAME)
+        print(f"✅ Synced records: {report.summary()}")
+        print(f"[Ingest] {ingest_stats.summary()}")
+        if incremental:
+            # Indexes already exist and the collection is loaded
+            return report
         
         # Create index
         print("🔄 Creating index...")
-        index_params = {
-            "metric_type": "COSINE",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 128}
-        }
-        collection.create_index("embedding", index_params)
+        # retrieval.tuning config; IVF_FLAT nlist=128 until tuned
+        create_dense_index(collection, COLLECTION_NAME)
+        create_bm25_index(collection)
+        create_scalar_indexes(collection, ["category", "severity"])
         print("✅ Index created")
         
         # Load collection
         collection.load()
         print("✅ Collection loaded and ready for search")
         
-        return mr
+        return report
     
     def test_search(self, query: str = "pod pending"):
         """Test search functionality."""
@@ -273,13 +261,17 @@ class MilvusRCAUploader:
         collection.load()
         
         # Generate embedding for query
-        query_embedding = self.embedding_model.encode([query]).tolist()
+        query_embedding = encode([query], EMBEDDING_MODEL)
+        if vector_storage() == "binary":
+            data, anns_field, params = pack_binary(query_embedding), BINARY_FIELD, binary_search_params()
+        else:
+            data, anns_field, params = query_embedding.tolist(), "embedding", search_params(COLLECTION_NAME)
         
         # Search
         results = collection.search(
-            query_embedding,
-            "embedding",
-            {"metric_type": "COSINE", "params": {"nprobe": 10}},
+            data,
+            anns_field,
+            params,
             limit=2,
             output_fields=["title", "category", "severity", "description"]
         )
@@ -298,21 +290,24 @@ def main():
     
     uploader = MilvusRCAUploader()
     
-    # Create collection
-    collection = uploader.create_rca_collection()
+    # INGEST_MODE=incremental syncs the existing collection by RCA id; otherwise create it afresh
+    incremental = can_sync(COLLECTION_NAME, "id")
+    if incremental:
+        collection = Collection(COLLECTION_NAME)
+        collection.load()
+    else:
+        collection = uploader.create_rca_collection()
     
     try:
-        # Load data from JSON file
+        # Stream records from the JSON file straight into Milvus
         print(f"📁 Loading RCA data from: {JSON_FILE_PATH}")
-        rca_data = uploader.load_data_from_json(JSON_FILE_PATH)
+        report = uploader.upload_data_to_milvus(uploader.iter_data_from_json(JSON_FILE_PATH), incremental)
+        uploaded = report.inserted + report.updated + report.unchanged
         
-        if not rca_data:
+        if not uploaded:
             print("❌ No data loaded from JSON file")
             return
         
-        # Upload data
-        uploader.upload_data_to_milvus(rca_data)
-        
         # Test search with some sample queries
         test_queries = [
             "pod stuck pending state",
@@ -326,7 +321,7 @@ def main():
             uploader.test_search(query)
         
         print(f"\n🎉 RCA data upload completed successfully!")
-        print(f"📈 Collection '{COLLECTION_NAME}' is ready with {len(rca_data)} records")
+        print(f"📈 Collection '{COLLECTION_NAME}' is ready with {uploaded} records")
         print(f"🔗 Data loaded from: {JSON_FILE_PATH}")
         
     except FileNotFoundError:
@@ -1,20 +1,27 @@
-import json
+import os
+import sys
 from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType
-from sentence_transformers import SentenceTransformer
 from pymilvus import utility
 
+# Shared embedding registry lives with the backend agents
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from retrieval.compression import create_dense_index, dense_fields
+from retrieval.embed_pool import embed_workers
+from retrieval.embeddings import get_model
+from retrieval.fallback import FallbackWriter
+from retrieval.filters import create_scalar_indexes
+from retrieval.hybrid import TEXT_FIELD, bm25_fields, bm25_function, create_bm25_index, search_text
+from retrieval.incremental import HASH_FIELD, can_sync, content_hash_fields, sync_collection
+from retrieval.ingest import IngestStats, read_records
+from retrieval.milvus import NON_OUTPUT_FIELDS
+from retrieval.semantic_cache import mark_collection_changed
+
 # Milvus Config
 MILVUS_HOST = "172.17.204.5"
 MILVUS_PORT = "19530"
 COLLECTION_NAME = "incident_history"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
-# Connect to Milvus
-connections.connect(host=MILVUS_HOST, port=MILVUS_PORT)
-
-# Load model
-model = SentenceTransformer(EMBEDDING_MODEL)
-
 # Define schema
 fields = [
     FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
@@ -22,47 +29,74 @@ fields = [
     FieldSchema(name="description", dtype=DataType.VARCHAR, max_length=1000),
     FieldSchema(name="urgency", dtype=DataType.INT64),
     FieldSchema(name="impact", dtype=DataType.INT64),
-    FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384)
+    # Hash of the normalized record, so INGEST_MODE=incremental re-embeds only what changed
+    *content_hash_fields(),
+    # FLOAT_VECTOR "embedding", or its compressed form when VECTOR_STORAGE is sq8/binary
+    *dense_fields(384),
+    # Raw text for the server-side BM25 index used by hybrid search
+    *bm25_fields()
 ]
-schema = CollectionSchema(fields, description="K8s incidents with embeddings")
+schema = CollectionSchema(fields, description="K8s incidents with embeddings", functions=[bm25_function()])
 
-# Drop if exists and create new
-if utility.has_collection("incident_history"):
-    Collection("incident_history").drop()
+# Entity columns in schema order, before the vector; also what the fallback index keeps
+scalar_fields = [field.name for field in fields if field.name not in NON_OUTPUT_FIELDS]
 
-collection = Collection(name=COLLECTION_NAME, schema=schema)
 
-index_params = {
-    "index_type": "IVF_FLAT",
-    "metric_type": "COSINE",
-    "params": {"nlist": 128}
-}
-collection.create_index(
-    field_name="embedding",
-    index_params=index_params
-)
+def normalize_incident(item):
+    text = f"{item['title']}. {item['description']}"
+    row = {
+        "title": item["title"],
+        "description": item["description"],
+        "urgency": item.get("urgency", 1),
+        "impact": item.get("impact", 1),
+        TEXT_FIELD: search_text(text),
+    }
+    return row, text
 
-# Load the collection
-collection.load()
 
+# Everything that connects, creates or writes stays under this guard: with
+# INGEST_EMBED_WORKERS > 1 the embedding workers are spawned processes that
+# import this script again
+if __name__ == "__main__":
+    # Connect to Milvus
+    connections.connect(host=MILVUS_HOST, port=MILVUS_PORT)
 
-# Load data
-with open("E:\\stack-overflow-scraping\\snow\\snow_history.json") as f:
-    data = json.load(f)
+    # Load the model up front only when encoding in-process; pool workers load their own
+    if embed_workers() <= 1:
+        get_model(EMBEDDING_MODEL)
 
-titles, descriptions, urgencies, impacts, embeddings = [], [], [], [], []
+    # INGEST_MODE=incremental syncs the existing collection; these incidents have no
+    # number, so the title is the key. Otherwise drop if exists and create new
+    incremental = can_sync(COLLECTION_NAME, "title")
+    if incremental:
+        collection = Collection(COLLECTION_NAME)
+    else:
+        if utility.has_collection("incident_history"):
+            Collection("incident_history").drop()
 
-for item in data:
-    text = f"{item['title']}. {item['description']}"
-    emb = model.encode(text).tolist()
-    titles.append(item["title"])
-    descriptions.append(item["description"])
-    urgencies.append(item.get("urgency", 1))
-    impacts.append(item.get("impact", 1))
-    embeddings.append(emb)
-
-# Insert
-entities = [titles, descriptions, urgencies, impacts, embeddings]
-collection.insert(entities)
-
-print(f"✅ Inserted {len(titles)} Kubernetes incidents into Milvus collection '{COLLECTION_NAME}'")
+        collection = Collection(name=COLLECTION_NAME, schema=schema)
+
+        # Create index (retrieval.tuning config; IVF_FLAT nlist=128 until tuned)
+        create_dense_index(collection, COLLECTION_NAME)
+        create_bm25_index(collection)
+        create_scalar_indexes(collection, ["urgency", "impact"])
+
+    # Load the collection
+    collection.load()
+
+
+    # Stream the export (array, wrapped array or NDJSON): normalize -> embed in length-sorted
+    # batches -> insert in bounded chunks, INGEST_STREAM_ROWS records at a time (retrieval.ingest).
+    # The full-precision local copy keyed by primary key (fallback search while Milvus is
+    # unreachable, re-ranking when the vectors in Milvus are compressed) is spooled alongside
+    ingest_stats = IngestStats()
+    report = sync_collection(
+        collection, COLLECTION_NAME, read_records("E:\\stack-overflow-scraping\\snow\\snow_history.json"),
+        normalize_incident, scalar_fields + [HASH_FIELD], "title", incremental, EMBEDDING_MODEL,
+        fallback=FallbackWriter(COLLECTION_NAME, scalar_fields), stats=ingest_stats,
+    )
+    if report.changed:
+        mark_collection_changed(COLLECTION_NAME)
+
+    print(f"✅ Synced Kubernetes incidents into Milvus collection '{COLLECTION_NAME}': {report.summary()}")
+    print(f"[Ingest] {ingest_stats.summary()}")
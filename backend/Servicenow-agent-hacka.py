@@ -1,4 +1,4 @@
-from typing import Annotated, Sequence, List, Literal, Dict, Any
+from typing import Annotated, Sequence, List, Literal, Dict, Any, Optional
 from pydantic import BaseModel, Field
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_community.tools.tavily_search import TavilySearchResults
@@ -9,8 +9,28 @@ from langchain_ibm import ChatWatsonx
 import os
 from dotenv import load_dotenv
 from langchain_core.tools import tool
-from pymilvus import connections, utility, Collection
-from sentence_transformers import SentenceTransformer
+from retrieval.compression import stats as compression_stats
+from retrieval.diversity import mmr_lambda, mmr_overfetch, top_k
+from retrieval.embeddings import warmup
+from retrieval.fanout import fanout_search
+from retrieval.filters import change_filters, incident_filters
+from retrieval.formatting import format_change_summary, format_fanout, format_incident_summary
+from retrieval.inference import (
+    CHANGE_INFERENCE_FIELDS,
+    INCIDENT_INFERENCE_FIELDS,
+    FieldEstimate,
+    confidence_threshold,
+    infer_fields,
+    inference_neighbors,
+)
+from retrieval.milvus import milvus
+from retrieval.query_cache import query_embedding_cache
+from retrieval.rca import find_resolution, format_resolution
+from retrieval.rca import stats as rca_stats
+from retrieval.rerank import reranker
+from retrieval.semantic_cache import semantic_cache
+from retrieval.service import CollectionNotFound, Hit, retrieval_service
+from retrieval.tuning import VECTOR_FIELD
 from langchain_mcp_adapters.client import MultiServerMCPClient
 import asyncio
 import yaml
@@ -56,7 +76,6 @@ chat_messages = []
 conversation_memory = defaultdict(lambda: {
     'pending_incident_details': {},
     'conversation_history': [],
-    'similar_incidents_cache': {},
     'user_preferences': {},
     'session_state': 'idle'  # idle, awaiting_confirmation, processing
 })
@@ -113,139 +132,145 @@ class EnhancedMessagesState(MessagesState):
 # MILVUS RETRIEVAL TOOLS
 # ============================================================================
 
-@tool
-def retrieve_similar_change_requests(query: str) -> str:
-    """Finds similar historical change requests based on a description."""
-    MILVUS_HOST = os.getenv('MILVUS_HOST', "172.17.204.5")
-    MILVUS_PORT = os.getenv('MILVUS_PORT', "19530")
-    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', "all-MiniLM-L6-v2")
-    COLLECTION_NAME = "change_request_history"
+CHANGE_REQUEST_FIELDS = [
+    "number", "short_description", "type", "impact", "urgency", 
+    "configuration_item", "change_plan", "backout_plan", "test_plan",
+    "implementation_plan", "justification", "cab_required",
+    "requested_by", "assignment_group"
+]
+
+INCIDENT_FIELDS = [
+    "number", 
+    "short_description", 
+    "description", 
+    "priority", 
+    "impact", 
+    "urgency", 
+    "state",
+    "category",
+    "opened",
+    "opened_by",
+    # Voted on by the enhancer's field inference
+    "assignment_group"
+]
+
+
+def find_similar_change_requests(
+    query: str, filters: Optional[Dict[str, Any]] = None, k: int = 2, diversity: Optional[float] = None,
+    fields: Sequence[str] = CHANGE_REQUEST_FIELDS,
+) -> List[Hit]:
+    """Similar change requests as typed hits (raw Milvus fields and scores)"""
+    return retrieval_service.search_sync(
+        "change_request_history", query, k=k, filters=filters, fields=fields, diversity=diversity
+    )
 
-    try:
-        connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
-        
-        if not utility.has_collection(COLLECTION_NAME):
-            return "Change request history collection not found."
 
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-        
-        embedding_model = SentenceTransformer(EMBEDDING_MODEL)
-        query_embedding = embedding_model.encode([query]).tolist()
-
-        results = collection.search(
-            query_embedding,
-            "embedding",
-            {"metric_type": "COSINE", "params": {"nprobe": 10}},
-            limit=2,
-            output_fields=[
-                "number", "short_description", "type", "impact", "urgency", 
-                "configuration_item", "change_plan", "backout_plan", "test_plan",
-                "implementation_plan", "justification", "cab_required",
-                "requested_by", "assignment_group"
-            ]
-        )
+def find_similar_incidents(
+    query: str, filters: Optional[Dict[str, Any]] = None, k: int = 1, diversity: Optional[float] = None,
+    fields: Sequence[str] = INCIDENT_FIELDS,
+) -> List[Hit]:
+    """Similar incidents as typed hits (raw Milvus fields and scores)"""
+    return retrieval_service.search_sync(
+        "incident_history", query, k=k, filters=filters, fields=fields, diversity=diversity
+    )
+
+
+def neighbours_and_references(find, collection: str, description: str, fields: Sequence[str]):
+    """(neighbours that vote on the fields, diverse references to show) from one search.
+
+    The neighbours come back with their embeddings, so the references are
+    picked from them by MMR instead of by a second search.
+    """
+    neighbours = find(
+        description, k=max(inference_neighbors(), top_k(3) * mmr_overfetch()), fields=[*fields, VECTOR_FIELD]
+    )
+    references = retrieval_service.diversify(collection, neighbours, top_k(3), mmr_lambda())
+    return neighbours[:inference_neighbors()], references
+
+
+def render_similar_change_requests(hits: Sequence[Hit]) -> str:
+    if not hits:
+        return "No similar change requests found."
+    return "\n\n".join(format_change_summary(hits))
+
+
+def render_similar_incidents(hits: Sequence[Hit]) -> str:
+    if not hits:
+        return "No similar historical incidents found."
+    return "\n\n".join(format_incident_summary(hits))
 
-        if not results[0]:
-            return "No similar change requests found."
-
-        matches = []
-        for hit in results[0]:
-            entity = hit.entity
-            match_info = f"""
-- **{entity.get('number', 'Unknown')}**: {entity.get('short_description', 'No title')} (Score: {hit.score:.2f})
-  Type: {entity.get('type', 'Unknown')}, Impact: {entity.get('impact', 'Unknown')}, Urgency: {entity.get('urgency', 'Unknown')}
-  Config Item: {entity.get('configuration_item', 'Not specified')}
-  Assignment Group: {entity.get('assignment_group', 'Unknown')}
-  CAB Required: {'Yes' if entity.get('cab_required') else 'No'}
-  Change Plan: {entity.get('change_plan', 'No plan')[:100]}...
-"""
-            matches.append(match_info.strip())
-        
-        connections.disconnect("cr_search")
-        return "\n\n".join(matches)
 
+@tool
+async def retrieve_similar_change_requests(
+    query: str,
+    configuration_item: Optional[str] = None,
+    change_type: Optional[str] = None,
+    state: Optional[str] = None,
+    exclude_closed: bool = False,
+    planned_after: Optional[str] = None,
+    planned_before: Optional[str] = None,
+) -> str:
+    """Finds similar historical change requests based on a description.
+    Optional filters narrow the candidates before ranking: configuration_item,
+    change_type (Normal/Standard/Emergency), state, exclude_closed (skip
+    Closed/Canceled) and planned_after / planned_before dates (YYYY-MM-DD)."""
+    filters = change_filters(configuration_item, change_type, state, None, exclude_closed, planned_after, planned_before)
+    try:
+        hits = await retrieval_service.search(
+            "change_request_history", query, k=top_k(2), filters=filters, fields=CHANGE_REQUEST_FIELDS,
+            diversity=mmr_lambda(),
+        )
+    except CollectionNotFound:
+        return "Change request history collection not found."
     except Exception as e:
-        try:
-            connections.disconnect("cr_search")
-        except:
-            pass
         return f"Error retrieving change requests: {str(e)}"
 
+    return render_similar_change_requests(hits)
 
 
 
-@tool
-def retrieve_from_milvus(query: str) -> str:
-    """Finds similar historical incidents based on a problem description."""
-    MILVUS_HOST = os.getenv('MILVUS_HOST', "172.17.204.5")
-    MILVUS_PORT = os.getenv('MILVUS_PORT', "19530")
-    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', "all-MiniLM-L6-v2")
-    COLLECTION_NAME = "incident_history"
 
+@tool
+async def retrieve_from_milvus(
+    query: str,
+    category: Optional[str] = None,
+    state: Optional[str] = None,
+    exclude_closed: bool = False,
+    opened_after: Optional[str] = None,
+    opened_before: Optional[str] = None,
+) -> str:
+    """Finds similar historical incidents based on a problem description.
+    Optional filters narrow the candidates before ranking: category, state,
+    exclude_closed (skip Closed/Resolved/Canceled) and opened_after /
+    opened_before dates (YYYY-MM-DD)."""
+    filters = incident_filters(category, state, exclude_closed, opened_after, opened_before)
     try:
-        connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
-        
-        if not utility.has_collection(COLLECTION_NAME):
-            return "Milvus incident history collection not found. Please run the data upload script first."
-
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-        
-        embedding_model = SentenceTransformer(EMBEDDING_MODEL)
-        query_embedding = embedding_model.encode([query]).tolist()
-
-        results = collection.search(
-            query_embedding,
-            "embedding",
-            {"metric_type": "COSINE", "params": {"nprobe": 10}},
-            limit=1,
-            output_fields=[
-                "number", 
-                "short_description", 
-                "description", 
-                "priority", 
-                "impact", 
-                "urgency", 
-                "state",
-                "category",
-                "opened",
-                "opened_by"
-            ]
+        hits = await retrieval_service.search(
+            "incident_history", query, k=top_k(1), filters=filters, fields=INCIDENT_FIELDS, diversity=mmr_lambda()
         )
+    except CollectionNotFound:
+        return "Milvus incident history collection not found. Please run the data upload script first."
+    except Exception as e:
+        return f"Error retrieving similar incidents from Milvus: {str(e)}"
 
-        if not results[0]:
-            return "No similar historical incidents found."
+    return render_similar_incidents(hits)
 
-        matches = []
-        for i, hit in enumerate(results[0], 1):
-            entity = hit.entity
-            
-            match_info = f"""
-📋 **Incident #{i}** (Similarity: {hit.score:.2f})
-   • **Number**: {entity.get('number', 'Unknown')}
-   • **Title**: {entity.get('short_description', 'No title available')}
-   • **Description**: {entity.get('description', 'No description available')}
-   • **Priority**: {entity.get('priority', 'Unknown')} | **Impact**: {entity.get('impact', 'Unknown')} | **Urgency**: {entity.get('urgency', 'Unknown')}
-   • **State**: {entity.get('state', 'Unknown')} | **Category**: {entity.get('category', 'Unknown')}
-   • **Assignment Group**: {entity.get('assignment_group', 'Unknown')}
-   • **Opened**: {entity.get('opened', 'Unknown')} by {entity.get('opened_by', 'Unknown')}
-"""
-            matches.append(match_info.strip())
-        
-        # Cache the results in memory
-        memory = get_session_memory()
-        memory['similar_incidents_cache'][query] = matches
-        update_session_memory('similar_incidents_cache', memory['similar_incidents_cache'])
-        
-        return "\n\n".join(matches)
 
+@tool
+async def search_knowledge_base(query: str, exclude_closed: bool = False) -> str:
+    """Finds similar incidents, change requests and root cause analyses in one call.
+    Use this instead of separate searches when a resolution or proposal needs
+    every source. exclude_closed skips closed incidents and change requests."""
+    filters = {
+        "incident_history": incident_filters(exclude_closed=exclude_closed),
+        "change_request_history": change_filters(exclude_closed=exclude_closed),
+    }
+    try:
+        result = await fanout_search(query, k=top_k(3), filters=filters, diversity=mmr_lambda())
     except Exception as e:
-        try:
-            connections.disconnect("search_connection")
-        except:
-            pass
-        return f"Error retrieving similar incidents from Milvus: {str(e)}"
+        return f"Error searching the knowledge base: {str(e)}"
+
+    return format_fanout(result)
 
 # ============================================================================
 # CONFLUENCE KNOWLEDGE BASE SEARCH TOOL
@@ -385,31 +410,25 @@ def determine_missing_change_request_fields(provided_fields: dict) -> list:
     
     return missing
 
-def extract_fields_from_similar_change_requests(similar_crs_text: str) -> dict:
-    """Extract common field values from similar change requests"""
-    inferred_fields = {}
-    
-    # Extract patterns from similar CRs
-    patterns = {
-        'type': r"Type.*?([^•\n,]+)",
-        'impact': r"Impact.*?(\d+)",
-        'urgency': r"Urgency.*?(\d+)", 
-        'assignment_group': r"Assignment Group.*?([^•\n,]+)",
-        'cab_required': r"CAB Required.*?(Yes|No)"
-    }
-    
-    for field, pattern in patterns.items():
-        matches = re.findall(pattern, similar_crs_text, re.IGNORECASE)
-        if matches:
-            clean_matches = [m.strip() for m in matches if m.strip() and m.strip() != 'Unknown']
-            if clean_matches:
-                if field == 'cab_required':
-                    inferred_fields[field] = clean_matches[0].lower() == 'yes'
-                else:
-                    inferred_fields[field] = max(set(clean_matches), key=clean_matches.count)
-    
-    return inferred_fields
-
+def confidence_note(field: str, estimates: Dict[str, FieldEstimate], user_fields: dict) -> str:
+    """How a proposed value was obtained, flagging the ones the user should check"""
+    if user_fields.get(field):
+        return "(provided by you)"
+    estimate = estimates.get(field)
+    if estimate is None:
+        return "(not inferred - please provide)"
+    if estimate.confidence >= confidence_threshold():
+        return f"(✅ auto-filled, {estimate.confidence:.0%} confidence from {estimate.support} similar tickets)"
+    return f"(⚠️ {estimate.confidence:.0%} confidence - please check)"
+
+def fields_to_review(fields: Sequence[str], estimates: Dict[str, FieldEstimate], user_fields: dict) -> List[str]:
+    """Fields that are neither user-provided nor inferred with high confidence"""
+    threshold = confidence_threshold()
+    return [
+        field for field in fields
+        if not user_fields.get(field)
+        and (field not in estimates or estimates[field].confidence < threshold)
+    ]
 
 def extract_incident_fields_from_user_input(user_input: str) -> dict:
     """Extract incident fields from user input"""
@@ -453,33 +472,6 @@ def determine_missing_fields(provided_fields: dict) -> list:
     
     return missing
 
-def extract_fields_from_similar_incidents(similar_incidents_text: str) -> dict:
-    """Extract common field values from similar incidents"""
-    priority_matches = re.findall(r"Priority.*?(\d+)", similar_incidents_text)
-    impact_matches = re.findall(r"Impact.*?(\d+)", similar_incidents_text)
-    urgency_matches = re.findall(r"Urgency.*?(\d+)", similar_incidents_text)
-    category_matches = re.findall(r"Category.*?([^•\n]+)", similar_incidents_text)
-    assignment_group_matches = re.findall(r"Assignment Group.*?([^•\n]+)", similar_incidents_text)
-    
-    inferred_fields = {}
-    
-    if priority_matches:
-        inferred_fields['priority'] = max(set(priority_matches), key=priority_matches.count)
-    if impact_matches:
-        inferred_fields['impact'] = max(set(impact_matches), key=impact_matches.count)
-    if urgency_matches:
-        inferred_fields['urgency'] = max(set(urgency_matches), key=urgency_matches.count)
-    if category_matches:
-        clean_categories = [c.strip() for c in category_matches if c.strip() != 'Unknown']
-        if clean_categories:
-            inferred_fields['category'] = max(set(clean_categories), key=clean_categories.count)
-    if assignment_group_matches:
-        clean_groups = [ag.strip() for ag in assignment_group_matches if ag.strip() != 'Unknown']
-        if clean_groups:
-            inferred_fields['assignment_group'] = max(set(clean_groups), key=clean_groups.count)
-    
-    return inferred_fields
-
 # ============================================================================
 # SUPERVISOR AGENT
 # ============================================================================
@@ -633,20 +625,28 @@ def enhancer_node(state: MessagesState) -> Command[Literal[END]]:
         # Handle change request enhancement
         user_fields = extract_change_request_fields_from_user_input(original_request)
         
-        # Get similar change requests (check cache first)
+        # Get similar change requests (near-duplicate descriptions hit the shared semantic cache)
         description = user_fields.get('description', original_request)
-        if description in memory.get('similar_change_requests_cache', {}):
-            retrieved_crs_info = "\n\n".join(memory['similar_change_requests_cache'][description])
-        else:
-            retrieved_crs_info = retrieve_similar_change_requests.invoke({"query": description})
-            # Cache the results
-            if 'similar_change_requests_cache' not in memory:
-                memory['similar_change_requests_cache'] = {}
-            memory['similar_change_requests_cache'][description] = [retrieved_crs_info]
-        
-        # Infer missing fields from similar change requests
-        inferred_fields = extract_fields_from_similar_change_requests(retrieved_crs_info)
+        try:
+            # Every neighbour votes on the fields; the references shown are picked for
+            # diversity so near-identical tickets don't crowd the prompt
+            similar_crs, references = neighbours_and_references(
+                find_similar_change_requests, "change_request_history", description, CHANGE_REQUEST_FIELDS
+            )
+            retrieved_crs_info = render_similar_change_requests(references)
+        except CollectionNotFound:
+            similar_crs, retrieved_crs_info = [], "Change request history collection not found."
+        except Exception as e:
+            similar_crs, retrieved_crs_info = [], f"Error retrieving change requests: {str(e)}"
+        print(f">>> ENHANCER: Embedding cache {query_embedding_cache.summary()}")
+        print(f">>> ENHANCER: Semantic cache {semantic_cache.summary()}")
+        
+        # Infer missing fields by similarity-weighted voting over the neighbours
+        estimates = infer_fields(similar_crs, CHANGE_INFERENCE_FIELDS)
+        inferred_fields = {field: estimate.value for field, estimate in estimates.items()}
         complete_fields = {**inferred_fields, **user_fields}
+        review_fields = fields_to_review(CHANGE_INFERENCE_FIELDS, estimates, user_fields)
+        print(f">>> ENHANCER: Inferred {len(estimates)} fields, {len(review_fields)} need review: {review_fields}")
         
         # Set intelligent defaults for missing fields based on the request context
         field_defaults = {
@@ -715,6 +715,13 @@ def enhancer_node(state: MessagesState) -> Command[Literal[END]]:
 - **CAB Date/Time**: {complete_fields.get('cab_date_time', 'TBD')}
 - **CAB Delegate**: {complete_fields.get('cab_delegate', 'TBD')}
 
+**🎯 INFERENCE CONFIDENCE:**
+- **Type**: {confidence_note('type', estimates, user_fields)}
+- **Impact**: {confidence_note('impact', estimates, user_fields)}
+- **Urgency**: {confidence_note('urgency', estimates, user_fields)}
+- **Assignment Group**: {confidence_note('assignment_group', estimates, user_fields)}
+- **CAB Required**: {confidence_note('cab_required', estimates, user_fields)}
+
 **🔍 REFERENCE CHANGE REQUESTS USED FOR INFERENCE:**
 {retrieved_crs_info}
 
@@ -732,20 +739,36 @@ Please review the proposed details and respond with:
         # Handle incident enhancement (existing logic)
         user_fields = extract_incident_fields_from_user_input(original_request)
         
-        # Get similar incidents (check cache first)
+        # Get similar incidents (near-duplicate descriptions hit the shared semantic cache)
         description = user_fields.get('description', original_request)
-        if description in memory.get('similar_incidents_cache', {}):
-            retrieved_incidents_info = "\n\n".join(memory['similar_incidents_cache'][description])
-        else:
-            retrieved_incidents_info = retrieve_from_milvus.invoke({"query": description})
-            # Cache the results
-            if 'similar_incidents_cache' not in memory:
-                memory['similar_incidents_cache'] = {}
-            memory['similar_incidents_cache'][description] = [retrieved_incidents_info]
-        
-        # Infer missing fields
-        inferred_fields = extract_fields_from_similar_incidents(retrieved_incidents_info)
+        try:
+            # Every neighbour votes on the fields; the references shown are picked for
+            # diversity so near-identical tickets don't crowd the prompt
+            similar_incidents, references = neighbours_and_references(
+                find_similar_incidents, "incident_history", description, INCIDENT_FIELDS
+            )
+            retrieved_incidents_info = render_similar_incidents(references)
+        except CollectionNotFound:
+            similar_incidents = []
+            retrieved_incidents_info = "Milvus incident history collection not found. Please run the data upload script first."
+        except Exception as e:
+            similar_incidents = []
+            retrieved_incidents_info = f"Error retrieving similar incidents from Milvus: {str(e)}"
+        print(f">>> ENHANCER: Embedding cache {query_embedding_cache.summary()}")
+        print(f">>> ENHANCER: Semantic cache {semantic_cache.summary()}")
+        
+        # Infer missing fields by similarity-weighted voting over the neighbours
+        estimates = infer_fields(similar_incidents, INCIDENT_INFERENCE_FIELDS)
+        inferred_fields = {field: estimate.value for field, estimate in estimates.items()}
         complete_fields = {**inferred_fields, **user_fields}
+        review_fields = fields_to_review(INCIDENT_INFERENCE_FIELDS, estimates, user_fields)
+        print(f">>> ENHANCER: Inferred {len(estimates)} fields, {len(review_fields)} need review: {review_fields}")
+        if review_fields:
+            review_request = "Please check these fields, they could not be inferred with high confidence: " + ", ".join(
+                field.replace('_', ' ').title() for field in review_fields
+            )
+        else:
+            review_request = "All fields are either yours or inferred with high confidence, so nothing needs checking."
         
         # Store in memory
         update_session_memory('pending_incident_details', complete_fields)
@@ -756,17 +779,19 @@ Please review the proposed details and respond with:
 **📋 PROPOSED INCIDENT DETAILS:**
 - **Description**: {complete_fields.get('description', 'Not specified')}
 - **Short Description**: {complete_fields.get('description', '')[:50]}...
-- **Priority**: {complete_fields.get('priority', 'Not inferred')} (inferred from similar incidents)
-- **Impact**: {complete_fields.get('impact', 'Not inferred')} (inferred from similar incidents)
-- **Urgency**: {complete_fields.get('urgency', 'Not inferred')} (inferred from similar incidents)
-- **Category**: {complete_fields.get('category', 'Not inferred')} (inferred from similar incidents)
-- **Assignment Group**: {complete_fields.get('assignment_group', 'Not inferred')} (inferred from similar incidents)
+- **Priority**: {complete_fields.get('priority', 'Not inferred')} {confidence_note('priority', estimates, user_fields)}
+- **Impact**: {complete_fields.get('impact', 'Not inferred')} {confidence_note('impact', estimates, user_fields)}
+- **Urgency**: {complete_fields.get('urgency', 'Not inferred')} {confidence_note('urgency', estimates, user_fields)}
+- **Category**: {complete_fields.get('category', 'Not inferred')} {confidence_note('category', estimates, user_fields)}
+- **Assignment Group**: {complete_fields.get('assignment_group', 'Not inferred')} {confidence_note('assignment_group', estimates, user_fields)}
 
 **🔍 REFERENCE INCIDENTS USED FOR INFERENCE:**
 {retrieved_incidents_info}
 
 **❓ CONFIRMATION REQUIRED:**
-Please review the proposed details and respond with:
+{review_request}
+
+Respond with:
 - "Yes" or "Create it" to proceed with these details
 - "Change [field] to [value]" to modify (e.g., "Change priority to 1")
 - "Cancel" to cancel the incident creation
@@ -954,6 +979,24 @@ async def servicenow_agent(state: MessagesState) -> Command[Literal[END]]:
         any(word.lower().startswith(('inc', 'in')) and word[3:].isdigit() for word in last_message_content.split())
     ])
 
+    # Fast path: a close RCA answers from its structured steps, Confluence only on a miss
+    if is_resolution_request and not (is_confirmed_incident or is_confirmed_change_request):
+        rca_hit, rca_query = await find_resolution(state["messages"][-1].content)
+        if rca_hit is not None:
+            add_to_conversation_history('servicenow_agent', f'Resolution answered from RCA {rca_hit.id}', {
+                'rca_id': rca_hit.id, 'score': rca_hit.score, 'query': rca_query[:200]
+            })
+            print(f">>> SERVICENOW AGENT: Answered from RCA {rca_hit.id}, Confluence not consulted")
+            print(f"--- SERVICENOW AGENT → END ---")
+            return Command(
+                update={
+                    "messages": [
+                        HumanMessage(content=format_resolution(rca_hit), name="servicenow_agent")
+                    ]
+                },
+                goto=END,
+            )
+
     if is_confirmed_incident:
         agent_role = """You are the ServiceNow Incident Creation Agent handling CONFIRMED incident requests.
         
@@ -985,6 +1028,7 @@ async def servicenow_agent(state: MessagesState) -> Command[Literal[END]]:
         - Extract the incident description/problem details
         
         STEP 2: **Search Confluence Knowledge Base** for resolution steps
+        - Call search_knowledge_base with the incident description for similar incidents, changes and root cause analyses
         - Use the incident description to search Confluence KB for relevant articles
         - Look for troubleshooting guides, resolution procedures, and known fixes
         - Find articles that match the incident symptoms or error messages
@@ -1113,13 +1157,13 @@ async def servicenow_agent(state: MessagesState) -> Command[Literal[END]]:
             if is_change_request and has_attachment_signal:
                 servicenow_rag_agent = create_react_agent(
                     llm, 
-                    tools=tools + [add_change_request_attachment_tool, search_confluence_resolution], 
+                    tools=tools + [add_change_request_attachment_tool, search_confluence_resolution, search_knowledge_base], 
                     state_modifier=system_prompt
                 )
             else:
                 servicenow_rag_agent = create_react_agent(
                     llm, 
-                    tools=tools + [search_confluence_resolution], 
+                    tools=tools + [search_confluence_resolution, search_knowledge_base], 
                     state_modifier=system_prompt
                 )
 
@@ -1268,7 +1312,12 @@ def health_check():
         'status': 'healthy',
         'message': 'Enhanced ITSM Workflow API with Confluence Integration',
         'timestamp': datetime.now().isoformat(),
-        'active_sessions': len(conversation_memory)
+        'active_sessions': len(conversation_memory),
+        'embedding_cache': query_embedding_cache.stats(),
+        'semantic_cache': semantic_cache.stats(),
+        'rerank': reranker.stats(),
+        'rca_fast_path': rca_stats(),
+        'full_precision_rerank': compression_stats()
     })
 
 @app.route('/chat', methods=['POST'])
@@ -1478,4 +1527,9 @@ if __name__ == '__main__':
         print(f"Warning: Missing environment variables: {missing_vars}")
         print("The app will use Claude/OpenAI as fallback, but some features may not work.")
     
+    # Load the embedding model and Milvus collections once before the first chat request needs them
+    warmup()
+    reranker.warmup()
+    milvus.preload()
+    
     app.run(debug=True, host='0.0.0.0', port=5019)
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Memory saved and recall lost by compressed vector storage.
+
+Offline simulation of the Milvus indexes on scaled change requests, all
+sharing one k-means IVF partitioning (nlist/nprobe as in production today):
+
+  IVF_FLAT       float32 vectors, the current setup and the baseline
+  IVF_SQ8        8-bit scalar quantization per dimension
+  BIN_IVF_FLAT   sign bits, Hamming distance
+
+Each compressed index is scored alone and with a full-precision re-rank of
+k * overfetch candidates (retrieval.compression). Recall@k is against exact
+float32 brute force; memory is the vector payload Milvus keeps resident.
+
+    python benchmarks/bench_compressed_vectors.py --tickets 20000 --overfetch 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.datasets import change_request_text, change_request_texts, change_requests, incident_texts, scale_records
+from retrieval.embeddings import encode
+
+
+def kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = vectors[assign == c]
+            if len(members):
+                mean = members.mean(axis=0)
+                centroids[c] = mean / (np.linalg.norm(mean) or 1.0)
+    return centroids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=20000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=128)
+    parser.add_argument("--nprobe", type=int, default=10)
+    parser.add_argument("--overfetch", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    records = scale_records(change_requests(), args.tickets)
+    started = time.perf_counter()
+    vectors = encode([change_request_text(item) for item in records], batch_size=64).astype(np.float32)
+    queries = encode(change_request_texts() + incident_texts(), batch_size=64).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    count, dim = vectors.shape
+    print(f"Embedded {count} vectors and {len(queries)} queries in {time.perf_counter() - started:.1f}s")
+
+    # Compressed copies
+    low, high = vectors.min(axis=0), vectors.max(axis=0)
+    scale = np.where(high > low, high - low, 1.0) / 255
+    codes = np.round((vectors - low) / scale).astype(np.uint8)
+    bits = np.packbits(vectors > 0, axis=1)
+
+    centroids = kmeans(vectors, args.nlist)
+    assign = np.argmax(vectors @ centroids.T, axis=1)
+    lists = [np.flatnonzero(assign == c) for c in range(args.nlist)]
+
+    truth = [set(np.argsort(-(vectors @ q))[:args.k]) for q in queries]
+
+    scorers = {
+        "IVF_FLAT": lambda rows, q, qbits: vectors[rows] @ q,
+        "IVF_SQ8": lambda rows, q, qbits: (codes[rows] * scale + low) @ q,
+        "BIN_IVF_FLAT": lambda rows, q, qbits: -np.unpackbits(bits[rows] ^ qbits, axis=1).sum(axis=1),
+    }
+    memory = {
+        "IVF_FLAT": vectors.nbytes,
+        "IVF_SQ8": codes.nbytes + low.nbytes + scale.nbytes,
+        "BIN_IVF_FLAT": bits.nbytes,
+    }
+
+    baseline_mb = memory["IVF_FLAT"] / 2**20
+    print(f"Full-precision sidecar on disk: {vectors.nbytes / 2**20:.1f} MB (memory-mapped, only re-ranked rows are read)\n")
+    print(f"{'index':<14} {'re-rank':>8} {'memory MB':>10} {'saved':>7} {'recall@' + str(args.k):>10} {'lost':>7} {'ms/query':>9}")
+
+    baseline_recall = None
+    for name, score in scorers.items():
+        for overfetch in ([1] if name == "IVF_FLAT" else [0] + args.overfetch):
+            found, started = [], time.perf_counter()
+            for q in queries:
+                probes = np.argsort(-(centroids @ q))[:args.nprobe]
+                rows = np.concatenate([lists[c] for c in probes])
+                approx = score(rows, q, np.packbits(q > 0))
+                fetch = args.k * max(overfetch, 1)
+                candidates = rows[np.argsort(-approx)[:fetch]]
+                if overfetch:
+                    candidates = candidates[np.argsort(-(vectors[candidates] @ q))]
+                found.append(set(candidates[:args.k]))
+            elapsed = (time.perf_counter() - started) * 1000 / len(queries)
+
+            recall = float(np.mean([len(f & t) / args.k for f, t in zip(found, truth)]))
+            baseline_recall = recall if baseline_recall is None else baseline_recall
+            mb = memory[name] / 2**20
+            label = "-" if name == "IVF_FLAT" else (f"x{overfetch}" if overfetch else "none")
+            print(
+                f"{name:<14} {label:>8} {mb:>10.2f} {1 - mb / baseline_mb:>7.0%} {recall:>10.3f} "
+                f"{baseline_recall - recall:>+7.3f} {elapsed:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
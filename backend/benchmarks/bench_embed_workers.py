@@ -0,0 +1,66 @@
+"""
+Embedding throughput of the upload pipeline across worker processes.
+
+Embeds a synthetic backfill of change requests (the bundled export scaled up
+with scale_records) through retrieval.ingest.embed_texts at each --workers
+count; 1 encodes in-process as before, more use retrieval.embed_pool. Pool
+start-up (spawning the workers and loading one model in each) is timed
+separately from the steady-state run, and every run's vectors are compared
+with the in-process ones. The embedding cache is bypassed.
+
+    python benchmarks/bench_embed_workers.py --records 8000 --workers 1 2 4 8
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.datasets import change_request_text, change_requests, scale_records
+from retrieval.embed_pool import close_pools, embedding_pool
+from retrieval.embeddings import warmup
+from retrieval.ingest import IngestStats, embed_texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=8000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    texts = [change_request_text(item) for item in scale_records(change_requests(), args.records)]
+    print(f"{len(texts)} change request texts, batch size {args.batch_size}, {os.cpu_count()} CPUs\n")
+    print(f"{'workers':>7} {'startup s':>9} {'rec/s':>8} {'speedup':>8} {'max |diff|':>10}")
+
+    baseline = baseline_rate = None
+    for workers in args.workers:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if workers > 1:
+                embedding_pool(workers).dimension()
+            else:
+                warmup()
+        startup = time.perf_counter() - started
+
+        stats = IngestStats()
+        started = time.perf_counter()
+        # Progress lines are for uploads; only the totals matter here
+        with contextlib.redirect_stdout(io.StringIO()):
+            vectors = embed_texts(texts, batch_size=args.batch_size, stats=stats, cache=False, workers=workers)
+        rate = len(texts) / (time.perf_counter() - started)
+        # Idle pools would still hold a model each and skew the next row
+        close_pools()
+        if baseline is None:
+            baseline, baseline_rate = vectors, rate
+        diff = float(np.abs(vectors - baseline).max())
+        print(f"{workers:>7} {startup:>9.1f} {rate:>8.0f} {rate / baseline_rate:>7.1f}x {diff:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
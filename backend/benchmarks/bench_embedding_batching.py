@@ -0,0 +1,87 @@
+"""
+Throughput vs. tail latency of single-query embedding under concurrency.
+
+Compares the plain registry encode() (one model call per request, serialised
+per model) with the micro-batching executor at several max-wait settings.
+Queries are the change request short descriptions bundled with the repo.
+
+    python benchmarks/bench_embedding_batching.py --requests 512 --concurrency 1 4 16 64
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from retrieval.batching import BatchingEmbedder
+from retrieval.embeddings import encode, warmup
+
+DATA_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "Milvus_data_upload", "change_request_data.json"
+)
+
+
+def load_queries(path: str):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return [
+        f"{item.get('Short description', '')}. {item.get('Description', '')}".strip()
+        for item in data
+    ]
+
+
+def run(encode_one, queries, total_requests: int, concurrency: int):
+    latencies = []
+
+    def one(i: int) -> None:
+        started = time.perf_counter()
+        encode_one(queries[i % len(queries)])
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total_requests)))
+    elapsed = time.perf_counter() - started
+
+    lat_ms = np.array(latencies) * 1000
+    return total_requests / elapsed, np.percentile(lat_ms, 50), np.percentile(lat_ms, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[2.0, 5.0, 10.0])
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--data", default=DATA_FILE)
+    args = parser.parse_args()
+
+    queries = load_queries(args.data)
+    warmup()
+
+    modes = [("direct", lambda text: encode(text))]
+    batchers = []
+    for wait in args.max_wait_ms:
+        batcher = BatchingEmbedder(max_batch_size=args.max_batch_size, max_wait_ms=wait)
+        batchers.append(batcher)
+        modes.append((f"batched wait={wait:g}ms", batcher.encode))
+
+    print(f"{'mode':<22} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for concurrency in args.concurrency:
+        for label, encode_one in modes:
+            throughput, p50, p99 = run(encode_one, queries, args.requests, concurrency)
+            print(f"{label:<22} {concurrency:>5} {throughput:>9.1f} {p50:>9.1f} {p99:>9.1f}")
+        print()
+
+    for batcher in batchers:
+        print(f"[Batcher wait={batcher.max_wait * 1000:g}ms] {batcher.stats()}")
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Re-ingestion cost with the on-disk embedding cache.
+
+Embeds a synthetic backfill of change requests (the bundled export scaled up
+with scale_records) three times against a fresh cache directory: cold (every
+text encoded and written), warm (a re-run of the same export, as after a
+schema tweak) and with --changed percent of the texts edited.
+
+    python benchmarks/bench_embedding_cache.py --records 2000 --changed 5
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.datasets import change_request_text, change_requests, scale_records
+from retrieval.embeddings import warmup
+from retrieval.ingest import IngestStats, embed_texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--changed", type=float, default=5.0, help="percent of texts edited for the last run")
+    args = parser.parse_args()
+
+    texts = [change_request_text(item) for item in scale_records(change_requests(), args.records)]
+    step = max(1, round(100 / args.changed)) if args.changed > 0 else len(texts) + 1
+    edited = [text + " (updated)" if i % step == 0 else text for i, text in enumerate(texts)]
+    warmup()
+
+    directory = tempfile.mkdtemp(prefix="embedding-cache-")
+    os.environ["EMBEDDING_CACHE_DIR"] = directory
+    try:
+        print(f"{len(texts)} change request texts, cache in {directory}\n")
+        print(f"{'run':>8} {'seconds':>8} {'hits':>6} {'misses':>7} {'speedup':>8}")
+        baseline = None
+        for label, batch in (("cold", texts), ("warm", texts), ("edited", edited)):
+            stats = IngestStats()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                embed_texts(batch, stats=stats, cache=True)
+            seconds = time.perf_counter() - started
+            baseline = baseline or seconds
+            print(f"{label:>8} {seconds:>8.2f} {stats.cache_hits:>6} {stats.cache_misses:>7} {baseline / seconds:>7.1f}x")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
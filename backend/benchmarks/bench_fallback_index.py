@@ -0,0 +1,79 @@
+"""
+Recall and latency of the embedded fallback indexes, with no Milvus needed.
+
+The bundled change requests are scaled to --tickets records, embedded and
+exported twice under a temporary RETRIEVAL_FALLBACK_DIR: once as a flat
+index, once as a graph. Queries are the bundled change request and incident
+texts. Graph recall@k is measured against the exact flat results, unfiltered
+and with a configuration item filter.
+
+    python benchmarks/bench_fallback_index.py --tickets 20000 --ef 32 64 128
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.datasets import change_request_text, change_request_texts, change_requests, incident_texts, scale_records
+from retrieval.embeddings import encode
+from retrieval.fallback import FallbackIndex, export_fallback_index
+
+COLUMNS = {"number": "Number", "type": "Type", "state": "State", "configuration_item": "Configuration item"}
+
+
+def timed_search(index: FallbackIndex, queries, k, filters=None, ef=None):
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append([hit_id for hit_id, _, _ in index.search(query, k, filters, fields=[], ef=ef)])
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / max(len(t), 1) for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=20000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128])
+    args = parser.parse_args()
+
+    records = scale_records(change_requests(), args.tickets)
+    started = time.perf_counter()
+    vectors = encode([change_request_text(item) for item in records], batch_size=64)
+    queries = encode(change_request_texts() + incident_texts(), batch_size=64)
+    print(f"Embedded {len(records)} records and {len(queries)} queries in {time.perf_counter() - started:.1f}s")
+
+    columns = {name: [item.get(key, "") for item in records] for name, key in COLUMNS.items()}
+    busiest = max(set(columns["configuration_item"]), key=columns["configuration_item"].count)
+    filters = {"configuration_item": busiest}
+
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["RETRIEVAL_FALLBACK_DIR"] = root
+        indexes = {}
+        for kind in ("flat", "graph"):
+            started = time.perf_counter()
+            path = export_fallback_index(f"bench_{kind}", vectors, columns, kind=kind)
+            build_s = time.perf_counter() - started
+            indexes[kind] = FallbackIndex(path)
+            print(f"{kind:<6} build {build_s:.1f}s")
+
+        print(f"\n{'index':<12} {'filter':<8} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for label, active in (("none", None), ("ci", filters)):
+            truth, p50, p99 = timed_search(indexes["flat"], queries, args.k, active)
+            print(f"{'flat':<12} {label:<8} {1.0:>9.3f} {p50:>8.2f} {p99:>8.2f}")
+            for ef in args.ef:
+                found, p50, p99 = timed_search(indexes["graph"], queries, args.k, active, ef)
+                print(f"{'graph ef=' + str(ef):<12} {label:<8} {recall(found, truth):>9.3f} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Embedding throughput of the upload pipeline.
+
+Embeds a synthetic backfill of change requests (the bundled export scaled up
+with scale_records) one record per model call, as the upload scripts used to,
+then in retrieval.ingest batches, in input order and length-sorted, at each
+--batch-size. Insert chunking is not measured here;
+it needs a live Milvus.
+
+    python benchmarks/bench_ingest.py --records 2000 --batch-size 16 32 64 128
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.datasets import change_request_text, change_requests, scale_records
+from retrieval.embeddings import encode, warmup
+from retrieval.ingest import IngestStats, embed_texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--single-limit", type=int, default=500, help="records timed one at a time")
+    args = parser.parse_args()
+
+    texts = [change_request_text(item) for item in scale_records(change_requests(), args.records)]
+    warmup()
+
+    sample = texts[:args.single_limit]
+    started = time.perf_counter()
+    for text in sample:
+        encode(text)
+    single_rate = len(sample) / (time.perf_counter() - started)
+    print(f"{len(texts)} change request texts; one record per call: {single_rate:.0f} rec/s\n")
+
+    print(f"{'batch':>5} {'order':>8} {'rec/s':>8} {'ms/batch':>9} {'speedup':>8}")
+    for batch_size in args.batch_size:
+        for sort in (False, True):
+            stats = IngestStats()
+            # Progress lines are for uploads; only the totals matter here
+            with contextlib.redirect_stdout(io.StringIO()):
+                embed_texts(texts, batch_size=batch_size, sort=sort, stats=stats, cache=False)
+            rate = stats.embedded / (sum(stats.embed_batch_ms) / 1000)
+            order = "length" if sort else "input"
+            print(
+                f"{batch_size:>5} {order:>8} {rate:>8.0f} {sum(stats.embed_batch_ms) / len(stats.embed_batch_ms):>9.1f} "
+                f"{rate / single_rate:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Accuracy and speed of k-NN field inference over historical change requests.
+
+Every ticket is used as a query against all the others (leave-one-out). Its
+type, impact, urgency, assignment group and CAB flag are predicted from the
+top-k neighbours and compared with the recorded values, for:
+
+  * top-1 copy         what the enhancer did with limit=1
+  * majority of top-k  unweighted mode, ties to the closest ticket
+  * weighted top-k     retrieval.inference (softmax over cosine scores)
+
+plus how many tickets clear the auto-fill confidence threshold and how
+accurate those are. The bundled change_request_data.json is scaled to
+--tickets synthetic copies (shuffled description sentences); copies of the
+query's own source ticket are excluded so they cannot leak the answer.
+
+    python benchmarks/bench_knn_inference.py --tickets 5000 --k 1 3 5 10 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.datasets import CHANGE_REQUEST_FILE, change_request_text, change_requests, scale_records
+from retrieval.embeddings import encode
+from retrieval.inference import confidence_threshold, factorize, infer_fields, similarity_weights, weighted_vote
+from retrieval.service import Hit
+
+FIELDS = {
+    "type": "Type",
+    "impact": "Impact",
+    "urgency": "Urgency",
+    "assignment_group": "Assignment group",
+    "cab_required": "CAB required",
+}
+
+
+def neighbours(vectors: np.ndarray, groups: np.ndarray, k: int, chunk: int = 512):
+    """Top-k most similar tickets per query, best copy per source ticket, own source excluded."""
+    order = np.argsort(groups, kind="stable")
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    group_ids = sorted_groups[starts]
+
+    corpus = vectors[order].T
+    ids = np.empty((len(vectors), k), dtype=np.int64)
+    scores = np.empty((len(vectors), k), dtype=np.float32)
+    for begin in range(0, len(vectors), chunk):
+        best = np.maximum.reduceat(vectors[begin:begin + chunk] @ corpus, starts, axis=1)
+        own = np.searchsorted(group_ids, groups[begin:begin + chunk])
+        best[np.arange(len(best)), own] = -np.inf
+
+        top = np.argpartition(-best, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(best, top, axis=1)
+        ranked = np.argsort(-top_scores, axis=1)
+        ids[begin:begin + chunk] = group_ids[np.take_along_axis(top, ranked, axis=1)]
+        scores[begin:begin + chunk] = np.take_along_axis(top_scores, ranked, axis=1)
+    return ids, scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", default=CHANGE_REQUEST_FILE)
+    parser.add_argument("--tickets", type=int, default=5000, help="0 uses the file as-is")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10, 20])
+    parser.add_argument("--threshold", type=float, default=confidence_threshold())
+    args = parser.parse_args()
+
+    source = change_requests(args.data)
+    records = scale_records(source, args.tickets) if args.tickets else source
+    groups = np.arange(len(records)) % len(source)
+    # Source tickets are the labelled history; each group is one of them
+    truth = {field: factorize([item.get(key) for item in source]) for field, key in FIELDS.items()}
+
+    started = time.perf_counter()
+    vectors = encode([change_request_text(item) for item in records], batch_size=64)
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    print(f"Embedded {len(records)} tickets in {time.perf_counter() - started:.1f}s")
+
+    max_k = min(max(args.k), len(source) - 1)
+    started = time.perf_counter()
+    neighbour_ids, neighbour_scores = neighbours(vectors, groups, max_k)
+    print(f"Brute-force top-{max_k} for {len(records)} queries in {time.perf_counter() - started:.2f}s\n")
+
+    print(f"{'field':<18} {'k':>3} {'top-1':>7} {'majority':>9} {'weighted':>9} {'auto-fill':>10} {'auto acc':>9}")
+    for field in FIELDS:
+        codes, values = truth[field]
+        actual = codes[groups]
+        labelled = actual >= 0
+        for k in sorted(set(min(k, max_k) for k in args.k)):
+            labels = codes[neighbour_ids[:, :k]]
+            top1 = labels[:, 0]
+            majority, _ = weighted_vote(labels, np.ones(labels.shape), len(values))
+            weighted, confidence = weighted_vote(labels, similarity_weights(neighbour_scores[:, :k]), len(values))
+            confident = labelled & (confidence >= args.threshold)
+
+            def accuracy(predicted, mask=labelled):
+                return float(np.mean(predicted[mask] == actual[mask])) if mask.any() else float("nan")
+
+            print(
+                f"{field:<18} {k:>3} {accuracy(top1):>7.1%} {accuracy(majority):>9.1%} {accuracy(weighted):>9.1%} "
+                f"{confident.sum() / max(labelled.sum(), 1):>10.1%} {accuracy(weighted, confident):>9.1%}"
+            )
+        print()
+
+    # Vote throughput: one vectorised call for every ticket vs. the per-ticket path the enhancer uses
+    k = min(10, max_k)
+    started = time.perf_counter()
+    weights = similarity_weights(neighbour_scores[:, :k])
+    for field in FIELDS:
+        codes, values = truth[field]
+        weighted_vote(codes[neighbour_ids[:, :k]], weights, len(values))
+    batched = time.perf_counter() - started
+
+    sample = min(len(records), 1000)
+    started = time.perf_counter()
+    for row in range(sample):
+        hits = [
+            Hit("change_request_history", int(i), float(score), {f: source[i].get(key) for f, key in FIELDS.items()})
+            for i, score in zip(neighbour_ids[row, :k], neighbour_scores[row, :k])
+        ]
+        infer_fields(hits, list(FIELDS))
+    per_ticket = (time.perf_counter() - started) / sample
+
+    print(f"Vectorised vote, k={k}: {len(records) / batched:,.0f} tickets/s ({len(FIELDS)} fields)")
+    print(f"Per-ticket infer_fields, k={k}: {per_ticket * 1000:.3f} ms/ticket")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Parity, speed and memory of the int8 ONNX embedding backend against torch.
+
+Each backend runs in a fresh process so resident memory is comparable.
+Parity is the per-text cosine between torch and ONNX vectors on the bundled
+snow_history.json and change_request_data.json, plus how often both backends
+pick the same nearest neighbour. Exits non-zero when the mean cosine drops
+below --min-cosine.
+
+    python benchmarks/bench_onnx_embeddings.py --min-cosine 0.98
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.datasets import change_request_texts, incident_texts
+from retrieval.embeddings import default_model_name, load_model
+
+
+def profile_backend(backend: str, model_name: str, texts, batch_size: int, single_queries: int):
+    import psutil
+
+    process = psutil.Process()
+    rss_start = process.memory_info().rss
+
+    started = time.perf_counter()
+    model = load_model(model_name, backend)
+    model.encode(["warmup"])
+    load_s = time.perf_counter() - started
+    rss_loaded = process.memory_info().rss
+
+    started = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False))
+    batch_s = time.perf_counter() - started
+
+    latencies = []
+    for text in texts[:single_queries]:
+        started = time.perf_counter()
+        model.encode([text], batch_size=1, convert_to_numpy=True, show_progress_bar=False)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "backend": backend,
+        "load_s": load_s,
+        "model_rss_mb": (rss_loaded - rss_start) / 2**20,
+        "peak_rss_mb": process.memory_info().rss / 2**20,
+        "texts_per_s": len(texts) / batch_s,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "vectors": vectors,
+    }
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def parity(reference: np.ndarray, candidate: np.ndarray):
+    reference, candidate = normalize(reference), normalize(candidate)
+    cosine = np.sum(reference * candidate, axis=1)
+
+    def nearest(vectors):
+        sims = vectors @ vectors.T
+        np.fill_diagonal(sims, -np.inf)
+        return sims.argmax(axis=1)
+
+    neighbour_agreement = float(np.mean(nearest(reference) == nearest(candidate)))
+    return float(cosine.mean()), float(cosine.min()), neighbour_agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=default_model_name())
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--single-queries", type=int, default=100)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args()
+
+    datasets = {
+        "snow_history.json": incident_texts(),
+        "change_request_data.json": change_request_texts(),
+    }
+    texts = [text for dataset in datasets.values() for text in dataset]
+
+    results = {}
+    for backend in ("torch", "onnx"):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results[backend] = pool.submit(
+                profile_backend, backend, args.model, texts, args.batch_size, args.single_queries
+            ).result()
+
+    print(f"\nModel: {args.model} | {len(texts)} texts")
+    print(f"{'backend':<8} {'load s':>8} {'model MB':>9} {'peak MB':>9} {'texts/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for backend, result in results.items():
+        print(
+            f"{backend:<8} {result['load_s']:>8.2f} {result['model_rss_mb']:>9.0f} {result['peak_rss_mb']:>9.0f} "
+            f"{result['texts_per_s']:>9.1f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+        )
+
+    print(f"\n{'dataset':<26} {'mean cos':>9} {'min cos':>9} {'same NN':>8}")
+    offset = 0
+    worst_mean = 1.0
+    for name, dataset in datasets.items():
+        rows = slice(offset, offset + len(dataset))
+        mean_cos, min_cos, agreement = parity(results["torch"]["vectors"][rows], results["onnx"]["vectors"][rows])
+        worst_mean = min(worst_mean, mean_cos)
+        print(f"{name:<26} {mean_cos:>9.4f} {min_cos:>9.4f} {agreement:>8.1%}")
+        offset += len(dataset)
+
+    if worst_mean < args.min_cosine:
+        print(f"\n❌ Parity check failed: mean cosine {worst_mean:.4f} < {args.min_cosine}")
+        sys.exit(1)
+    print(f"\n✅ Parity check passed (mean cosine >= {args.min_cosine})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Relevance and latency of the cross-encoder re-ranking stage.
+
+Queries are the short titles of the bundled incidents and change requests;
+each has exactly one relevant document, its own description, among all the
+others. For every --top-n the bi-encoder ranking of the candidates is
+compared with the cross-encoder re-ranking (hit@k and MRR of the relevant
+document, when it is among the candidates), then every --budget-ms is
+replayed through retrieval.rerank to show how often the budget cuts
+re-ranking short and what it costs per request.
+
+    python benchmarks/bench_rerank.py --top-n 10 20 40 --budget-ms 50 100 250
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.datasets import CHANGE_REQUEST_FILE, SNOW_HISTORY_FILE, load_json
+from retrieval.embeddings import encode
+from retrieval.rerank import CrossEncoderReranker, rerank_model_name
+from retrieval.service import Hit
+
+
+def pairs():
+    """(query, relevant document) per bundled ticket that has both."""
+    found = [(item.get('title'), item.get('description')) for item in load_json(SNOW_HISTORY_FILE)]
+    found += [(item.get('Short description'), item.get('Description')) for item in load_json(CHANGE_REQUEST_FILE)]
+    return [(query, doc) for query, doc in found if query and doc and doc != 'NA']
+
+
+def ranking_metrics(ranked, k):
+    """hit@k and MRR from the relevant document's position in each ranking (-1: not a candidate)."""
+    positions = np.asarray(ranked)
+    hit = float(np.mean((positions >= 0) & (positions < k)))
+    mrr = float(np.mean(np.where(positions >= 0, 1.0 / (positions + 1), 0.0)))
+    return hit, mrr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--top-n", type=int, nargs="+", default=[10, 20, 40])
+    parser.add_argument("--budget-ms", type=float, nargs="+", default=[50, 100, 250, 500])
+    args = parser.parse_args()
+
+    data = pairs()
+    queries = [query for query, _ in data]
+    docs = [doc for _, doc in data]
+    started = time.perf_counter()
+    doc_vectors = encode(docs, batch_size=64)
+    query_vectors = encode(queries, batch_size=64)
+    doc_vectors /= np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    print(f"Embedded {len(docs)} documents and queries in {time.perf_counter() - started:.1f}s")
+
+    reranker = CrossEncoderReranker()
+    started = time.perf_counter()
+    reranker.model()
+    print(f"Cross-encoder {rerank_model_name()} ready in {time.perf_counter() - started:.1f}s\n")
+
+    sims = query_vectors @ doc_vectors.T
+    print(f"{'top-n':>5} {'bi hit@' + str(args.k):>10} {'bi MRR':>7} {'ce hit@' + str(args.k):>10} {'ce MRR':>7} "
+          f"{'ce p50 ms':>10} {'ce p95 ms':>10}")
+    for top_n in args.top_n:
+        bi_positions, ce_positions, latencies = [], [], []
+        for row, query in enumerate(queries):
+            candidates = np.argsort(-sims[row])[:top_n]
+            hits = [Hit("bench", int(i), float(sims[row, i]), {"description": docs[i]}) for i in candidates]
+            started = time.perf_counter()
+            reranked = reranker.rerank(query, hits, budget=60.0)
+            latencies.append((time.perf_counter() - started) * 1000)
+            bi_positions.append(next((p for p, hit in enumerate(hits) if hit.id == row), -1))
+            ce_positions.append(next((p for p, hit in enumerate(reranked) if hit.id == row), -1))
+        bi_hit, bi_mrr = ranking_metrics(bi_positions, args.k)
+        ce_hit, ce_mrr = ranking_metrics(ce_positions, args.k)
+        print(
+            f"{top_n:>5} {bi_hit:>10.1%} {bi_mrr:>7.3f} {ce_hit:>10.1%} {ce_mrr:>7.3f} "
+            f"{np.percentile(latencies, 50):>10.1f} {np.percentile(latencies, 95):>10.1f}"
+        )
+
+    top_n = max(args.top_n)
+    print(f"\nBudget replay at top-n={top_n}")
+    print(f"{'budget ms':>9} {'re-ranked':>10} {'timeouts':>9} {'p95 ms':>8} {'max ms':>8}")
+    for budget in args.budget_ms:
+        reranker.reset_stats()
+        # Every cut-short request logs its fallback; only the totals matter here
+        with contextlib.redirect_stdout(io.StringIO()):
+            for row, query in enumerate(queries):
+                candidates = np.argsort(-sims[row])[:top_n]
+                hits = [Hit("bench", int(i), float(sims[row, i]), {"description": docs[i]}) for i in candidates]
+                reranker.rerank(query, hits, budget=budget / 1000)
+        stats = reranker.stats()
+        print(
+            f"{budget:>9.0f} {stats['reranked'] / stats['calls']:>10.1%} {stats['timeout_rate']:>9.1%} "
+            f"{stats['p95_ms']:>8.1f} {stats['max_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
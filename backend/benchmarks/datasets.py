@@ -0,0 +1,59 @@
+"""
+Bundled ServiceNow exports used by the benchmarks, with the same embedding
+text recipes the upload scripts use.
+"""
+
+import json
+import os
+import random
+from typing import Dict, List
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+SNOW_HISTORY_FILE = os.path.join(REPO_ROOT, "Milvus_data_upload", "snow_history.json")
+CHANGE_REQUEST_FILE = os.path.join(REPO_ROOT, "Milvus_data_upload", "change_request_data.json")
+
+
+def load_json(path: str):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def incident_texts(path: str = SNOW_HISTORY_FILE) -> List[str]:
+    return [f"{item['title']}. {item['description']}" for item in load_json(path)]
+
+
+def change_request_text(item: Dict) -> str:
+    parts = [
+        item.get('Short description', ''),
+        item.get('Description', ''),
+        item.get('Type', ''),
+        item.get('Configuration item', ''),
+        item.get('Change plan', ''),
+        item.get('Justification', ''),
+        item.get('Implementation plan', ''),
+        item.get('Backout plan', ''),
+        item.get('Test plan', '')
+    ]
+    return '. '.join([part for part in parts if part and part != 'NA'])
+
+
+def change_requests(path: str = CHANGE_REQUEST_FILE) -> List[Dict]:
+    return load_json(path)
+
+
+def change_request_texts(path: str = CHANGE_REQUEST_FILE) -> List[str]:
+    return [change_request_text(item) for item in change_requests(path)]
+
+
+def scale_records(records: List[Dict], target: int, seed: int = 7) -> List[Dict]:
+    """Synthetic backfill: copies of the bundled records with fresh numbers and shuffled sentences."""
+    rng = random.Random(seed)
+    scaled = []
+    for i in range(target):
+        item = dict(records[i % len(records)])
+        item['Number'] = f"CHG{i + 1:07d}"
+        sentences = [s for s in (item.get('Description') or '').replace('\n', ' ').split('. ') if s.strip()]
+        rng.shuffle(sentences)
+        item['Description'] = '. '.join(sentences)
+        scaled.append(item)
+    return scaled
@@ -22,8 +22,15 @@ from hypercorn.asyncio import serve
 import os
 from dotenv import load_dotenv
 from langchain_core.tools import tool
-from pymilvus import connections, utility, Collection
-from sentence_transformers import SentenceTransformer
+from retrieval.diversity import mmr_lambda, top_k
+from retrieval.embeddings import warmup
+from retrieval.filters import change_filters, incident_filters
+from retrieval.formatting import CHANGE_LONG_TEXT_FIELDS, INCIDENT_LONG_TEXT_FIELDS, format_ticket_details
+from retrieval.milvus import milvus
+from retrieval.projection import field_budgets
+from retrieval.query_cache import query_embedding_cache
+from retrieval.rerank import reranker
+from retrieval.service import CollectionNotFound, retrieval_service
 from langchain_mcp_adapters.client import MultiServerMCPClient
 import asyncio
 from flask import Flask, request, jsonify
@@ -501,148 +508,74 @@ def update_change_dates(change_sys_id: str, new_start_date: str, new_end_date: s
 # MILVUS RETRIEVAL TOOLS
 # ============================================================================
 @tool
-def search_similar_incidents(description: str) -> str:
-    """Search for similar historical incidents in Milvus based on description."""
-    MILVUS_HOST = os.getenv('MILVUS_HOST', "")
-    MILVUS_PORT = os.getenv('MILVUS_PORT', "19530")
-    COLLECTION_NAME = "incident_history"
-
+async def search_similar_incidents(
+    description: str,
+    category: Optional[str] = None,
+    state: Optional[str] = None,
+    exclude_closed: bool = False,
+    opened_after: Optional[str] = None,
+    opened_before: Optional[str] = None,
+) -> str:
+    """Search for similar historical incidents in Milvus based on description.
+    Optional filters narrow the candidates before ranking: category, state,
+    exclude_closed (skip Closed/Resolved/Canceled) and opened_after /
+    opened_before dates (YYYY-MM-DD)."""
+    filters = incident_filters(category, state, exclude_closed, opened_after, opened_before)
     try:
-        connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
-        if not utility.has_collection(COLLECTION_NAME):
-            return "No incident history available"
-
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-
-        model = SentenceTransformer(os.getenv('EMBEDDING_MODEL', "all-MiniLM-L6-v2"))
-        query_embedding = model.encode([description]).tolist()
-
-        schema = collection.schema
-        output_fields = [field.name for field in schema.fields if field.name not in ["embedding", "id"]]
-
-        results = collection.search(
-            query_embedding,
-            "embedding",
-            {"metric_type": "COSINE", "params": {"nprobe": 10}},
-            limit=1,
-            output_fields=output_fields
+        hits = await retrieval_service.search(
+            "incident_history", description, k=top_k(1), filters=filters, diversity=mmr_lambda(),
+            budgets=field_budgets(),
         )
-
-        if not results[0]:
-            return "No similar incidents found"
-
-        matches = []
-        for idx, hit in enumerate(results[0], 1):
-            entity = hit.entity
-            incident_number = entity.get('number', f'Incident #{idx}')
-
-            match_parts = [
-                f"{'='*70}",
-                f"SIMILAR INCIDENT #{idx}: {incident_number}",
-                f"Similarity Score: {hit.score:.2%}",
-                f"{'='*70}",
-                ""
-            ]
-
-            for field in output_fields:
-                if field == 'number':
-                    continue
-                
-                value = entity.get(field, 'NA')
-                field_name = field.replace('_', ' ').title()
-
-                long_text_fields = ['description', 'short_description', 'correlation_display', 
-                                    'work_notes', 'comments', 'close_notes', 'resolution_notes']
-                
-                if field in long_text_fields and value and value != 'NA' and len(str(value)) > 50:
-                    match_parts.append(f"\n**{field_name}**:")
-                    match_parts.append(f"{value}")
-                else:
-                    match_parts.append(f"**{field_name}**: {value}")
-
-            matches.append("\n".join(match_parts))
-
-        connections.disconnect("default")
-        return "\n\n".join(matches)
-
+    except CollectionNotFound:
+        return "No incident history available"
     except Exception as e:
         print(f"[Milvus] ✗ Error: {e}")
         return f"Error searching incidents: {str(e)}"
 
+    print(f"[Embedding Cache] {query_embedding_cache.summary()}")
+    if not hits:
+        return "No similar incidents found"
 
-@tool
-def search_similar_change_requests(description: str) -> str:
-    """Search for similar historical change requests in Milvus."""
-    MILVUS_HOST = os.getenv('MILVUS_HOST', "172.17.204.5")
-    MILVUS_PORT = os.getenv('MILVUS_PORT', "19530")
-    COLLECTION_NAME = "develoepr_change_request_history"
-
-    try:
-        connections.connect(alias='default', host=MILVUS_HOST, port=MILVUS_PORT)
-        if not utility.has_collection(COLLECTION_NAME):
-            return "No change request history available"
-
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-
-        model = SentenceTransformer(os.getenv('EMBEDDING_MODEL', "all-MiniLM-L6-v2"))
-        query_embedding = model.encode([description]).tolist()
+    return format_ticket_details(hits, "SIMILAR INCIDENT", "Incident", INCIDENT_LONG_TEXT_FIELDS)
 
-        schema = collection.schema
-        output_fields = [field.name for field in schema.fields if field.name not in ["embedding", "id"]]
 
-        results = collection.search(
-            query_embedding,
-            "embedding",
-            {"metric_type": "COSINE", "params": {"nprobe": 10}},
-            limit=1,
-            output_fields=output_fields
+@tool
+async def search_similar_change_requests(
+    description: str,
+    configuration_item: Optional[str] = None,
+    change_type: Optional[str] = None,
+    state: Optional[str] = None,
+    exclude_closed: bool = False,
+    planned_after: Optional[str] = None,
+    planned_before: Optional[str] = None,
+) -> str:
+    """Search for similar historical change requests in Milvus.
+    Optional filters narrow the candidates before ranking: configuration_item,
+    change_type (Normal/Standard/Emergency), state, exclude_closed (skip
+    Closed/Canceled) and planned_after / planned_before dates (YYYY-MM-DD)."""
+    filters = change_filters(configuration_item, change_type, state, None, exclude_closed, planned_after, planned_before)
+    try:
+        hits = await retrieval_service.search(
+            "develoepr_change_request_history", description, k=top_k(1), filters=filters, diversity=mmr_lambda(),
+            budgets=field_budgets(),
         )
-
-        if not results[0]:
-            return "No similar change requests found"
-
-        matches = []
-        for idx, hit in enumerate(results[0], 1):
-            entity = hit.entity
-            change_number = entity.get('number', f'Change Request #{idx}')
-
-            match_parts = [
-                f"{'='*70}",
-                f"SIMILAR CHANGE REQUEST #{idx}: {change_number}",
-                f"Similarity Score: {hit.score:.2%}",
-                f"{'='*70}",
-                ""
-            ]
-
-            for field in output_fields:
-                if field == 'number':
-                    continue
-                
-                value = entity.get(field, 'NA')
-                field_name = field.replace('_', ' ').title()
-
-                long_text_fields = ['description', 'short_description', 'justification', 
-                                    'implementation_plan', 'backout_plan', 'test_plan', 
-                                    'risk_impact_analysis', 'change_plan', 'cab_required',
-                                    'start_date', 'end_date']
-                
-                if field in long_text_fields and value and value != 'NA' and len(str(value)) > 50:
-                    match_parts.append(f"\n**{field_name}**:")
-                    match_parts.append(f"{value}")
-                else:
-                    match_parts.append(f"**{field_name}**: {value}")
-
-            matches.append("\n".join(match_parts))
-
-        connections.disconnect("default")
-        return "\n\n".join(matches)
-
+    except CollectionNotFound:
+        return "No change request history available"
     except Exception as e:
         print(f"[Milvus] ✗ Error: {e}")
         return f"Error searching change requests: {str(e)}"
 
+    print(f"[Embedding Cache] {query_embedding_cache.summary()}")
+    if not hits:
+        return "No similar change requests found"
+
+    return format_ticket_details(
+        hits,
+        "SIMILAR CHANGE REQUEST",
+        "Change Request",
+        CHANGE_LONG_TEXT_FIELDS + ('cab_required', 'start_date', 'end_date'),
+    )
+
 
 # ============================================================================
 # HELPER FUNCTION TO EXTRACT FINAL AI MESSAGE
@@ -1110,4 +1043,9 @@ if __name__ == '__main__':
     config.workers = 1 
     config.keep_alive_timeout = 120
     
+    # Load the embedding model and Milvus collections once before the first chat request needs them
+    warmup()
+    reranker.warmup()
+    milvus.preload(["incident_history", "develoepr_change_request_history"])
+    
     asyncio.run(serve(app, config))
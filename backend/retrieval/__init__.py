@@ -0,0 +1,45 @@
+"""
+Shared retrieval layer for the ITSM agents and the Milvus upload scripts.
+"""
+
+from .batching import BatchingEmbedder, get_batcher
+from .embeddings import EmbeddingRegistry, aencode, encode, get_model, registry, warmup
+from .fallback import FallbackIndex, export_fallback_index, fallback_store
+from .fanout import FanoutResult, fanout_search, fanout_search_sync
+from .milvus import MilvusConnectionManager, MilvusUnavailable, milvus
+from .query_cache import QueryEmbeddingCache, normalize_query, query_embedding_cache
+from .rerank import CrossEncoderReranker, reranker
+from .semantic_cache import SemanticResultCache, mark_collection_changed, semantic_cache
+from .service import CollectionNotFound, Hit, RetrievalService, retrieval_service
+
+__all__ = [
+    "BatchingEmbedder",
+    "CollectionNotFound",
+    "CrossEncoderReranker",
+    "EmbeddingRegistry",
+    "FallbackIndex",
+    "FanoutResult",
+    "Hit",
+    "MilvusConnectionManager",
+    "MilvusUnavailable",
+    "QueryEmbeddingCache",
+    "RetrievalService",
+    "SemanticResultCache",
+    "aencode",
+    "encode",
+    "export_fallback_index",
+    "fallback_store",
+    "fanout_search",
+    "fanout_search_sync",
+    "get_batcher",
+    "get_model",
+    "mark_collection_changed",
+    "milvus",
+    "normalize_query",
+    "query_embedding_cache",
+    "registry",
+    "reranker",
+    "retrieval_service",
+    "semantic_cache",
+    "warmup",
+]
@@ -0,0 +1,139 @@
+"""
+Micro-batching embedding executor.
+
+Concurrent /chat requests each need a single query vector. Instead of running
+the transformer once per query, submitted texts are queued and a worker
+thread coalesces everything that arrives within max_wait_ms (up to
+max_batch_size texts) into one encode() call. Every caller gets a future that
+resolves with its own vector, usable from threads or from asyncio.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .embeddings import default_model_name, encode
+
+_STOP = object()
+
+
+class BatchingEmbedder:
+    """Coalesces single-query encode requests into batched model calls."""
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        self.model_name = model_name or default_model_name()
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"embed-batcher-{self.model_name}", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text; the returned future resolves with its vector."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(text).result(timeout)
+
+    async def aencode(self, text: str) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self, first: Tuple[str, Future]) -> Tuple[list, bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect(first)
+
+            # Drop callers that gave up while waiting in the queue
+            live = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+
+            try:
+                vectors = encode([text for text, _ in live], self.model_name, batch_size=len(live))
+            except Exception as e:
+                for _, future in live:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(live)
+            for (_, future), vector in zip(live, vectors):
+                future.set_result(vector)
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+_batchers: Dict[str, BatchingEmbedder] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model_name: Optional[str] = None) -> BatchingEmbedder:
+    """Process-wide batcher for a model, configured from EMBED_BATCH_* env vars."""
+    name = model_name or default_model_name()
+    batcher = _batchers.get(name)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(name)
+            if batcher is None:
+                batcher = BatchingEmbedder(
+                    name,
+                    max_batch_size=int(os.getenv('EMBED_BATCH_MAX_SIZE', "32")),
+                    max_wait_ms=float(os.getenv('EMBED_BATCH_MAX_WAIT_MS', "5")),
+                )
+                _batchers[name] = batcher
+    return batcher
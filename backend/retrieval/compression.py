@@ -0,0 +1,153 @@
+"""
+Compressed dense vectors with full-precision re-ranking.
+
+VECTOR_STORAGE picks what the upload scripts put in Milvus:
+
+  float   FLOAT_VECTOR 'embedding', index from retrieval.tuning (default)
+  sq8     the same field indexed with IVF_SQ8: one byte per dimension in
+          memory instead of four
+  binary  BINARY_VECTOR 'embedding_bits' (sign bit per dimension, 48 bytes
+          for MiniLM) under BIN_IVF_FLAT/HAMMING; no float vector in Milvus
+
+Compressed collections are searched for RERANK_OVERFETCH times more
+candidates, which are then re-scored by exact cosine against the
+full-precision vectors in the memory-mapped fallback export (see
+retrieval.fallback), keyed by Milvus primary key. Candidates missing from
+the export keep their approximate score; a collection with no export at all
+is warned about once, and the ids left unscored are counted in stats().
+"""
+
+import math
+import os
+import threading
+from typing import Any, Dict, List, Sequence, Set
+
+import numpy as np
+from pymilvus import Collection, DataType, FieldSchema
+
+from .tuning import VECTOR_FIELD, index_params
+
+BINARY_FIELD = "embedding_bits"
+QUANTIZED_INDEX_TYPES = ("IVF_SQ8", "IVF_PQ")
+STORAGE_MODES = ("float", "sq8", "binary")
+
+
+def vector_storage() -> str:
+    mode = os.getenv('VECTOR_STORAGE', "float").strip().lower()
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown VECTOR_STORAGE '{mode}', expected one of {', '.join(STORAGE_MODES)}")
+    return mode
+
+
+def rerank_overfetch() -> int:
+    return int(os.getenv('RERANK_OVERFETCH', "4"))
+
+
+def binary_search_params() -> Dict[str, Any]:
+    return {"metric_type": "HAMMING", "params": {"nprobe": int(os.getenv('BINARY_NPROBE', "16"))}}
+
+
+# ============================================================================
+# Ingest side
+# ============================================================================
+
+def dense_fields(dim: int) -> List[FieldSchema]:
+    """The dense vector field for the configured storage mode."""
+    if vector_storage() == "binary":
+        return [FieldSchema(name=BINARY_FIELD, dtype=DataType.BINARY_VECTOR, dim=dim)]
+    return [FieldSchema(name=VECTOR_FIELD, dtype=DataType.FLOAT_VECTOR, dim=dim)]
+
+
+def pack_binary(vectors) -> List[bytes]:
+    """One bit per dimension, set where the component is positive."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return [row.tobytes() for row in np.packbits(vectors > 0, axis=1)]
+
+
+def dense_column(vectors) -> List[Any]:
+    """Insert column for the field dense_fields() declared."""
+    if vector_storage() == "binary":
+        return pack_binary(vectors)
+    return np.asarray(vectors, dtype=np.float32).tolist()
+
+
+def create_dense_index(collection: Collection, name: str) -> None:
+    storage = vector_storage()
+    params = index_params(name)
+    if storage == "binary":
+        nlist = params.get("params", {}).get("nlist", 128)
+        collection.create_index(
+            field_name=BINARY_FIELD,
+            index_params={"index_type": "BIN_IVF_FLAT", "metric_type": "HAMMING", "params": {"nlist": nlist}},
+        )
+        return
+    if storage == "sq8" and params["index_type"] not in QUANTIZED_INDEX_TYPES:
+        params = {"index_type": "IVF_SQ8", "metric_type": params.get("metric_type", "COSINE"),
+                  "params": {"nlist": params.get("params", {}).get("nlist", 128)}}
+    collection.create_index(field_name=VECTOR_FIELD, index_params=params)
+
+
+# ============================================================================
+# Query side
+# ============================================================================
+
+_stats_lock = threading.Lock()
+_stats = {"rescored": 0, "unscored": 0}
+_missing_exports: Set[str] = set()
+
+
+def _count(rescored: int, unscored: int) -> None:
+    with _stats_lock:
+        _stats["rescored"] += rescored
+        _stats["unscored"] += unscored
+
+
+def stats() -> Dict[str, Any]:
+    """Ids given full-precision vectors vs left without, and collections with no export."""
+    with _stats_lock:
+        return {"storage": vector_storage(), **_stats, "missing_exports": sorted(_missing_exports)}
+
+
+def hamming_to_cosine(distance: float, dim: int) -> float:
+    """Sign-bit (SimHash) estimate of the cosine from a Hamming distance."""
+    return math.cos(math.pi * distance / dim)
+
+
+def full_precision_vectors(collection: str, ids: Sequence[Any]) -> Dict[Any, np.ndarray]:
+    """Unit-norm exported vector for every id found in the collection's fallback export."""
+    from .fallback import fallback_store
+
+    if not ids:
+        return {}
+    if not fallback_store.available(collection):
+        with _stats_lock:
+            first = collection not in _missing_exports
+            _missing_exports.add(collection)
+        if first:
+            print(
+                f"[Compression] No fallback export for '{collection}'; its hits keep approximate scores "
+                f"until the upload script exports one"
+            )
+        _count(0, len(ids))
+        return {}
+    with _stats_lock:
+        _missing_exports.discard(collection)
+    index = fallback_store.index(collection)
+    rows = index.rows(ids)
+    found = [(hit_id, row) for hit_id, row in zip(ids, rows) if row >= 0]
+    _count(len(found), len(ids) - len(found))
+    if not found:
+        return {}
+    vectors = np.asarray(index.vectors[[row for _, row in found]])
+    return {hit_id: vector for (hit_id, _), vector in zip(found, vectors)}
+
+
+def full_precision_scores(collection: str, query_vector, ids: Sequence[Any]) -> Dict[Any, float]:
+    """Exact cosine for every id found in the collection's exported vectors."""
+    vectors = full_precision_vectors(collection, ids)
+    if not vectors:
+        return {}
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+    scores = np.stack(list(vectors.values())) @ query
+    return {hit_id: float(score) for hit_id, score in zip(vectors, scores)}
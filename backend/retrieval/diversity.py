@@ -0,0 +1,67 @@
+"""
+Top-k controls: maximal marginal relevance and a similarity floor.
+
+Ticket histories are full of near-duplicates, so the plain top-k is often the
+same incident several times. With a diversity lambda below 1, the retrieval
+service fetches MMR_OVERFETCH times more candidates and picks k of them
+greedily by
+
+    lambda * sim(query, hit) - (1 - lambda) * max sim(hit, already picked)
+
+RETRIEVAL_MIN_SCORE drops hits whose cosine similarity to the query is
+below the floor before anything is rendered; on uncompressed collections it
+is also pushed into Milvus as a range search radius.
+"""
+
+import os
+from typing import List, Optional
+
+import numpy as np
+
+
+def mmr_lambda() -> float:
+    """Relevance weight for callers that want diversified results (1.0 = plain top-k)."""
+    return float(os.getenv('MMR_LAMBDA', "0.7"))
+
+
+def mmr_overfetch() -> int:
+    return int(os.getenv('MMR_OVERFETCH', "4"))
+
+
+def score_floor() -> float:
+    """Minimum cosine similarity a hit needs to be returned (0 disables)."""
+    return float(os.getenv('RETRIEVAL_MIN_SCORE', "0.25"))
+
+
+def top_k(default: int) -> int:
+    """Number of hits the search tools return (RETRIEVAL_TOP_K)."""
+    return int(os.getenv('RETRIEVAL_TOP_K', str(default)))
+
+
+def diversifies(diversity: Optional[float]) -> bool:
+    return diversity is not None and diversity < 1.0
+
+
+def mmr(relevance, vectors, k: int, diversity: float) -> List[int]:
+    """Row indices chosen by MMR, in pick order.
+
+    relevance is each candidate's cosine similarity to the query (Hit.score,
+    exact even after a compressed or hybrid search); vectors are the
+    candidates' embeddings, compared with each other for redundancy.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not len(vectors):
+        return []
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    redundancy = np.full(len(vectors), -np.inf, dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    picked: List[int] = []
+    for _ in range(min(k, len(vectors))):
+        score = relevance if not picked else diversity * relevance - (1 - diversity) * redundancy
+        best = int(np.argmax(np.where(available, score, -np.inf)))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return picked
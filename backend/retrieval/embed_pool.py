@@ -0,0 +1,178 @@
+"""
+Multi-process embedding for large backfills.
+
+Encoding a full backfill in one process keeps one model busy while the rest
+of the host sits idle, and it is the longest step of a reindex. With
+INGEST_EMBED_WORKERS > 1, embed_texts() hands the texts it has to encode to
+an EmbeddingPool instead:
+
+  - spawned worker processes, each loading its own copy of the model once
+    (and limited to cpu_count / workers intra-op threads so they do not
+    oversubscribe the host)
+  - work split into runs of whole INGEST_BATCH_SIZE batches, longest texts
+    first, so batches are the same ones a single process would encode
+  - every worker writes its vectors straight into one SharedMemory block at
+    the run's offset, so results are not pickled back and the output order
+    is fixed by position, not by which worker finished first
+
+Workers are spawned, not forked, so a script using this must keep its
+top-level work under `if __name__ == "__main__":`; the upload scripts do.
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .embeddings import default_model_name, embedding_backend, load_model
+
+# Runs per worker; more than one so a worker that drew long texts does not hold up the rest
+RUNS_PER_WORKER = 4
+
+
+def embed_workers() -> int:
+    """Processes encoding in parallel during ingestion; 1 encodes in-process."""
+    return max(1, int(os.getenv('INGEST_EMBED_WORKERS', "1")))
+
+
+# ============================================================================
+# Worker side
+# ============================================================================
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, backend: str, threads: int) -> None:
+    global _worker_model
+    # Before the backend is imported, so torch / onnxruntime size their pools from it
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    os.environ.setdefault("MKL_NUM_THREADS", str(threads))
+    _worker_model = load_model(model_name, backend)
+
+
+def _encode(texts: Sequence[str], batch_size: int) -> np.ndarray:
+    return np.asarray(
+        _worker_model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False),
+        dtype=np.float32,
+    )
+
+
+def _dimension() -> int:
+    return int(_encode(["dimension probe"], 1).shape[1])
+
+
+def _encode_run(name: str, shape: Tuple[int, int], begin: int, texts: Sequence[str], batch_size: int) -> List[float]:
+    """Encode texts batch by batch into rows [begin, begin + len(texts)) of the shared block."""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        output = np.ndarray(shape, dtype=np.float32, buffer=block.buf)
+        timings = []
+        for offset in range(0, len(texts), batch_size):
+            batch = texts[offset:offset + batch_size]
+            started = time.perf_counter()
+            output[begin + offset:begin + offset + len(batch)] = _encode(batch, len(batch))
+            timings.append((time.perf_counter() - started) * 1000)
+        del output
+    finally:
+        block.close()
+    return timings
+
+
+# ============================================================================
+# Parent side
+# ============================================================================
+
+class EmbeddingPool:
+    """Worker processes with one model each, encoding into shared memory."""
+
+    def __init__(self, workers: int, model_name: Optional[str] = None, backend: Optional[str] = None):
+        self.workers = workers
+        self.model_name = model_name or default_model_name()
+        self.backend = backend or embedding_backend()
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_name, self.backend, threads),
+        )
+        self._dim: Optional[int] = None
+
+    def dimension(self) -> int:
+        """Embedding width; the first call waits for a worker to load the model."""
+        if self._dim is None:
+            started = time.perf_counter()
+            self._dim = self._executor.submit(_dimension).result()
+            print(
+                f"[EmbedPool] {self.workers} workers for '{self.model_name}' ({self.backend}), "
+                f"first ready in {time.perf_counter() - started:.1f}s"
+            )
+        return self._dim
+
+    def encode(
+        self,
+        texts: Sequence[str],
+        batch_size: int,
+        on_run: Optional[Callable[[int, List[float]], None]] = None,
+    ) -> np.ndarray:
+        """(len(texts), dim) vectors in input order, encoded in batches of batch_size.
+
+        on_run(rows, batch_ms) is called in the parent as each run finishes.
+        """
+        total = len(texts)
+        dim = self.dimension()
+        if not total:
+            return np.zeros((0, dim), dtype=np.float32)
+
+        batches = (total + batch_size - 1) // batch_size
+        run_rows = batch_size * max(1, batches // (self.workers * RUNS_PER_WORKER))
+        block = shared_memory.SharedMemory(create=True, size=total * dim * 4)
+        futures = {}
+        try:
+            for begin in range(0, total, run_rows):
+                run = list(texts[begin:begin + run_rows])
+                futures[self._executor.submit(_encode_run, block.name, (total, dim), begin, run, batch_size)] = len(run)
+            for future in as_completed(futures):
+                timings = future.result()
+                if on_run is not None:
+                    on_run(futures[future], timings)
+            return np.ndarray((total, dim), dtype=np.float32, buffer=block.buf).copy()
+        except BaseException:
+            # No worker may still be writing when the block goes away
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            raise
+        finally:
+            block.close()
+            block.unlink()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pools: Dict[Tuple[int, str, str], EmbeddingPool] = {}
+_pools_lock = threading.Lock()
+
+
+def embedding_pool(workers: Optional[int] = None, model_name: Optional[str] = None) -> EmbeddingPool:
+    """Shared pool for a worker count and model, started on first use and kept for the run."""
+    key = (workers or embed_workers(), model_name or default_model_name(), embedding_backend())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = EmbeddingPool(*key)
+        return _pools[key]
+
+
+@atexit.register
+def close_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
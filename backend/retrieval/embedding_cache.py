@@ -0,0 +1,168 @@
+"""
+Content-addressed on-disk cache of document embeddings for ingestion.
+
+Re-running an upload after a schema tweak or a reindex used to re-encode
+every document. embed_texts() now looks each text up here first, keyed by a
+hash of the model (name and EMBEDDING_BACKEND) and the exact embedding
+text, and only sends misses through the transformer.
+
+One directory per model under EMBEDDING_CACHE_DIR:
+
+    meta.json    model, backend and dimension
+    vectors.f32  float32 rows, append-only, opened memory-mapped
+    keys.bin     16-byte key of each row, in row order; read into a dict on open
+
+Rows are appended vectors first, keys second, so a run killed mid-write
+leaves at most a tail that the next open trims. One writer per directory at
+a time; concurrent upload scripts should use separate EMBEDDING_CACHE_DIRs.
+EMBEDDING_CACHE=off bypasses it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .embeddings import default_model_name, embedding_backend
+
+KEY_BYTES = 16
+
+
+def embedding_cache_enabled() -> bool:
+    return os.getenv('EMBEDDING_CACHE', "on").strip().lower() in ("1", "true", "on", "yes")
+
+
+def embedding_cache_dir() -> str:
+    return os.getenv(
+        'EMBEDDING_CACHE_DIR', os.path.join(os.path.expanduser("~"), ".cache", "itsm-agent", "embeddings")
+    )
+
+
+class DiskEmbeddingCache:
+    """Append-only vector store for one model, addressed by hash of model and text."""
+
+    def __init__(self, model_name: str, backend: Optional[str] = None, directory: Optional[str] = None):
+        self.model_name = model_name
+        self.backend = backend or embedding_backend()
+        self._model_key = f"{self.model_name}\0{self.backend}".encode("utf-8")
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{self.model_name}-{self.backend}")
+        self.path = os.path.join(directory or embedding_cache_dir(), slug)
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        self.count = 0
+        self.hits = 0
+        self.misses = 0
+        self.written = 0
+        self._open()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        if not os.path.exists(self._file("meta.json")):
+            return
+        with open(self._file("meta.json"), encoding="utf-8") as f:
+            self.dim = int(json.load(f)["dim"])
+        keys = b""
+        if os.path.exists(self._file("keys.bin")):
+            with open(self._file("keys.bin"), "rb") as f:
+                keys = f.read()
+        vector_bytes = os.path.getsize(self._file("vectors.f32")) if os.path.exists(self._file("vectors.f32")) else 0
+        count = min(len(keys) // KEY_BYTES, vector_bytes // (4 * self.dim))
+        # Trim whatever an interrupted append left behind, part rows included
+        if len(keys) != count * KEY_BYTES:
+            with open(self._file("keys.bin"), "r+b") as f:
+                f.truncate(count * KEY_BYTES)
+        if vector_bytes != count * 4 * self.dim:
+            with open(self._file("vectors.f32"), "r+b") as f:
+                f.truncate(count * 4 * self.dim)
+        self._rows = {keys[i * KEY_BYTES:(i + 1) * KEY_BYTES]: i for i in range(count)}
+        self.count = count
+        self._map()
+
+    def _map(self) -> None:
+        self._vectors = (
+            np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(self.count, self.dim))
+            if self.count else None
+        )
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(self._model_key + b"\0" + text.encode("utf-8")).digest()[:KEY_BYTES]
+
+    def lookup(self, keys: Sequence[bytes]) -> np.ndarray:
+        """Cache row of each key, -1 where it is not cached."""
+        with self._lock:
+            rows = np.fromiter((self._rows.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+            found = int((rows >= 0).sum())
+            self.hits += found
+            self.misses += len(keys) - found
+        return rows
+
+    def vectors(self, rows: Sequence[int]) -> np.ndarray:
+        return np.asarray(self._vectors[np.asarray(rows)], dtype=np.float32)
+
+    def put(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        """Append vectors for keys not cached yet."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._file("meta.json"), "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model_name, "backend": self.backend, "dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding cache for '{self.model_name}' holds {self.dim}-d vectors, got {vectors.shape[1]}-d")
+
+            new: List[int] = []
+            for i, key in enumerate(keys):
+                if key not in self._rows:
+                    self._rows[key] = self.count + len(new)
+                    new.append(i)
+            if not new:
+                return
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(np.ascontiguousarray(vectors[new]).tobytes())
+            with open(self._file("keys.bin"), "ab") as f:
+                f.write(b"".join(keys[i] for i in new))
+            self.count += len(new)
+            self.written += len(new)
+            self._map()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "written": self.written,
+                "size": self.count,
+                "mb": round(self.count * 4 * (self.dim or 0) / 1e6, 1),
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']:.0%} "
+            f"written={stats['written']} size={stats['size']} ({stats['mb']:.1f} MB)"
+        )
+
+
+_caches: Dict[str, DiskEmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def disk_cache(model_name: Optional[str] = None) -> DiskEmbeddingCache:
+    """Shared cache for a model under the current EMBEDDING_CACHE_DIR and backend."""
+    name = model_name or default_model_name()
+    key = f"{embedding_cache_dir()}|{name}|{embedding_backend()}"
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = DiskEmbeddingCache(name)
+        return _caches[key]
@@ -0,0 +1,133 @@
+"""
+Process-wide embedding model registry.
+
+Each configured SentenceTransformer is loaded once per process and shared by
+the agent tools and the Milvus upload scripts. encode() is safe to call from
+several threads at once; aencode() runs the same work on the default executor
+so async agents never block the event loop while a query is embedded.
+
+EMBEDDING_BACKEND=onnx swaps the torch model for the int8 ONNX export in
+retrieval.onnx_backend behind the same interface.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+def default_model_name() -> str:
+    """Model used when a caller does not ask for a specific one."""
+    return os.getenv('EMBEDDING_MODEL', DEFAULT_EMBEDDING_MODEL)
+
+
+def embedding_backend() -> str:
+    """'torch' (SentenceTransformer, default) or 'onnx' (int8 onnxruntime)."""
+    return os.getenv('EMBEDDING_BACKEND', "torch").strip().lower()
+
+
+def load_model(model_name: str, backend: Optional[str] = None):
+    """Instantiate a model for the requested backend without caching it."""
+    backend = backend or embedding_backend()
+    if backend == "onnx":
+        from .onnx_backend import OnnxEmbeddingModel
+
+        return OnnxEmbeddingModel(model_name)
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected 'torch' or 'onnx'")
+
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+def configured_models() -> List[str]:
+    """All models to warm at boot (EMBEDDING_MODELS, comma separated)."""
+    names = [name.strip() for name in os.getenv('EMBEDDING_MODELS', '').split(',') if name.strip()]
+    return names or [default_model_name()]
+
+
+class EmbeddingRegistry:
+    """Loads every embedding model once and serialises access to it."""
+
+    def __init__(self):
+        self._models: Dict[str, object] = {}
+        self._model_locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def get(self, model_name: Optional[str] = None):
+        """Return the shared model instance, loading it on first use."""
+        name = model_name or default_model_name()
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._registry_lock:
+            model = self._models.get(name)
+            if model is None:
+                started = time.perf_counter()
+                model = load_model(name)
+                self._model_locks[name] = threading.Lock()
+                self._models[name] = model
+                print(
+                    f"[Embeddings] Loaded '{name}' ({embedding_backend()}) "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+        return model
+
+    def encode(
+        self,
+        texts: Union[str, Sequence[str]],
+        model_name: Optional[str] = None,
+        batch_size: int = 32,
+    ) -> np.ndarray:
+        """Embed one text (returns a vector) or a list of texts (returns a matrix)."""
+        name = model_name or default_model_name()
+        model = self.get(name)
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+
+        # Tokenizers are not safe for concurrent calls on the same instance
+        with self._model_locks[name]:
+            vectors = model.encode(
+                batch,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return vectors[0] if single else vectors
+
+    async def aencode(
+        self,
+        texts: Union[str, Sequence[str]],
+        model_name: Optional[str] = None,
+        batch_size: int = 32,
+    ) -> np.ndarray:
+        """Async variant of encode() that runs off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.encode, texts, model_name, batch_size)
+        )
+
+    def warmup(self, model_names: Optional[Sequence[str]] = None) -> None:
+        """Load and run each model once so the first request pays no start-up cost."""
+        for name in model_names or configured_models():
+            self.encode("warmup", name)
+        print(f"[Embeddings] Warm models: {', '.join(self.loaded_models())}")
+
+    def loaded_models(self) -> List[str]:
+        return list(self._models)
+
+
+registry = EmbeddingRegistry()
+
+get_model = registry.get
+encode = registry.encode
+aencode = registry.aencode
+warmup = registry.warmup
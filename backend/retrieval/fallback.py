@@ -0,0 +1,502 @@
+"""
+Embedded vector index used when Milvus cannot be reached.
+
+Upload scripts call export_fallback_index() with the full-precision vectors,
+scalar columns and Milvus primary keys they insert, or feed a FallbackWriter
+batch by batch when they stream. The export doubles as
+the re-rank source for compressed collections (see retrieval.compression).
+Each collection becomes a directory under RETRIEVAL_FALLBACK_DIR:
+
+    meta.json      count, dim, index kind, column names and export time
+    vectors.npy    unit-length float32 vectors, opened memory-mapped
+    ids.jsonl      primary keys, one JSON value per line
+    column-N.jsonl the Nth scalar column, likewise
+    *.offsets.npy  byte offset of each line (plus the end) of the .jsonl beside it
+    graph.npy      (graph only) neighbour lists, -1 padded
+    entry.npy      (graph only) sparse upper layer used to pick entry points
+
+Collections below FALLBACK_GRAPH_THRESHOLD vectors get a flat index: one
+matrix-vector product over the memmap. Larger ones also get a k-NN graph:
+a neighbour list per vector, approximated by NN-descent (exact below a few
+thousand vectors) so the build stays linear in the collection size, plus
+reverse edges, searched best-first from the closest upper-layer nodes with a
+beam of FALLBACK_EF. Keys and columns are memory-mapped too and a value is
+only decoded when a hit, filter or carry-over reads it.
+
+The retrieval service switches to these indexes by itself when Milvus is
+down (RETRIEVAL_FALLBACK=auto), never (off), or for every search (always),
+which is also how retrieval benchmarks run without outside services.
+"""
+
+import heapq
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .filters import Filters, matches
+
+# (primary key, cosine score, fields); the retrieval service wraps these in Hit
+Match = Tuple[Any, float, Dict[str, Any]]
+
+
+def fallback_dir() -> str:
+    return os.getenv('RETRIEVAL_FALLBACK_DIR', os.path.join(os.path.expanduser("~"), ".cache", "itsm-agent", "fallback"))
+
+
+def fallback_mode() -> str:
+    """'auto' (use when Milvus is down), 'off' or 'always'."""
+    return os.getenv('RETRIEVAL_FALLBACK', "auto").lower()
+
+
+def graph_threshold() -> int:
+    return int(os.getenv('FALLBACK_GRAPH_THRESHOLD', "20000"))
+
+
+def graph_degree() -> int:
+    return int(os.getenv('FALLBACK_GRAPH_M', "16"))
+
+
+def search_ef() -> int:
+    return int(os.getenv('FALLBACK_EF', "64"))
+
+
+def _unit_rows(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+# ============================================================================
+# Build
+# ============================================================================
+
+def _top_neighbours(rows: np.ndarray, ids: np.ndarray, scores: np.ndarray, degree: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best degree distinct candidates per row, self excluded, best first."""
+    scores = np.where(ids == rows[:, None], -np.inf, scores)
+    order = np.argsort(ids, axis=1, kind="stable")
+    ids, scores = np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+    # A pair has the same score every time it shows up, so any copy can go
+    scores[:, 1:][ids[:, 1:] == ids[:, :-1]] = -np.inf
+    top = np.argpartition(-scores, degree - 1, axis=1)[:, :degree]
+    ids, scores = np.take_along_axis(ids, top, axis=1), np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def _exact_neighbours(vectors: np.ndarray, degree: int, chunk: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    count = len(vectors)
+    forward = np.empty((count, degree), dtype=np.int32)
+    forward_scores = np.empty((count, degree), dtype=np.float32)
+    for begin in range(0, count, chunk):
+        sims = vectors[begin:begin + chunk] @ vectors.T
+        rows = np.arange(begin, begin + len(sims))
+        candidates = np.broadcast_to(np.arange(count), sims.shape)
+        forward[rows], forward_scores[rows] = _top_neighbours(rows, candidates, sims, degree)
+    return forward, forward_scores
+
+
+def _reverse_sample(forward: np.ndarray, width: int, rng: np.random.Generator) -> np.ndarray:
+    """Up to width random nodes that list each node as a neighbour, -1 padded."""
+    count, degree = forward.shape
+    reverse = np.full((count, width), -1, dtype=np.int32)
+    if not width:
+        return reverse
+    sources = np.repeat(np.arange(count, dtype=np.int32), degree)
+    targets = forward.ravel()
+    shuffle = rng.permutation(len(targets))
+    order = shuffle[np.argsort(targets[shuffle], kind="stable")]
+    sources, targets = sources[order], targets[order]
+    rank = np.arange(len(targets)) - np.searchsorted(targets, targets)
+    keep = rank < width
+    reverse[targets[keep], rank[keep]] = sources[keep]
+    return reverse
+
+
+def _nn_descent(
+    vectors: np.ndarray, degree: int, iterations: int = 12, delta: float = 0.002, chunk: int = 64, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Approximate k-NN lists by NN-descent: neighbours of neighbours (and of reverse
+    neighbours) are the candidates, so each round costs O(N * degree^2), not O(N^2)."""
+    count = len(vectors)
+    rng = np.random.default_rng(seed)
+    forward = rng.integers(0, count - 1, size=(count, degree), dtype=np.int32)
+    forward += forward >= np.arange(count, dtype=np.int32)[:, None]
+    forward_scores = np.empty((count, degree), dtype=np.float32)
+    for begin in range(0, count, 1024):
+        rows = slice(begin, begin + 1024)
+        forward_scores[rows] = np.einsum("cd,cnd->cn", vectors[rows], vectors[forward[rows]])
+
+    for _ in range(iterations):
+        reverse = _reverse_sample(forward, degree // 2, rng)
+        updates = 0
+        for begin in range(0, count, chunk):
+            rows = np.arange(begin, min(begin + chunk, count))
+            sources = np.concatenate([forward[rows], reverse[rows]], axis=1)
+            candidates = forward[np.where(sources >= 0, sources, rows[:, None])].reshape(len(rows), -1)
+            scores = np.einsum("cd,cnd->cn", vectors[rows], vectors[candidates])
+            ids, best = _top_neighbours(
+                rows,
+                np.concatenate([forward[rows], candidates], axis=1),
+                np.concatenate([forward_scores[rows], scores], axis=1),
+                degree,
+            )
+            updates += int((~(ids[:, :, None] == forward[rows][:, None, :]).any(axis=2)).sum())
+            # Updated in place, so later chunks of the same round already see the better lists
+            forward[rows], forward_scores[rows] = ids, best
+        if updates <= delta * count * degree:
+            break
+    return forward, forward_scores
+
+
+def build_graph(vectors: np.ndarray, degree: int = 16, exact_below: int = 5000) -> np.ndarray:
+    """Neighbour lists of width 2*degree: the top-degree neighbours, then the best reverse edges.
+
+    Below exact_below vectors the neighbours are exact; above, NN-descent
+    approximates them in time linear in the number of vectors.
+    """
+    count = len(vectors)
+    degree = min(degree, count - 1)
+    if count < exact_below:
+        forward, forward_scores = _exact_neighbours(vectors, degree)
+    else:
+        forward, forward_scores = _nn_descent(vectors, degree)
+
+    # Reverse edges keep hub-less regions reachable; best-scoring ones first
+    sources = np.repeat(np.arange(count, dtype=np.int32), degree)
+    targets = forward.ravel()
+    order = np.lexsort((-forward_scores.ravel(), targets))
+    sources, targets = sources[order], targets[order]
+    starts = np.searchsorted(targets, np.arange(count + 1))
+
+    graph = np.full((count, 2 * degree), -1, dtype=np.int32)
+    graph[:, :degree] = forward
+    for node in range(count):
+        existing = set(forward[node].tolist())
+        reverse = [int(s) for s in sources[starts[node]:starts[node + 1]] if int(s) not in existing][:degree]
+        graph[node, degree:degree + len(reverse)] = reverse
+    return graph
+
+
+class FallbackWriter:
+    """Builds a collection's fallback index batch by batch.
+
+    Vectors and every column are spooled to files in the staging directory
+    as batches arrive, so streaming uploads hold one batch in memory rather
+    than the whole export; close() assembles the final files from the spools.
+    """
+
+    def __init__(self, collection: str, columns: Sequence[str]):
+        self.collection = collection
+        self.columns = list(columns)
+        self.count = 0
+        self.dim: Optional[int] = None
+        self._started = time.perf_counter()
+        self.target = os.path.join(fallback_dir(), collection)
+        self.staging = f"{self.target}.tmp-{os.getpid()}"
+        shutil.rmtree(self.staging, ignore_errors=True)
+        os.makedirs(self.staging)
+        self._vectors = open(self._spool("vectors.f32"), "wb")
+        # One JSON value per line, per column, kept as is; close() adds the line offsets
+        self._files = ["ids"] + [f"column-{i}" for i in range(len(self.columns))]
+        self._spools = [open(self._spool(f"{name}.jsonl"), "wb") for name in self._files]
+        self._lengths: List[List[np.ndarray]] = [[] for _ in self._files]
+
+    def _spool(self, name: str) -> str:
+        return os.path.join(self.staging, name)
+
+    def add(self, vectors, columns: Mapping[str, Sequence[Any]], ids: Optional[Sequence[Any]] = None) -> None:
+        """Append a batch; ids defaults to the running row number (for auto_id collections)."""
+        vectors = _unit_rows(vectors)
+        if not len(vectors):
+            return
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+        ids = list(ids) if ids is not None else list(range(self.count, self.count + len(vectors)))
+        for spool, lengths, values in zip(self._spools, self._lengths, [ids] + [columns[name] for name in self.columns]):
+            lines = [(json.dumps(value, ensure_ascii=False, default=str) + "\n").encode("utf-8") for value in values]
+            spool.writelines(lines)
+            lengths.append(np.fromiter(map(len, lines), dtype=np.int64, count=len(lines)))
+        self._vectors.write(vectors.tobytes())
+        self.count += len(vectors)
+
+    def _close_spools(self) -> None:
+        for spool in [self._vectors, *self._spools]:
+            spool.close()
+
+    def abort(self) -> None:
+        self._close_spools()
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+    def close(self, kind: Optional[str] = None) -> str:
+        """Finish the export, swap it in and return its directory.
+
+        kind is 'flat' or 'graph' and defaults by size against FALLBACK_GRAPH_THRESHOLD.
+        """
+        self._close_spools()
+        count, dim = self.count, self.dim or 0
+        kind = kind or ("graph" if count >= graph_threshold() else "flat")
+
+        vectors = np.lib.format.open_memmap(self._spool("vectors.npy"), mode="w+", dtype=np.float32, shape=(count, dim))
+        if count:
+            vectors[:] = np.memmap(self._spool("vectors.f32"), dtype=np.float32, mode="r", shape=(count, dim))
+        vectors.flush()
+        del vectors
+        os.remove(self._spool("vectors.f32"))
+
+        if kind == "graph" and count > 1:
+            vectors = np.load(self._spool("vectors.npy"), mmap_mode="r")
+            np.save(self._spool("graph.npy"), build_graph(vectors, graph_degree()))
+            rng = np.random.default_rng(0)
+            entry = rng.choice(count, size=min(count, max(1, int(np.sqrt(count)))), replace=False)
+            np.save(self._spool("entry.npy"), np.sort(entry).astype(np.int32))
+            del vectors
+        else:
+            kind = "flat"
+
+        for name, lengths in zip(self._files, self._lengths):
+            offsets = np.zeros(count + 1, dtype=np.int64)
+            np.cumsum(np.concatenate(lengths) if lengths else offsets[:0], out=offsets[1:])
+            np.save(self._spool(f"{name}.offsets.npy"), offsets)
+        with open(self._spool("meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"count": count, "dim": dim, "kind": kind, "columns": self.columns, "exported": time.time()}, f)
+
+        # Swap the new directory in; readers notice the new meta.json mtime
+        if os.path.isdir(self.target):
+            retired = f"{self.target}.old-{os.getpid()}"
+            os.replace(self.target, retired)
+            os.replace(self.staging, self.target)
+            shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.replace(self.staging, self.target)
+
+        elapsed = time.perf_counter() - self._started
+        print(f"[Fallback] Exported {kind} index for '{self.collection}' ({count} vectors) in {elapsed:.1f}s")
+        return self.target
+
+
+def export_fallback_index(
+    collection: str,
+    vectors,
+    columns: Mapping[str, Sequence[Any]],
+    ids: Optional[Sequence[Any]] = None,
+    kind: Optional[str] = None,
+) -> str:
+    """Write a collection's fallback index and return its directory.
+
+    columns maps scalar field names to per-row values in vector order; ids
+    defaults to the row number (for auto_id collections). kind is 'flat' or
+    'graph' and defaults by size against FALLBACK_GRAPH_THRESHOLD.
+    """
+    writer = FallbackWriter(collection, list(columns))
+    writer.add(vectors, columns, ids)
+    return writer.close(kind)
+
+
+# ============================================================================
+# Search
+# ============================================================================
+
+def _value_key(value: Any) -> Any:
+    """The value itself, or its JSON for lists and objects, which cannot key a dict."""
+    return json.dumps(value, sort_keys=True, default=str) if isinstance(value, (list, dict)) else value
+
+
+class JsonLinesColumn(Sequence):
+    """One exported .jsonl file, memory-mapped and decoded a row at a time."""
+
+    def __init__(self, path: str):
+        self._offsets = np.load(f"{path}.offsets.npy")
+        with open(f"{path}.jsonl", "rb") as f:
+            # mmap refuses empty files
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self._offsets[-1] else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> Any:
+        return json.loads(self._data[self._offsets[row]:self._offsets[row + 1]])
+
+    def __iter__(self) -> Iterator[Any]:
+        for start, end in zip(self._offsets[:-1].tolist(), self._offsets[1:].tolist()):
+            yield json.loads(self._data[start:end])
+
+
+class FallbackIndex:
+    """One exported collection, memory-mapped."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.ids: Sequence[Any]
+        self.columns: Dict[str, Sequence[Any]]
+        if "columns" in self.meta:
+            self.ids = JsonLinesColumn(os.path.join(path, "ids"))
+            self.columns = {
+                name: JsonLinesColumn(os.path.join(path, f"column-{i}")) for i, name in enumerate(self.meta["columns"])
+            }
+        else:
+            # Exports written before the offset-indexed layout
+            with open(os.path.join(path, "records.json"), encoding="utf-8") as f:
+                records = json.load(f)
+            self.ids, self.columns = records["ids"], records["columns"]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.graph = None
+        self.entry = None
+        self._masks: Dict[str, np.ndarray] = {}
+        self._rows: Optional[Dict[Any, int]] = None
+        if self.meta["kind"] == "graph":
+            self.graph = np.load(os.path.join(path, "graph.npy"), mmap_mode="r")
+            self.entry = np.load(os.path.join(path, "entry.npy"))
+
+    def rows(self, ids: Sequence[Any]) -> List[int]:
+        """Row number of each primary key, -1 for ids not in the export."""
+        if self._rows is None:
+            self._rows = {hit_id: row for row, hit_id in enumerate(self.ids)}
+        return [self._rows.get(hit_id, -1) for hit_id in ids]
+
+    def record(self, row: int, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        names = fields if fields is not None else list(self.columns)
+        return {name: self.columns[name][row] if name in self.columns else None for name in names}
+
+    def _allowed(self, filters: Filters) -> Optional[np.ndarray]:
+        if not filters:
+            return None
+        if isinstance(filters, str):
+            matches({}, filters)  # raises: raw expressions need Milvus
+
+        key = json.dumps(filters, sort_keys=True, default=str)
+        allowed = self._masks.get(key)
+        if allowed is None:
+            allowed = np.ones(len(self.ids), dtype=bool)
+            for name, condition in filters.items():
+                values = list(self.columns[name]) if name in self.columns else [None] * len(self.ids)
+                keys = [_value_key(value) for value in values]
+                # Decide once per distinct value, then broadcast to the rows holding it
+                verdicts: Dict[Any, bool] = {}
+                for key, value in zip(keys, values):
+                    if key not in verdicts:
+                        verdicts[key] = matches({name: value}, {name: condition})
+                allowed &= np.fromiter((verdicts[key] for key in keys), dtype=bool, count=len(keys))
+            if len(self._masks) >= 64:
+                self._masks.pop(next(iter(self._masks)))
+            self._masks[key] = allowed
+        return allowed
+
+    def _flat(self, query: np.ndarray, k: int, allowed: Optional[np.ndarray]):
+        scores = np.asarray(self.vectors @ query, dtype=np.float32)
+        if allowed is not None:
+            scores = np.where(allowed, scores, -np.inf)
+            k = min(k, int(allowed.sum()))
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def _graph_search(self, query: np.ndarray, k: int, ef: int, allowed: Optional[np.ndarray]):
+        entry_scores = np.asarray(self.vectors[self.entry] @ query)
+        seeds = self.entry[np.argsort(-entry_scores)[:4]]
+        visited = np.zeros(len(self.ids), dtype=bool)
+        visited[seeds] = True
+
+        seed_scores = np.asarray(self.vectors[seeds] @ query)
+        candidates = [(-float(score), int(node)) for score, node in zip(seed_scores, seeds)]
+        heapq.heapify(candidates)
+        # Beam over every node seen; results only over nodes that pass the filter
+        beam = [(float(score), int(node)) for score, node in zip(seed_scores, seeds)]
+        heapq.heapify(beam)
+        results = [(s, n) for s, n in beam if allowed is None or allowed[n]]
+        heapq.heapify(results)
+
+        while candidates:
+            negative, node = heapq.heappop(candidates)
+            if len(beam) >= ef and -negative < beam[0][0]:
+                break
+            neighbours = self.graph[node]
+            neighbours = neighbours[neighbours >= 0]
+            neighbours = neighbours[~visited[neighbours]]
+            if not len(neighbours):
+                continue
+            visited[neighbours] = True
+            for score, neighbour in zip(np.asarray(self.vectors[neighbours] @ query), neighbours):
+                score, neighbour = float(score), int(neighbour)
+                if len(beam) < ef or score > beam[0][0]:
+                    heapq.heappush(candidates, (-score, neighbour))
+                    heapq.heappush(beam, (score, neighbour))
+                    if len(beam) > ef:
+                        heapq.heappop(beam)
+                if allowed is None or allowed[neighbour]:
+                    heapq.heappush(results, (score, neighbour))
+                    if len(results) > max(k, ef):
+                        heapq.heappop(results)
+
+        return [(node, score) for score, node in sorted(results, reverse=True)[:k]]
+
+    def search(
+        self,
+        query_vector,
+        k: int = 3,
+        filters: Filters = None,
+        fields: Optional[Sequence[str]] = None,
+        ef: Optional[int] = None,
+    ) -> List[Match]:
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        query = query / norm if norm else query
+        allowed = self._allowed(filters)
+
+        if self.graph is not None:
+            rows = self._graph_search(query, k, max(ef or search_ef(), k), allowed)
+            # A selective filter can leave the beam short; the flat scan is exact
+            if len(rows) < k and (allowed is None or allowed.sum() > len(rows)):
+                rows = self._flat(query, k, allowed)
+        else:
+            rows = self._flat(query, k, allowed)
+
+        return [(self.ids[row], score, self.record(row, fields)) for row, score in rows]
+
+
+class FallbackStore:
+    """Loads exported indexes on demand and reloads them after a new export."""
+
+    def __init__(self):
+        self._indexes: Dict[str, FallbackIndex] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _meta_version(collection: str) -> int:
+        try:
+            return os.stat(os.path.join(fallback_dir(), collection, "meta.json")).st_mtime_ns
+        except OSError:
+            return 0
+
+    def available(self, collection: str) -> bool:
+        return self._meta_version(collection) != 0
+
+    def index(self, collection: str) -> FallbackIndex:
+        version = self._meta_version(collection)
+        if not version:
+            raise FileNotFoundError(f"No fallback index exported for '{collection}' under {fallback_dir()}")
+        with self._lock:
+            if self._versions.get(collection) != version:
+                started = time.perf_counter()
+                self._indexes[collection] = FallbackIndex(os.path.join(fallback_dir(), collection))
+                self._versions[collection] = version
+                print(f"[Fallback] Opened '{collection}' ({self._indexes[collection].meta['kind']}) in {time.perf_counter() - started:.2f}s")
+            return self._indexes[collection]
+
+    def search(self, collection: str, query_vector, k: int = 3, filters: Filters = None,
+               fields: Optional[Sequence[str]] = None) -> List[Match]:
+        return self.index(collection).search(query_vector, k, filters, fields)
+
+
+fallback_store = FallbackStore()
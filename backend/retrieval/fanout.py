@@ -0,0 +1,124 @@
+"""
+Concurrent search across the incident, change request and RCA collections.
+
+Resolution and proposal flows want all three sources for the same problem
+description. fanout_search() embeds the query once, searches every
+collection in parallel with that vector and returns whatever came back
+within FANOUT_BUDGET_MS (embedding included). Each source keeps its own
+ranking; a source that is missing, fails or misses the budget is reported
+on the result instead of failing the whole call.
+"""
+
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from .filters import Filters
+from .query_cache import query_embedding_cache
+from .service import CollectionNotFound, Hit, RetrievalService, retrieval_service
+
+FANOUT_COLLECTIONS = ("incident_history", "change_request_history", "rca")
+
+
+def fanout_budget() -> float:
+    """Seconds allowed for the whole fan-out, embedding included."""
+    return float(os.getenv('FANOUT_BUDGET_MS', "1500")) / 1000
+
+
+@dataclass(slots=True)
+class FanoutResult:
+    """Per-source hits in collection order, plus what could not be searched and why."""
+
+    hits: Dict[str, List[Hit]] = field(default_factory=dict)
+    missing: List[str] = field(default_factory=list)
+    timed_out: List[str] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+
+    @property
+    def complete(self) -> bool:
+        return not (self.timed_out or self.errors)
+
+    def merged(self) -> List[Hit]:
+        """Every hit across sources, best cosine score first."""
+        return sorted((hit for hits in self.hits.values() for hit in hits), key=lambda hit: hit.score, reverse=True)
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('FANOUT_WORKERS', "8")) * len(FANOUT_COLLECTIONS),
+    thread_name_prefix="retrieval-fanout",
+)
+
+
+def fanout_search_sync(
+    text: str,
+    collections: Sequence[str] = FANOUT_COLLECTIONS,
+    k: int = 3,
+    filters: Optional[Mapping[str, Filters]] = None,
+    budget: Optional[float] = None,
+    mode: Optional[str] = None,
+    service: RetrievalService = retrieval_service,
+    diversity: Optional[float] = None,
+) -> FanoutResult:
+    """Blocking fan-out; prefer fanout_search() from async code.
+
+    filters maps a collection name to its filters (see retrieval.filters);
+    collections without an entry are searched unfiltered. diversity applies
+    MMR within each collection (see RetrievalService.search_sync).
+    """
+    started = time.monotonic()
+    deadline = started + (budget if budget is not None else fanout_budget())
+    filters = filters or {}
+
+    query_vector = query_embedding_cache.encode(text)
+    futures = {
+        _executor.submit(
+            service.search_sync, name, text, k, filters.get(name), None, None, mode, query_vector, diversity
+        ): name
+        for name in collections
+    }
+    wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+
+    result = FanoutResult()
+    for name in collections:
+        result.hits[name] = []
+    for future, name in futures.items():
+        if not future.done():
+            # Left to finish in the background; its results still warm the semantic cache
+            future.cancel()
+            result.timed_out.append(name)
+            continue
+        try:
+            result.hits[name] = future.result()
+        except CollectionNotFound:
+            result.missing.append(name)
+        except Exception as e:
+            print(f"[Fanout] {name} search failed: {e}")
+            result.errors[name] = str(e)
+
+    result.elapsed_ms = (time.monotonic() - started) * 1000
+    counts = " ".join(f"{name}={len(hits)}" for name, hits in result.hits.items())
+    print(f"[Fanout] {counts} in {result.elapsed_ms:.0f}ms" + (f", timed out: {', '.join(result.timed_out)}" if result.timed_out else ""))
+    return result
+
+
+async def fanout_search(
+    text: str,
+    collections: Sequence[str] = FANOUT_COLLECTIONS,
+    k: int = 3,
+    filters: Optional[Mapping[str, Filters]] = None,
+    budget: Optional[float] = None,
+    mode: Optional[str] = None,
+    service: RetrievalService = retrieval_service,
+    diversity: Optional[float] = None,
+) -> FanoutResult:
+    """Fan out across collections without blocking the running event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None,
+        functools.partial(fanout_search_sync, text, collections, k, filters, budget, mode, service, diversity),
+    )
@@ -0,0 +1,236 @@
+"""
+Structured search filters compiled into Milvus boolean expressions.
+
+A filter is a mapping of field name to condition:
+
+    {"configuration_item": "SAP ERP"}                  equality
+    {"category": ["Network", "Database"]}              membership
+    {"state": {"ne": "Closed"}}                        operator form
+    {"opened": {"gte": "2025-01-01", "lte": "2025-03-31"}}
+
+Operators are eq, ne, in, not_in, gt, gte, lt, lte. Date fields are stored
+as ISO-8601 strings (normalize_date at ingest), so range filters on them are
+plain string comparisons evaluated by Milvus before the vector search runs.
+Scalar fields used in filters get an INVERTED index at ingest time.
+
+matches() applies the same mapping to a plain record, for searches that run
+without Milvus (see retrieval.fallback).
+"""
+
+import operator
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+from pymilvus import Collection
+
+DATE_FIELDS = ("opened", "planned_start_date", "planned_end_date")
+OPERATORS = {"eq": "==", "ne": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "in": "in", "not_in": "not in"}
+
+INCIDENT_CLOSED_STATES = ["Closed", "Resolved", "Canceled"]
+CHANGE_CLOSED_STATES = ["Closed", "Canceled"]
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_DATE_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y",
+)
+
+Filters = Union[str, Mapping[str, Any], None]
+
+
+# ============================================================================
+# Dates
+# ============================================================================
+
+def normalize_date(value: Any) -> str:
+    """Render a ServiceNow date as YYYY-MM-DDTHH:MM:SS; unknown formats pass through."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%dT%H:%M:%S")
+    text = str(value or "").strip()
+    if not text or text == "NA":
+        return text
+    try:
+        return datetime.fromisoformat(text).strftime("%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%dT%H:%M:%S")
+        except ValueError:
+            continue
+    return text
+
+
+def _date_bound(op: str, value: Any) -> str:
+    bound = normalize_date(value)
+    # A bare date as an upper bound means "through the end of that day"
+    if op == "lte" and re.fullmatch(r"\d{4}-\d{2}-\d{2}", str(value).strip()):
+        return bound[:10] + "T23:59:59"
+    return bound
+
+
+# ============================================================================
+# Compilation
+# ============================================================================
+
+def _literal(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def _condition(name: str, op: str, value: Any) -> str:
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown filter operator '{op}' on '{name}', expected one of {', '.join(OPERATORS)}")
+
+    if op in ("in", "not_in"):
+        values = [value] if isinstance(value, (str, bytes)) or not isinstance(value, Iterable) else list(value)
+        if name in DATE_FIELDS:
+            values = [normalize_date(v) for v in values]
+        return f"{name} {OPERATORS[op]} [{', '.join(_literal(v) for v in values)}]"
+
+    if name in DATE_FIELDS:
+        value = _date_bound(op, value)
+    return f"{name} {OPERATORS[op]} {_literal(value)}"
+
+
+def compile_filters(filters: Filters, fields: Optional[Sequence[str]] = None) -> Optional[str]:
+    """Turn a filter mapping into a Milvus expression.
+
+    Strings are taken as ready-made expressions. When fields is given, filters
+    on names outside it raise ValueError instead of failing inside Milvus.
+    """
+    if filters is None or isinstance(filters, str):
+        return filters or None
+
+    clauses: List[str] = []
+    for name, condition in filters.items():
+        if condition is None:
+            continue
+        if not _FIELD_NAME.match(name):
+            raise ValueError(f"Invalid filter field '{name}'")
+        if fields is not None and name not in fields:
+            raise ValueError(f"Cannot filter on '{name}'; available fields: {', '.join(fields)}")
+
+        if isinstance(condition, Mapping):
+            clauses.extend(_condition(name, op, value) for op, value in condition.items() if value is not None)
+        elif isinstance(condition, (list, tuple, set)):
+            clauses.append(_condition(name, "in", condition))
+        else:
+            clauses.append(_condition(name, "eq", condition))
+
+    return " and ".join(clauses) or None
+
+
+_PY_OPERATORS = {
+    "eq": operator.eq, "ne": operator.ne, "gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le,
+}
+
+
+def _holds(name: str, op: str, actual: Any, value: Any) -> bool:
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown filter operator '{op}' on '{name}', expected one of {', '.join(OPERATORS)}")
+
+    if op in ("in", "not_in"):
+        values = [value] if isinstance(value, (str, bytes)) or not isinstance(value, Iterable) else list(value)
+        if name in DATE_FIELDS:
+            values = [normalize_date(v) for v in values]
+        return (actual in values) == (op == "in")
+
+    if name in DATE_FIELDS:
+        value = _date_bound(op, value)
+    try:
+        return bool(_PY_OPERATORS[op](actual, value))
+    except TypeError:
+        return False
+
+
+def matches(record: Mapping[str, Any], filters: Filters) -> bool:
+    """Evaluate a filter mapping against one record, with compile_filters() semantics.
+
+    Raw Milvus expressions cannot be evaluated locally and raise ValueError.
+    """
+    if not filters:
+        return True
+    if isinstance(filters, str):
+        raise ValueError("Raw filter expressions need Milvus; pass a filter mapping instead")
+
+    for name, condition in filters.items():
+        if condition is None:
+            continue
+        actual = record.get(name)
+        if isinstance(condition, Mapping):
+            if not all(_holds(name, op, actual, value) for op, value in condition.items() if value is not None):
+                return False
+        elif isinstance(condition, (list, tuple, set)):
+            if not _holds(name, "in", actual, condition):
+                return False
+        elif not _holds(name, "eq", actual, condition):
+            return False
+    return True
+
+
+def date_range(after: Optional[str] = None, before: Optional[str] = None) -> Optional[Dict[str, str]]:
+    bounds = {op: value for op, value in (("gte", after), ("lte", before)) if value}
+    return bounds or None
+
+
+def incident_filters(
+    category: Optional[str] = None,
+    state: Optional[str] = None,
+    exclude_closed: bool = False,
+    opened_after: Optional[str] = None,
+    opened_before: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Filter mapping for the incident_history search tools."""
+    filters: Dict[str, Any] = {"category": category, "opened": date_range(opened_after, opened_before)}
+    if state:
+        filters["state"] = state
+    elif exclude_closed:
+        filters["state"] = {"not_in": INCIDENT_CLOSED_STATES}
+    return {name: value for name, value in filters.items() if value}
+
+
+def change_filters(
+    configuration_item: Optional[str] = None,
+    change_type: Optional[str] = None,
+    state: Optional[str] = None,
+    domain: Optional[str] = None,
+    exclude_closed: bool = False,
+    planned_after: Optional[str] = None,
+    planned_before: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Filter mapping for the change_request_history search tools."""
+    filters: Dict[str, Any] = {
+        "configuration_item": configuration_item,
+        "type": change_type,
+        "domain": domain,
+        "planned_start_date": date_range(planned_after, planned_before),
+    }
+    if state:
+        filters["state"] = state
+    elif exclude_closed:
+        filters["state"] = {"not_in": CHANGE_CLOSED_STATES}
+    return {name: value for name, value in filters.items() if value}
+
+
+# ============================================================================
+# Ingest side
+# ============================================================================
+
+def create_scalar_indexes(collection: Collection, field_names: Sequence[str]) -> None:
+    """INVERTED index on every field that search filters may touch."""
+    for name in field_names:
+        collection.create_index(
+            field_name=name,
+            index_params={"index_type": "INVERTED"},
+            index_name=f"{name}_idx",
+        )
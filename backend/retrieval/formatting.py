@@ -0,0 +1,134 @@
+"""
+Markdown renderers for retrieval hits.
+
+These are the formats the agents have always shown to the LLM and the user;
+they are kept apart from the search itself so callers that only need field
+values never pay for string building.
+"""
+
+from typing import Iterable, List, Sequence
+
+from .service import Hit
+
+INCIDENT_LONG_TEXT_FIELDS = (
+    'description', 'short_description', 'correlation_display',
+    'work_notes', 'comments', 'close_notes', 'resolution_notes',
+)
+CHANGE_LONG_TEXT_FIELDS = (
+    'description', 'short_description', 'justification',
+    'implementation_plan', 'backout_plan', 'test_plan',
+    'risk_impact_analysis', 'change_plan',
+)
+
+
+def format_ticket_details(
+    hits: Sequence[Hit],
+    heading: str,
+    fallback_label: str,
+    long_text_fields: Iterable[str] = INCIDENT_LONG_TEXT_FIELDS,
+) -> str:
+    """Full-record layout: a banner per ticket followed by every returned field."""
+    long_text_fields = set(long_text_fields)
+    matches = []
+    for idx, hit in enumerate(hits, 1):
+        ticket_number = hit.get('number') or f'{fallback_label} #{idx}'
+
+        match_parts = [
+            f"{'='*70}",
+            f"{heading} #{idx}: {ticket_number}",
+            f"Similarity Score: {hit.score:.2%}",
+            f"{'='*70}",
+            ""
+        ]
+
+        for field, value in hit.fields.items():
+            if field == 'number':
+                continue
+
+            value = 'NA' if value is None else value
+            field_name = field.replace('_', ' ').title()
+
+            if field in long_text_fields and value and value != 'NA' and len(str(value)) > 50:
+                match_parts.append(f"\n**{field_name}**:")
+                match_parts.append(f"{value}")
+            else:
+                match_parts.append(f"**{field_name}**: {value}")
+
+        matches.append("\n".join(match_parts))
+
+    return "\n\n".join(matches)
+
+
+def format_incident_summary(hits: Sequence[Hit]) -> List[str]:
+    """Compact per-incident cards used by the enhancer workflow."""
+    matches = []
+    for i, hit in enumerate(hits, 1):
+        match_info = f"""
+📋 **Incident #{i}** (Similarity: {hit.score:.2f})
+   • **Number**: {hit.get('number', 'Unknown')}
+   • **Title**: {hit.get('short_description', 'No title available')}
+   • **Description**: {hit.get('description', 'No description available')}
+   • **Priority**: {hit.get('priority', 'Unknown')} | **Impact**: {hit.get('impact', 'Unknown')} | **Urgency**: {hit.get('urgency', 'Unknown')}
+   • **State**: {hit.get('state', 'Unknown')} | **Category**: {hit.get('category', 'Unknown')}
+   • **Assignment Group**: {hit.get('assignment_group', 'Unknown')}
+   • **Opened**: {hit.get('opened', 'Unknown')} by {hit.get('opened_by', 'Unknown')}
+"""
+        matches.append(match_info.strip())
+    return matches
+
+
+def format_change_summary(hits: Sequence[Hit]) -> List[str]:
+    """Compact per-change cards used by the enhancer workflow."""
+    matches = []
+    for hit in hits:
+        match_info = f"""
+- **{hit.get('number', 'Unknown')}**: {hit.get('short_description', 'No title')} (Score: {hit.score:.2f})
+  Type: {hit.get('type', 'Unknown')}, Impact: {hit.get('impact', 'Unknown')}, Urgency: {hit.get('urgency', 'Unknown')}
+  Config Item: {hit.get('configuration_item', 'Not specified')}
+  Assignment Group: {hit.get('assignment_group', 'Unknown')}
+  CAB Required: {'Yes' if hit.get('cab_required') else 'No'}
+  Change Plan: {(hit.get('change_plan') or 'No plan')[:100]}...
+"""
+        matches.append(match_info.strip())
+    return matches
+
+
+def format_rca_summary(hits: Sequence[Hit]) -> List[str]:
+    """Compact per-RCA cards: the cause and the fix, which is what a resolver needs first."""
+    matches = []
+    for hit in hits:
+        match_info = f"""
+- **{hit.id}**: {hit.get('title', 'Unknown Issue')} (Score: {hit.score:.2f})
+  Category: {hit.get('category', 'General')}, Severity: {hit.get('severity', 'Unknown')}
+  Root Cause: {hit.get('root_cause_analysis', 'Not documented')}
+  Resolution: {hit.get('resolution_steps', 'Not documented')}
+  Prevention: {hit.get('prevention', 'Not documented')}
+"""
+        matches.append(match_info.strip())
+    return matches
+
+
+FANOUT_SECTIONS = {
+    "incident_history": ("SIMILAR INCIDENTS", format_incident_summary),
+    "change_request_history": ("SIMILAR CHANGE REQUESTS", format_change_summary),
+    "rca": ("ROOT CAUSE ANALYSES", format_rca_summary),
+}
+
+
+def format_fanout(result) -> str:
+    """One section per source of a retrieval.fanout.FanoutResult, in search order."""
+    sections = []
+    for name, hits in result.hits.items():
+        heading, render = FANOUT_SECTIONS.get(name, (name.replace('_', ' ').upper(), format_incident_summary))
+        if name in result.missing:
+            body = "Not available."
+        elif name in result.timed_out:
+            body = "Search did not finish in time."
+        elif name in result.errors:
+            body = f"Search failed: {result.errors[name]}"
+        elif not hits:
+            body = "No similar records found."
+        else:
+            body = "\n\n".join(render(hits))
+        sections.append(f"### {heading}\n{body}")
+    return "\n\n".join(sections)
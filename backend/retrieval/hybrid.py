@@ -0,0 +1,92 @@
+"""
+BM25 sparse index and reciprocal rank fusion for hybrid retrieval.
+
+MiniLM embeddings blur exact tokens such as CI names, error codes and
+hostnames. Collections created by the upload scripts therefore carry a
+search_text VARCHAR next to the dense embedding; Milvus tokenises it and
+fills the sparse_embedding field through a server-side BM25 function, so
+ingest only has to store the raw text.
+
+At query time RetrievalService runs the dense and the BM25 search side by
+side, each under its own latency budget, and merges both rankings with RRF.
+"""
+
+import os
+from typing import Any, Dict, Hashable, List, Sequence, Tuple
+
+from pymilvus import Collection, DataType, FieldSchema, Function, FunctionType
+
+TEXT_FIELD = "search_text"
+SPARSE_FIELD = "sparse_embedding"
+TEXT_MAX_LENGTH = 8192
+RRF_K = 60
+
+SPARSE_INDEX_PARAMS = {
+    "index_type": "SPARSE_INVERTED_INDEX",
+    "metric_type": "BM25",
+    "params": {"inverted_index_algo": "DAAT_MAXSCORE"},
+}
+BM25_SEARCH_PARAMS = {"metric_type": "BM25", "params": {"drop_ratio_search": 0.0}}
+
+
+# ============================================================================
+# Ingest side
+# ============================================================================
+
+def bm25_fields(max_length: int = TEXT_MAX_LENGTH) -> List[FieldSchema]:
+    """search_text plus the sparse field BM25 writes into; append after 'embedding'."""
+    return [
+        FieldSchema(name=TEXT_FIELD, dtype=DataType.VARCHAR, max_length=max_length, enable_analyzer=True),
+        FieldSchema(name=SPARSE_FIELD, dtype=DataType.SPARSE_FLOAT_VECTOR),
+    ]
+
+
+def bm25_function() -> Function:
+    return Function(
+        name="search_text_bm25",
+        function_type=FunctionType.BM25,
+        input_field_names=[TEXT_FIELD],
+        output_field_names=[SPARSE_FIELD],
+    )
+
+
+def search_text(text: str, max_length: int = TEXT_MAX_LENGTH) -> str:
+    """Clip text to the VARCHAR limit, which Milvus counts in UTF-8 bytes."""
+    encoded = (text or "").encode("utf-8")
+    if len(encoded) <= max_length:
+        return text or ""
+    return encoded[:max_length].decode("utf-8", errors="ignore")
+
+
+def create_bm25_index(collection: Collection) -> None:
+    collection.create_index(field_name=SPARSE_FIELD, index_params=SPARSE_INDEX_PARAMS)
+
+
+# ============================================================================
+# Query side
+# ============================================================================
+
+def retrieval_mode() -> str:
+    """'hybrid' (dense + BM25, default) or 'dense' (RETRIEVAL_MODE)."""
+    return os.getenv('RETRIEVAL_MODE', "hybrid").strip().lower()
+
+
+def leg_budgets() -> Tuple[float, float]:
+    """Latency budgets in seconds for the dense and the BM25 search."""
+    dense_ms = float(os.getenv('HYBRID_DENSE_BUDGET_MS', "800"))
+    sparse_ms = float(os.getenv('HYBRID_SPARSE_BUDGET_MS', "300"))
+    return dense_ms / 1000, sparse_ms / 1000
+
+
+def overfetch() -> int:
+    """How many candidates each leg returns per requested hit."""
+    return max(1, int(os.getenv('HYBRID_OVERFETCH', "4")))
+
+
+def rrf_fuse(rankings: Sequence[Sequence[Hashable]], k: int = RRF_K) -> List[Tuple[Hashable, float]]:
+    """Reciprocal rank fusion: score(d) = sum over rankings of 1 / (k + rank)."""
+    scores: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,243 @@
+"""
+Incremental re-ingestion keyed by ticket number.
+
+Every row the upload scripts write carries a content_hash of its normalized
+fields and embedding text. With INGEST_MODE=incremental, an upload against a
+collection that already has the hash and key fields keeps the collection and
+syncs it instead of dropping it:
+
+  new        key not in Milvus                  embed + insert
+  updated    key present, content_hash differs  delete old row, embed + insert
+  unchanged  key present, same content_hash     nothing; not even embedded
+  deleted    key in Milvus, not in the export   delete
+
+Keys are 'number' for incidents and change requests and 'id' for RCAs. A
+key that shows up twice in one export (the Snow-mcp history is keyed by a
+non-unique title) keeps its first record, in full loads too; the repeats
+are skipped and counted, since a second row under the key would make every
+later sync see it as updated. The
+fallback index is rebuilt from the new rows plus the unchanged rows of the
+previous export, so it still covers the whole collection. Collections
+created before content_hash existed get one last full load.
+"""
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from pymilvus import Collection, DataType, FieldSchema, utility
+
+from .fallback import FallbackIndex, FallbackWriter, fallback_dir
+from .filters import compile_filters
+from .ingest import IngestStats, batched, insert_chunks, stream_ingest
+
+HASH_FIELD = "content_hash"
+INGEST_MODES = ("full", "incremental")
+
+Normalized = Tuple[Dict[str, Any], str]
+
+
+def ingest_mode() -> str:
+    mode = os.getenv('INGEST_MODE', "full").strip().lower()
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Unknown INGEST_MODE '{mode}', expected one of {', '.join(INGEST_MODES)}")
+    return mode
+
+
+def content_hash_fields() -> List[FieldSchema]:
+    """content_hash; declare it after the scalar fields, before the vector."""
+    return [FieldSchema(name=HASH_FIELD, dtype=DataType.VARCHAR, max_length=64)]
+
+
+def content_hash(row: Dict[str, Any], text: str) -> str:
+    payload = {name: value for name, value in row.items() if name != HASH_FIELD}
+    encoded = json.dumps([payload, text], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def can_sync(name: str, key_field: str) -> bool:
+    """True when INGEST_MODE=incremental and the existing collection has the fields a sync needs."""
+    if ingest_mode() != "incremental":
+        return False
+    if not utility.has_collection(name):
+        print(f"[Incremental] '{name}' does not exist yet, doing a full load")
+        return False
+    existing = {field.name for field in Collection(name).schema.fields}
+    missing = [field for field in (key_field, HASH_FIELD) if field not in existing]
+    if missing:
+        print(f"[Incremental] '{name}' has no {', '.join(missing)} field, doing a full load to add it")
+        return False
+    return True
+
+
+@dataclass(slots=True)
+class SyncReport:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted)
+
+    def summary(self) -> str:
+        text = (
+            f"inserted={self.inserted} updated={self.updated} unchanged={self.unchanged} "
+            f"deleted={self.deleted} in {self.seconds:.1f}s"
+        )
+        if self.skipped:
+            text += f" (skipped {self.skipped} records that could not be normalized)"
+        if self.duplicates:
+            text += f" (skipped {self.duplicates} repeats of a key already in this export, first record kept)"
+        return text
+
+
+class IncrementalSync:
+    """Diffs a stream of records against what a collection holds, by key and content hash."""
+
+    def __init__(self, collection, key_field: str, incremental: bool = True):
+        self.collection = collection
+        self.key_field = key_field
+        self.incremental = incremental
+        self.primary = collection.schema.primary_field.name
+        # key -> [(primary key, content hash)]; several entries only if an earlier load had duplicates
+        self.existing: Dict[Any, List[Tuple[Any, str]]] = {}
+        self.seen: Set[Any] = set()
+        self.kept: List[Any] = []
+        self.replaced: Dict[Any, List[Any]] = {}
+        self.report = SyncReport()
+        if incremental:
+            self._load_existing()
+
+    def _load_existing(self, batch_size: int = 1000) -> None:
+        started = time.perf_counter()
+        iterator = self.collection.query_iterator(
+            batch_size=batch_size, expr="", output_fields=[self.key_field, HASH_FIELD]
+        )
+        rows = 0
+        try:
+            while batch := iterator.next():
+                for row in batch:
+                    self.existing.setdefault(row[self.key_field], []).append((row[self.primary], row[HASH_FIELD]))
+                rows += len(batch)
+        finally:
+            iterator.close()
+        print(f"[Incremental] {rows} rows ({len(self.existing)} keys) already in Milvus, read in {time.perf_counter() - started:.1f}s")
+
+    def changes(self, records: Iterable[Any], normalize: Callable[[Any], Optional[Normalized]]) -> Iterator[Normalized]:
+        """Normalized (row, text) pairs of new and changed records, content_hash filled in."""
+        for record in records:
+            normalized = normalize(record)
+            if normalized is None:
+                self.report.skipped += 1
+                continue
+            row, text = normalized
+            key = row[self.key_field]
+            # A second row under the key would be rewritten on every later sync
+            if key in self.seen:
+                self.report.duplicates += 1
+                continue
+            self.seen.add(key)
+            row[HASH_FIELD] = content_hash(row, text)
+            previous = self.existing.get(key)
+            if previous is None:
+                self.report.inserted += 1
+            elif len(previous) == 1 and previous[0][1] == row[HASH_FIELD]:
+                self.report.unchanged += 1
+                self.kept.append(previous[0][0])
+                continue
+            else:
+                self.report.updated += 1
+                self.replaced[key] = [pk for pk, _ in previous]
+            yield row, text
+
+    def insert(self, entities: List[List[Any]], rows: List[Dict[str, Any]], insert=None, stats=None) -> List[Any]:
+        # Delete first: collections keyed by RCA id reuse the same primary key
+        stale = [pk for row in rows for pk in self.replaced.pop(row[self.key_field], [])]
+        self._delete(stale)
+        if insert is not None:
+            return insert(entities, rows)
+        return insert_chunks(self.collection, entities, stats=stats)
+
+    def delete_removed(self) -> None:
+        removed = [pk for key, entries in self.existing.items() if key not in self.seen for pk, _ in entries]
+        self.report.deleted = len({key for key in self.existing if key not in self.seen})
+        self._delete(removed)
+
+    def _delete(self, pks: Sequence[Any], chunk: int = 1000) -> None:
+        for batch in batched(pks, chunk):
+            self.collection.delete(compile_filters({self.primary: batch}))
+
+    def carry_over_fallback(self, name: str, writer: FallbackWriter, chunk: int = 1000) -> None:
+        """Copy the unchanged rows of the previous fallback export into writer."""
+        if not self.kept:
+            return
+        path = os.path.join(fallback_dir(), name)
+        try:
+            previous = FallbackIndex(path)
+        except (FileNotFoundError, OSError):
+            print(f"[Incremental] No previous fallback export for '{name}'; it only covers the rows written now")
+            return
+        missing = 0
+        for batch in batched(self.kept, chunk):
+            rows = [(pk, row) for pk, row in zip(batch, previous.rows(batch)) if row >= 0]
+            missing += len(batch) - len(rows)
+            if not rows:
+                continue
+            indices = [row for _, row in rows]
+            writer.add(
+                previous.vectors[indices],
+                {column: [previous.columns[column][row] for row in indices] for column in writer.columns},
+                [pk for pk, _ in rows],
+            )
+        if missing:
+            print(f"[Incremental] {missing} unchanged rows are missing from the fallback export; run a full load to rebuild it")
+
+
+def sync_collection(
+    collection,
+    name: str,
+    records: Iterable[Any],
+    normalize: Callable[[Any], Optional[Normalized]],
+    fields: Sequence[str],
+    key_field: str,
+    incremental: bool,
+    model_name: Optional[str] = None,
+    insert: Optional[Callable[[List[List[Any]], List[Dict[str, Any]]], List[Any]]] = None,
+    fallback: Optional[FallbackWriter] = None,
+    stats: Optional[IngestStats] = None,
+) -> SyncReport:
+    """Load records into collection, fully or as an incremental sync; fields must include content_hash.
+
+    Without incremental every record is inserted (the collection was just
+    created). The fallback writer, when given, is aborted on failure and
+    closed on success.
+    """
+    started = time.perf_counter()
+    stats = stats if stats is not None else IngestStats()
+    sync = IncrementalSync(collection, key_field, incremental)
+    try:
+        stream_ingest(
+            collection, sync.changes(records, normalize), lambda pair: pair, fields, model_name,
+            insert=lambda entities, rows: sync.insert(entities, rows, insert, stats), fallback=fallback, stats=stats,
+        )
+        if incremental:
+            sync.delete_removed()
+            if fallback is not None:
+                sync.carry_over_fallback(name, fallback)
+    except Exception:
+        if fallback is not None:
+            fallback.abort()
+        raise
+    if fallback is not None:
+        fallback.close()
+    sync.report.seconds = time.perf_counter() - started
+    print(f"[Incremental] {name}: {sync.report.summary()}")
+    return sync.report
@@ -0,0 +1,104 @@
+"""
+Similarity-weighted k-NN voting for ticket field inference.
+
+The enhancer pulls the top INFERENCE_NEIGHBORS similar tickets and lets them
+vote on each field. Votes are weighted by a softmax over the cosine scores
+(INFERENCE_TEMPERATURE), so a near-identical ticket outweighs several loosely
+related ones. Confidence is the winning value's share of the total neighbour
+weight; neighbours without a usable value abstain but still count towards the
+total, so sparse evidence yields low confidence.
+
+weighted_vote() works on an integer label matrix for many queries at once and
+is what the single-ticket path and the benchmark both use.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INCIDENT_INFERENCE_FIELDS = ("priority", "impact", "urgency", "category", "assignment_group")
+CHANGE_INFERENCE_FIELDS = ("type", "impact", "urgency", "assignment_group", "cab_required")
+MISSING_VALUES = (None, "", "NA", "Unknown")
+
+
+def inference_neighbors() -> int:
+    return int(os.getenv('INFERENCE_NEIGHBORS', "10"))
+
+
+def confidence_threshold() -> float:
+    """Estimates at or above this confidence are filled in without asking the user."""
+    return float(os.getenv('INFERENCE_CONFIDENCE', "0.8"))
+
+
+@dataclass(slots=True)
+class FieldEstimate:
+    """Winning value for one field, its share of the neighbour weight and how many neighbours agreed."""
+
+    value: Any
+    confidence: float
+    support: int
+
+
+def similarity_weights(scores: np.ndarray, temperature: Optional[float] = None) -> np.ndarray:
+    """Softmax-style weights per row of cosine scores; the best neighbour gets weight 1."""
+    temperature = temperature or float(os.getenv('INFERENCE_TEMPERATURE', "0.05"))
+    scores = np.atleast_2d(np.asarray(scores, dtype=np.float64))
+    return np.exp((scores - scores.max(axis=1, keepdims=True)) / temperature)
+
+
+def weighted_vote(labels: np.ndarray, weights: np.ndarray, n_classes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Vote for many queries at once.
+
+    labels is (queries, k) of class codes with -1 for "no value"; weights has
+    the same shape. Returns the winning code per query (-1 when every
+    neighbour abstained) and its confidence.
+    """
+    labels = np.atleast_2d(labels)
+    weights = np.atleast_2d(weights)
+    queries = labels.shape[0]
+    width = n_classes + 1
+
+    # Column 0 collects abstentions; one bincount fills the whole (queries, width) table
+    flat = (np.arange(queries)[:, None] * width + labels + 1).ravel()
+    totals = np.bincount(flat, weights=weights.ravel(), minlength=queries * width).reshape(queries, width)
+
+    votes = totals[:, 1:]
+    winners = votes.argmax(axis=1) if n_classes else np.zeros(queries, dtype=np.int64)
+    winner_weight = votes[np.arange(queries), winners] if n_classes else np.zeros(queries)
+    total_weight = totals.sum(axis=1)
+    confidence = np.divide(winner_weight, total_weight, out=np.zeros(queries), where=total_weight > 0)
+    winners = np.where(winner_weight > 0, winners, -1)
+    return winners, confidence
+
+
+def factorize(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Integer codes in order of first appearance (so ties go to the closest hit); -1 for missing."""
+    index: Dict[Any, int] = {}
+    codes = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        if value in MISSING_VALUES:
+            codes[i] = -1
+        else:
+            codes[i] = index.setdefault(value, len(index))
+    return codes, list(index)
+
+
+def infer_fields(hits: Sequence[Any], fields: Sequence[str]) -> Dict[str, FieldEstimate]:
+    """Estimate each field from the hits' raw values, weighted by hit.score."""
+    if not hits:
+        return {}
+    weights = similarity_weights([hit.score for hit in hits])
+
+    estimates = {}
+    for field in fields:
+        codes, values = factorize([hit.get(field) for hit in hits])
+        winners, confidence = weighted_vote(codes[None, :], weights, len(values))
+        if winners[0] >= 0:
+            estimates[field] = FieldEstimate(
+                value=values[winners[0]],
+                confidence=round(float(confidence[0]), 3),
+                support=int(np.count_nonzero(codes == winners[0])),
+            )
+    return estimates
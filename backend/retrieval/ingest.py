@@ -0,0 +1,449 @@
+"""
+Batched embedding and chunked inserts for the Milvus upload scripts.
+
+Embedding one record per model call leaves the model mostly idle, and one
+collection.insert() with a whole export can exceed the gRPC message limit
+(64 MB by default). The upload scripts therefore:
+
+  embed_texts()    encode in INGEST_BATCH_SIZE batches; texts are sorted by
+                   length first so each batch pads to similar lengths, and the
+                   vectors come back in the original order
+  insert_chunks()  insert column-major entities in chunks of at most
+                   INGEST_CHUNK_ROWS rows and roughly INGEST_CHUNK_MB MB
+
+Both print throughput as they go (records/s, ms per embed batch, ms per
+insert chunk) and can accumulate into a shared IngestStats for a final
+summary.
+
+Large exports are streamed instead of loaded: read_records() yields one
+record at a time from a JSON array, an object wrapping one (e.g.
+{"kubernetes_problems": [...]}) or NDJSON, and stream_ingest() runs
+normalize -> embed -> insert over INGEST_STREAM_ROWS records at a time,
+feeding a FallbackWriter as it goes. Peak memory follows the batch size,
+not the size of the export.
+
+embed_texts() consults the on-disk embedding cache (retrieval.embedding_cache)
+first, so re-running an upload only encodes text it has not seen before, and
+with INGEST_EMBED_WORKERS > 1 encodes the rest across worker processes
+(retrieval.embed_pool).
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .compression import dense_column
+from .embed_pool import embed_workers, embedding_pool
+from .embedding_cache import disk_cache, embedding_cache_enabled
+from .embeddings import registry
+from .fallback import FallbackWriter
+from .hybrid import TEXT_FIELD
+
+# Keys whose array holds the records when an export wraps them in an object
+RECORD_LIST_KEYS = ("kubernetes_problems", "problems", "rca_data", "records", "result")
+
+
+def ingest_batch_size() -> int:
+    return int(os.getenv('INGEST_BATCH_SIZE', "64"))
+
+
+def sort_by_length() -> bool:
+    return os.getenv('INGEST_SORT_BY_LENGTH', "on").strip().lower() in ("1", "true", "on", "yes")
+
+
+def chunk_rows() -> int:
+    return int(os.getenv('INGEST_CHUNK_ROWS', "1000"))
+
+
+def chunk_bytes() -> int:
+    """Approximate payload per insert; well under the 64 MB gRPC default."""
+    return int(float(os.getenv('INGEST_CHUNK_MB', "16")) * 1024 * 1024)
+
+
+def stream_rows() -> int:
+    """Records normalized, embedded and inserted together by stream_ingest()."""
+    return int(os.getenv('INGEST_STREAM_ROWS', "1000"))
+
+
+def read_bytes() -> int:
+    return int(os.getenv('INGEST_READ_KB', "256")) * 1024
+
+
+@dataclass(slots=True)
+class IngestStats:
+    """Timings of one upload run, for the summary line."""
+
+    embedded: int = 0
+    embed_batch_ms: List[float] = field(default_factory=list)
+    inserted: int = 0
+    insert_chunk_ms: List[float] = field(default_factory=list)
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cache_size: int = 0
+
+    def summary(self) -> str:
+        embed_s = sum(self.embed_batch_ms) / 1000
+        insert_s = sum(self.insert_chunk_ms) / 1000
+        parts = []
+        if self.embed_batch_ms:
+            parts.append(
+                f"embedded {self.embedded} in {embed_s:.1f}s ({self.embedded / max(embed_s, 1e-9):.0f} rec/s, "
+                f"{np.mean(self.embed_batch_ms):.0f} ms/batch over {len(self.embed_batch_ms)} batches)"
+            )
+        if self.cache_hits or self.cache_misses:
+            lookups = self.cache_hits + self.cache_misses
+            parts.append(
+                f"embedding cache hits={self.cache_hits} misses={self.cache_misses} "
+                f"hit_rate={self.cache_hits / lookups:.0%} ({self.cache_size} vectors on disk)"
+            )
+        if self.insert_chunk_ms:
+            parts.append(
+                f"inserted {self.inserted} in {insert_s:.1f}s ({self.inserted / max(insert_s, 1e-9):.0f} rec/s, "
+                f"{np.mean(self.insert_chunk_ms):.0f} ms/chunk over {len(self.insert_chunk_ms)} chunks)"
+            )
+        return "; ".join(parts) or "nothing ingested"
+
+
+# ============================================================================
+# Embedding
+# ============================================================================
+
+def length_order(texts: Sequence[str]) -> np.ndarray:
+    """Indices of texts from longest to shortest; ties keep their input order."""
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    return np.argsort(-lengths, kind="stable")
+
+
+def embed_texts(
+    texts: Sequence[str],
+    model_name: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    sort: Optional[bool] = None,
+    stats: Optional[IngestStats] = None,
+    verbose: bool = True,
+    cache: Optional[bool] = None,
+    workers: Optional[int] = None,
+) -> np.ndarray:
+    """(len(texts), dim) float32 vectors in input order.
+
+    Texts already in the embedding cache are not encoded again; the rest are
+    encoded in batches and added to it. cache=None follows EMBEDDING_CACHE,
+    workers=None follows INGEST_EMBED_WORKERS. The batches, and so the
+    vectors, are the same for any number of workers.
+    """
+    batch_size = batch_size or ingest_batch_size()
+    sort = sort_by_length() if sort is None else sort
+    stats = stats if stats is not None else IngestStats()
+    total = len(texts)
+    if not total:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    store = disk_cache(model_name) if (embedding_cache_enabled() if cache is None else cache) else None
+    vectors: Optional[np.ndarray] = None
+    pending = np.arange(total)
+    if store is not None:
+        keys = [store.key(text) for text in texts]
+        cached = store.lookup(keys)
+        found = cached >= 0
+        stats.cache_hits += int(found.sum())
+        stats.cache_misses += total - int(found.sum())
+        if found.any():
+            vectors = np.empty((total, store.dim), dtype=np.float32)
+            vectors[found] = store.vectors(cached[found])
+        pending = np.flatnonzero(~found)
+        if verbose and found.any():
+            print(f"[Ingest] {int(found.sum())}/{total} embeddings from cache, encoding {len(pending)}")
+
+    missing = [texts[i] for i in pending]
+    order = pending[length_order(missing)] if sort else pending
+    batches = (len(order) + batch_size - 1) // batch_size
+    report_every = max(1, batches // 10)
+    started = time.perf_counter()
+
+    def report(done: int, finished: int, previous: int) -> None:
+        # After every report_every-th batch and after the last one
+        if verbose and (finished // report_every > previous // report_every or finished == batches):
+            elapsed = time.perf_counter() - started
+            print(
+                f"[Ingest] Embedded {done}/{len(order)} ({done / elapsed:.0f} rec/s, "
+                f"{np.mean(stats.embed_batch_ms[-report_every:]):.0f} ms/batch)"
+            )
+
+    workers = embed_workers() if workers is None else workers
+    if workers > 1 and batches > 1:
+        pool = embedding_pool(workers, model_name)
+        done = finished = 0
+
+        def on_run(rows: int, batch_ms: List[float]) -> None:
+            nonlocal done, finished
+            stats.embed_batch_ms.extend(batch_ms)
+            stats.embedded += rows
+            done += rows
+            finished += len(batch_ms)
+            report(done, finished, finished - len(batch_ms))
+
+        encoded = pool.encode([texts[i] for i in order], batch_size, on_run)
+        if vectors is None:
+            vectors = np.empty((total, encoded.shape[1]), dtype=np.float32)
+        vectors[order] = encoded
+        if store is not None:
+            store.put([keys[i] for i in order], encoded)
+    else:
+        for number, begin in enumerate(range(0, len(order), batch_size), 1):
+            rows = order[begin:begin + batch_size]
+            batch_started = time.perf_counter()
+            batch = registry.encode([texts[i] for i in rows], model_name, batch_size=len(rows))
+            stats.embed_batch_ms.append((time.perf_counter() - batch_started) * 1000)
+            if vectors is None:
+                vectors = np.empty((total, batch.shape[1]), dtype=np.float32)
+            vectors[rows] = batch
+            if store is not None:
+                store.put([keys[i] for i in rows], batch)
+            stats.embedded += len(rows)
+            report(min(begin + batch_size, len(order)), number, number - 1)
+    if store is not None:
+        stats.cache_size = store.count
+    return vectors
+
+
+# ============================================================================
+# Inserting
+# ============================================================================
+
+def _value_bytes(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple, dict)):
+        return 4 * len(value)
+    return 8
+
+
+def chunk_ranges(
+    entities: Sequence[Sequence[Any]], max_rows: Optional[int] = None, max_bytes: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """[begin, end) row ranges no larger than max_rows rows or (roughly) max_bytes."""
+    max_rows = max_rows or chunk_rows()
+    max_bytes = max_bytes or chunk_bytes()
+    total = len(entities[0]) if entities else 0
+    ranges, begin, size = [], 0, 0
+    for row in range(total):
+        row_size = sum(_value_bytes(column[row]) for column in entities)
+        if row > begin and (row - begin >= max_rows or size + row_size > max_bytes):
+            ranges.append((begin, row))
+            begin, size = row, 0
+        size += row_size
+    if total > begin:
+        ranges.append((begin, total))
+    return ranges
+
+
+def insert_chunks(
+    collection,
+    entities: Sequence[Sequence[Any]],
+    partition_name: Optional[str] = None,
+    stats: Optional[IngestStats] = None,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> List[Any]:
+    """Insert column-major entities chunk by chunk; primary keys come back in row order."""
+    stats = stats if stats is not None else IngestStats()
+    ranges = chunk_ranges(entities, max_rows, max_bytes)
+    where = f" into '{partition_name}'" if partition_name else ""
+    keys: List[Any] = []
+    for number, (begin, end) in enumerate(ranges, 1):
+        started = time.perf_counter()
+        chunk = [list(column[begin:end]) for column in entities]
+        if partition_name:
+            result = collection.insert(chunk, partition_name=partition_name)
+        else:
+            result = collection.insert(chunk)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats.insert_chunk_ms.append(elapsed_ms)
+        stats.inserted += end - begin
+        keys.extend(result.primary_keys)
+        print(f"[Ingest] Chunk {number}/{len(ranges)}{where}: {end - begin} rows in {elapsed_ms:.0f} ms")
+    return keys
+
+
+# ============================================================================
+# Streaming
+# ============================================================================
+
+class _JsonStream:
+    """Incremental raw_decode over a text file, holding one window of it at a time."""
+
+    def __init__(self, f, block: int):
+        self.f = f
+        self.block = block
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.f.read(self.block)
+        if not data:
+            self.eof = True
+            return False
+        self.buf += data
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, '' at the end of the file."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self.buf, self.pos = "", 0
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' in JSON stream, found '{found or 'end of file'}'")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        # Drop what has been consumed once it is a block's worth; offsets are rebased here only
+        if self.pos >= self.block:
+            self.buf, self.pos = self.buf[self.pos:], 0
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number is only complete once a delimiter follows it: "15" may be "1500.0" cut short
+            complete = not isinstance(value, (int, float)) or (end < len(self.buf) and self.buf[end] in ",]} \t\r\n")
+            if complete or self.eof or not self._fill():
+                self.pos = end
+                return value
+
+    def array(self) -> Iterator[Any]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+_DECODER = json.JSONDecoder()
+
+
+def read_records(path: str, keys: Sequence[str] = RECORD_LIST_KEYS, block: Optional[int] = None) -> Iterator[Any]:
+    """Yield the records of a JSON export one by one.
+
+    Handles a top-level array, an object whose first key in keys holds the
+    array (other keys are skipped), NDJSON, and a single-record object.
+    """
+    with open(path, encoding="utf-8-sig") as f:
+        stream = _JsonStream(f, block or read_bytes())
+        first = stream.peek()
+        if first == "[":
+            yield from stream.array()
+            return
+        if first != "{":
+            # NDJSON of non-objects, or a single scalar
+            while stream.peek():
+                yield stream.value()
+            return
+
+        stream.expect("{")
+        record: Dict[str, Any] = {}
+        while stream.peek() != "}":
+            key = stream.value()
+            stream.expect(":")
+            if key in keys and stream.peek() == "[":
+                yield from stream.array()
+                record = None
+            elif record is not None:
+                record[key] = stream.value()
+            else:
+                stream.value()
+            if stream.peek() == ",":
+                stream.pos += 1
+        stream.expect("}")
+        if record is None:
+            return
+        # No record list inside: the object is a record, possibly the first line of NDJSON
+        yield record
+        while stream.peek():
+            yield stream.value()
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def stream_ingest(
+    collection,
+    records: Iterable[Any],
+    normalize: Callable[[Any], Optional[Tuple[Dict[str, Any], str]]],
+    fields: Sequence[str],
+    model_name: Optional[str] = None,
+    insert: Optional[Callable[[List[List[Any]], List[Dict[str, Any]]], List[Any]]] = None,
+    fallback: Optional[FallbackWriter] = None,
+    stats: Optional[IngestStats] = None,
+    batch_rows: Optional[int] = None,
+) -> int:
+    """Normalize, embed and insert records batch by batch; returns the number inserted.
+
+    normalize(record) returns (row, embedding text), or None to skip the
+    record; row holds every name in fields plus TEXT_FIELD. Entities go in
+    as fields, the dense column, then TEXT_FIELD, the order the upload
+    schemas declare them. insert(entities, rows) defaults to insert_chunks()
+    and must return primary keys in row order; they key the fallback rows.
+    """
+    stats = stats if stats is not None else IngestStats()
+    batch_rows = batch_rows or stream_rows()
+    inserted = skipped = 0
+    started = time.perf_counter()
+    for batch in batched(records, batch_rows):
+        rows, texts = [], []
+        for record in batch:
+            normalized = normalize(record)
+            if normalized is None:
+                skipped += 1
+                continue
+            rows.append(normalized[0])
+            texts.append(normalized[1])
+        if not rows:
+            continue
+        batch_count = len(stats.embed_batch_ms)
+        vectors = embed_texts(texts, model_name, stats=stats, verbose=False)
+        entities = [[row[name] for row in rows] for name in fields]
+        entities += [dense_column(vectors), [row[TEXT_FIELD] for row in rows]]
+        keys = insert(entities, rows) if insert else insert_chunks(collection, entities, stats=stats)
+        if fallback is not None:
+            fallback.add(vectors, {name: [row[name] for row in rows] for name in fallback.columns}, keys)
+        inserted += len(rows)
+        elapsed = time.perf_counter() - started
+        batch_ms = stats.embed_batch_ms[batch_count:]
+        # A batch served entirely from the embedding cache encodes nothing
+        embedded = f"{np.mean(batch_ms):.0f} ms/embed batch" if batch_ms else "all embeddings cached"
+        print(f"[Ingest] {inserted} records ingested ({inserted / elapsed:.0f} rec/s overall, {embedded})")
+    if skipped:
+        print(f"[Ingest] Skipped {skipped} records that could not be normalized")
+    return inserted
@@ -0,0 +1,308 @@
+"""
+Persistent Milvus connection manager.
+
+One connection alias is kept open per process. Collections are loaded once and
+their handles and schemas are cached, so a search only pays for the vector
+query itself. When an operation fails with a connection error the alias is
+dropped and re-established with exponential backoff.
+
+Partitioned collections (see retrieval.partitions) load only their hot
+partitions; colder ones are loaded when a search window asks for them.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from pymilvus import Collection, CollectionSchema, MilvusException, connections, utility
+
+from .partitions import hot_partitions
+from .tuning import index_config_version
+
+T = TypeVar("T")
+
+DEFAULT_ALIAS = "itsm"
+DEFAULT_COLLECTIONS = ["incident_history", "change_request_history", "rca"]
+NON_OUTPUT_FIELDS = ("content_hash", "embedding", "embedding_bits", "id", "search_text", "sparse_embedding")
+
+
+def preload_collections() -> List[str]:
+    """Collections to load at boot (MILVUS_PRELOAD_COLLECTIONS, comma separated)."""
+    names = [
+        name.strip()
+        for name in os.getenv('MILVUS_PRELOAD_COLLECTIONS', '').split(',')
+        if name.strip()
+    ]
+    return names or list(DEFAULT_COLLECTIONS)
+
+
+class MilvusUnavailable(ConnectionError):
+    """Raised when Milvus cannot be reached within the retry budget."""
+
+
+class MilvusConnectionManager:
+    """Owns the process-wide Milvus alias and the loaded collection handles."""
+
+    def __init__(
+        self,
+        alias: str = DEFAULT_ALIAS,
+        connect_timeout: float = 10.0,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        self.alias = alias
+        self.connect_timeout = connect_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.RLock()
+        self._connected = False
+        self._failures = 0
+        self._retry_after = 0.0
+        self._collections: Dict[str, Collection] = {}
+        self._schemas: Dict[str, CollectionSchema] = {}
+        self._output_fields: Dict[str, List[str]] = {}
+        self._index_types: Dict[str, Optional[str]] = {}
+        self._index_config_version: Tuple[str, int] = ("", 0)
+        # name -> (checked at, partition names, loaded partition names)
+        self._partitions: Dict[str, Tuple[float, List[str], Set[str]]] = {}
+        self.partition_check_interval = float(os.getenv('PARTITION_STATE_SECONDS', "60"))
+
+    # ------------------------------------------------------------------
+    # Connection lifecycle
+    # ------------------------------------------------------------------
+    def _backoff(self, failures: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** max(failures - 1, 0)))
+        return delay + random.uniform(0, delay / 4)
+
+    def connect(self) -> str:
+        """Ensure the alias is connected and return it."""
+        if self._connected:
+            return self.alias
+
+        with self._lock:
+            if self._connected:
+                return self.alias
+
+            now = time.monotonic()
+            if now < self._retry_after:
+                raise MilvusUnavailable(
+                    f"Milvus unavailable, next reconnect attempt in {self._retry_after - now:.1f}s"
+                )
+
+            host = os.getenv('MILVUS_HOST', "172.17.204.5")
+            port = os.getenv('MILVUS_PORT', "19530")
+            last_error: Optional[Exception] = None
+
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    connections.connect(
+                        alias=self.alias, host=host, port=port, timeout=self.connect_timeout
+                    )
+                    self._connected = True
+                    self._failures = 0
+                    self._retry_after = 0.0
+                    print(f"[Milvus] Connected alias '{self.alias}' to {host}:{port}")
+                    return self.alias
+                except Exception as e:
+                    last_error = e
+                    self._failures += 1
+                    print(f"[Milvus] Connect attempt {attempt}/{self.max_attempts} failed: {e}")
+                    if attempt < self.max_attempts:
+                        time.sleep(self._backoff(attempt))
+
+            # Keep later requests from hammering a host that is down
+            self._retry_after = time.monotonic() + self._backoff(self._failures)
+            raise MilvusUnavailable(f"Could not connect to Milvus at {host}:{port}: {last_error}")
+
+    def reset(self) -> None:
+        """Drop the alias and every cached handle; the next call reconnects."""
+        with self._lock:
+            try:
+                connections.disconnect(self.alias)
+            except Exception:
+                pass
+            self._connected = False
+            self._collections.clear()
+            self._schemas.clear()
+            self._output_fields.clear()
+            self._index_types.clear()
+            self._partitions.clear()
+
+    def run(self, operation: Callable[[], T]) -> T:
+        """Run a Milvus operation, reconnecting once if the connection broke."""
+        self.connect()
+        try:
+            return operation()
+        except MilvusException as e:
+            print(f"[Milvus] Operation failed ({e}), reconnecting")
+            self.reset()
+            self.connect()
+            return operation()
+
+    # ------------------------------------------------------------------
+    # Collections and schemas
+    # ------------------------------------------------------------------
+    def has_collection(self, name: str) -> bool:
+        if name in self._collections:
+            return True
+        return self.run(lambda: utility.has_collection(name, using=self.alias))
+
+    def collection(self, name: str) -> Collection:
+        """Return a loaded collection handle, loading it on first use."""
+        cached = self._collections.get(name)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            cached = self._collections.get(name)
+            if cached is None:
+                def _load() -> Collection:
+                    collection = Collection(name, using=self.alias)
+                    hot = hot_partitions([partition.name for partition in collection.partitions])
+                    if hot is None:
+                        collection.load()
+                    else:
+                        collection.load(partition_names=hot)
+                    return collection
+
+                started = time.perf_counter()
+                cached = self.run(_load)
+                self._collections[name] = cached
+                self._schemas[name] = cached.schema
+                print(f"[Milvus] Loaded collection '{name}' in {time.perf_counter() - started:.2f}s")
+        return cached
+
+    def schema(self, name: str) -> CollectionSchema:
+        if name not in self._schemas:
+            self.collection(name)
+        return self._schemas[name]
+
+    def primary_field(self, name: str) -> str:
+        return self.schema(name).primary_field.name
+
+    def output_fields(self, name: str, exclude: Sequence[str] = NON_OUTPUT_FIELDS) -> List[str]:
+        """Names of every scalar field worth returning from a search."""
+        key = f"{name}:{','.join(exclude)}"
+        if key not in self._output_fields:
+            self._output_fields[key] = [
+                field.name for field in self.schema(name).fields if field.name not in exclude
+            ]
+        return list(self._output_fields[key])
+
+    def index_type(self, name: str, field_name: str) -> Optional[str]:
+        """Index type built on a field (e.g. 'IVF_SQ8'), or None when it has none."""
+        key = f"{name}:{field_name}"
+        # The tuner rebuilds indexes in place and then rewrites the config; re-read after a retune
+        version = index_config_version()
+        if version != self._index_config_version:
+            self._index_types.clear()
+            self._index_config_version = version
+        if key not in self._index_types:
+            indexes = self.run(lambda: self.collection(name).indexes)
+            self._index_types[key] = next(
+                (index.params.get("index_type") for index in indexes if index.field_name == field_name), None
+            )
+        return self._index_types[key]
+
+    def _partition_state(self, name: str) -> Tuple[float, List[str], Set[str]]:
+        """Partition names and which are loaded; re-read after PARTITION_STATE_SECONDS
+        because another process (the release CLI) may have changed them."""
+        state = self._partitions.get(name)
+        if state is None or time.monotonic() - state[0] > self.partition_check_interval:
+            def _read():
+                names = [partition.name for partition in self.collection(name).partitions]
+                loaded = {
+                    partition for partition in names
+                    if utility.load_state(name, partition_names=[partition], using=self.alias).name == "Loaded"
+                }
+                return names, loaded
+
+            names, loaded = self.run(_read)
+            state = (time.monotonic(), names, loaded)
+            self._partitions[name] = state
+        return state
+
+    def partitions(self, name: str) -> List[str]:
+        return list(self._partition_state(name)[1])
+
+    def loaded_partitions(self, name: str) -> Set[str]:
+        return set(self._partition_state(name)[2])
+
+    def load_partitions(self, name: str, partitions: Sequence[str]) -> None:
+        """Load whichever of partitions are not loaded yet."""
+        missing = [partition for partition in partitions if partition not in self.loaded_partitions(name)]
+        if not missing:
+            return
+        started = time.perf_counter()
+        self.run(lambda: self.collection(name).load(partition_names=missing))
+        with self._lock:
+            checked, names, loaded = self._partition_state(name)
+            self._partitions[name] = (checked, names, loaded | set(missing))
+        print(f"[Milvus] Loaded {len(missing)} cold partitions of '{name}' in {time.perf_counter() - started:.2f}s")
+
+    def release_partitions(self, name: str, partitions: Sequence[str]) -> None:
+        if not partitions:
+            return
+        def _release():
+            collection = self.collection(name)
+            for partition in partitions:
+                collection.partition(partition).release()
+
+        self.run(_release)
+        with self._lock:
+            checked, names, loaded = self._partition_state(name)
+            self._partitions[name] = (checked, names, loaded - set(partitions))
+        print(f"[Milvus] Released {len(partitions)} partitions of '{name}'")
+
+    def collection_id(self, name: str):
+        """Server-side id of a collection; changes when it is dropped and recreated."""
+        return self.run(lambda: Collection(name, using=self.alias).describe()["collection_id"])
+
+    def forget(self, name: str) -> None:
+        """Drop a cached handle, e.g. after an upload script recreated the collection."""
+        with self._lock:
+            self._collections.pop(name, None)
+            self._schemas.pop(name, None)
+            self._partitions.pop(name, None)
+            for cache in (self._output_fields, self._index_types):
+                for key in [k for k in cache if k.startswith(f"{name}:")]:
+                    del cache[key]
+
+    def search(self, name: str, data, anns_field: str, param: Dict, limit: int, **kwargs):
+        """collection.search() with reconnect-on-failure."""
+        def _search():
+            return self.collection(name).search(data, anns_field, param, limit=limit, **kwargs)
+
+        return self.run(_search)
+
+    def query(self, name: str, expr: str, output_fields: Sequence[str], **kwargs):
+        """collection.query() with reconnect-on-failure."""
+        def _query():
+            return self.collection(name).query(expr, output_fields=list(output_fields), **kwargs)
+
+        return self.run(_query)
+
+    def preload(self, names: Optional[Sequence[str]] = None) -> None:
+        """Connect and load the configured collections; missing ones are skipped."""
+        try:
+            self.connect()
+        except MilvusUnavailable as e:
+            print(f"[Milvus] Preload skipped: {e}")
+            return
+
+        for name in names or preload_collections():
+            try:
+                if self.has_collection(name):
+                    self.collection(name)
+                else:
+                    print(f"[Milvus] Collection '{name}' not found, skipping preload")
+            except Exception as e:
+                print(f"[Milvus] Could not preload '{name}': {e}")
+
+
+milvus = MilvusConnectionManager()
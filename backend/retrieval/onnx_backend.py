@@ -0,0 +1,140 @@
+"""
+Quantised ONNX embedding backend for CPU-only nodes.
+
+The configured sentence-transformers model is exported to ONNX once, its
+weights are dynamically quantised to int8 and the result is cached on disk
+(ONNX_MODEL_DIR). OnnxEmbeddingModel.encode() mirrors the SentenceTransformer
+signature used by the registry: mean pooling over the attention mask followed
+by L2 normalisation, which is what all-MiniLM-L6-v2 does in torch.
+
+Select it with EMBEDDING_BACKEND=onnx. Requires onnxruntime
+(pip install onnxruntime); export additionally uses torch and transformers,
+which the backend already depends on.
+"""
+
+import os
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+
+def hub_model_id(model_name: str) -> str:
+    """Short sentence-transformers names live under the sentence-transformers org."""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def export_dir(model_name: str) -> str:
+    root = os.getenv('ONNX_MODEL_DIR', os.path.join(os.path.expanduser("~"), ".cache", "itsm-agent", "onnx"))
+    return os.path.join(root, hub_model_id(model_name).replace("/", "__"))
+
+
+def export_model(model_name: str, target_dir: str, quantize: bool = True) -> str:
+    """Export the transformer to ONNX (and int8) and return the model path to load."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(target_dir, exist_ok=True)
+    hub_id = hub_model_id(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(hub_id)
+    model = AutoModel.from_pretrained(hub_id)
+    model.eval()
+    tokenizer.save_pretrained(target_dir)
+
+    fp32_path = os.path.join(target_dir, "model.onnx")
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    print(f"[ONNX] Exported {hub_id} to {fp32_path}")
+
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = os.path.join(target_dir, "model_int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"[ONNX] Quantised weights to int8: {int8_path}")
+    return int8_path
+
+
+class OnnxEmbeddingModel:
+    """SentenceTransformer-compatible encoder running on onnxruntime."""
+
+    def __init__(
+        self,
+        model_name: str,
+        quantize: bool = True,
+        max_seq_length: int = 256,
+        intra_op_threads: Optional[int] = None,
+        model_dir: Optional[str] = None,
+    ):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("EMBEDDING_BACKEND=onnx requires onnxruntime: pip install onnxruntime") from e
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+        target_dir = model_dir or export_dir(model_name)
+        model_path = os.path.join(target_dir, "model_int8.onnx" if quantize else "model.onnx")
+        if not os.path.exists(model_path):
+            model_path = export_model(model_name, target_dir, quantize=quantize)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = intra_op_threads or int(os.getenv('ONNX_INTRA_OP_THREADS', "0"))
+        if threads:
+            options.intra_op_num_threads = threads
+
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(target_dir)
+        self.model_path = model_path
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        feeds = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+        hidden = self.session.run(None, feeds)[0]
+
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def encode(
+        self,
+        sentences: Union[str, Sequence[str]],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = False,
+        **_ignored,
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        vectors = np.concatenate([
+            self._encode_batch(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ])
+        return vectors[0] if single else vectors
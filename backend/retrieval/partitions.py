@@ -0,0 +1,227 @@
+"""
+Time and domain partitions for ticket history collections.
+
+Upload scripts write each row into a Milvus partition named after the month
+it was opened and/or its domain (INCIDENT_PARTITIONS):
+
+  month         m202503                 (m_undated when there is no date)
+  domain        d_network
+  month_domain  m202503__d_network
+  none          everything in _default, as before
+
+RetrievalService reads the same time window and domain out of the search
+filters (the opened / category conditions the tools already build) and
+searches only the partitions that can hold a match; the filter expression
+still runs inside them, so pruning never changes the results. Callers can
+also name partitions outright.
+
+With PARTITION_HOT_MONTHS set, the agents load only the partitions of the
+last N months (plus undated and domain-only ones) and release_cold_partitions()
+frees the rest from Milvus memory:
+
+    python -m retrieval.partitions incident_history --keep-months 6
+
+A search whose window reaches into a cold month loads those partitions on
+demand; searches without a window only see what is loaded.
+"""
+
+import argparse
+import os
+import re
+from datetime import date
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from .filters import Filters, normalize_date
+from .ingest import IngestStats, insert_chunks
+
+PARTITION_SCHEMES = ("none", "month", "domain", "month_domain")
+# (time field, domain field) the partitions of each collection are cut on
+PARTITION_FIELDS = {"incident_history": ("opened", "category")}
+UNDATED = "_undated"
+
+
+def partition_scheme() -> str:
+    scheme = os.getenv('INCIDENT_PARTITIONS', "month").strip().lower()
+    if scheme not in PARTITION_SCHEMES:
+        raise ValueError(f"Unknown INCIDENT_PARTITIONS '{scheme}', expected one of {', '.join(PARTITION_SCHEMES)}")
+    return scheme
+
+
+def hot_months() -> int:
+    """Months of history kept loaded (PARTITION_HOT_MONTHS); 0 keeps every partition loaded."""
+    return int(os.getenv('PARTITION_HOT_MONTHS', "0"))
+
+
+# ============================================================================
+# Names
+# ============================================================================
+
+def domain_slug(value: Any) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(value or "").strip().lower()).strip("_") or "none"
+
+
+def month_of(value: Any) -> str:
+    """YYYYMM of a date in any format normalize_date understands, or UNDATED."""
+    text = normalize_date(value)
+    return text[:4] + text[5:7] if re.match(r"\d{4}-\d{2}", text) else UNDATED
+
+
+def partition_name(opened: Any, domain: Any, scheme: str) -> str:
+    parts = []
+    if scheme in ("month", "month_domain"):
+        parts.append(f"m{month_of(opened)}")
+    if scheme in ("domain", "month_domain"):
+        parts.append(f"d_{domain_slug(domain)}")
+    return "__".join(parts)
+
+
+def parse_partition(name: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """(YYYYMM or UNDATED or None, domain slug or None); None for names not written by this module."""
+    month = domain = None
+    for part in name.split("__"):
+        if part.startswith("d_"):
+            domain = part[2:]
+        elif re.fullmatch(r"m(\d{6}|_undated)", part):
+            month = part[1:]
+        else:
+            return None
+    return month, domain
+
+
+# ============================================================================
+# Ingest side
+# ============================================================================
+
+def insert_partitioned(
+    collection,
+    entities: Sequence[List[Any]],
+    openeds: Sequence[Any],
+    domains: Sequence[Any],
+    scheme: Optional[str] = None,
+    stats: Optional[IngestStats] = None,
+) -> List[Any]:
+    """Insert column-major entities partition by partition; primary keys come back in row order."""
+    scheme = scheme or partition_scheme()
+    if scheme == "none":
+        return insert_chunks(collection, entities, stats=stats)
+
+    groups: Dict[str, List[int]] = {}
+    for row, (opened, domain) in enumerate(zip(openeds, domains)):
+        groups.setdefault(partition_name(opened, domain, scheme), []).append(row)
+
+    keys: List[Any] = [None] * len(openeds)
+    for name in sorted(groups):
+        rows = groups[name]
+        if not collection.has_partition(name):
+            collection.create_partition(name)
+        partition_keys = insert_chunks(
+            collection, [[column[row] for row in rows] for column in entities], partition_name=name, stats=stats
+        )
+        for row, key in zip(rows, partition_keys):
+            keys[row] = key
+    print(f"[Partitions] Wrote {len(openeds)} rows into {len(groups)} '{scheme}' partitions")
+    return keys
+
+
+# ============================================================================
+# Query side
+# ============================================================================
+
+def _bounds(condition: Any) -> Tuple[Optional[str], Optional[str]]:
+    if isinstance(condition, Mapping):
+        after = condition.get("gte") or condition.get("gt") or condition.get("eq")
+        before = condition.get("lte") or condition.get("lt") or condition.get("eq")
+        return after, before
+    if condition is not None and not isinstance(condition, (list, tuple, set)):
+        return condition, condition
+    return None, None
+
+
+def _domains(condition: Any) -> Optional[Set[str]]:
+    if isinstance(condition, Mapping):
+        condition = condition.get("eq", condition.get("in"))
+    if condition is None:
+        return None
+    values = [condition] if isinstance(condition, str) or not isinstance(condition, (list, tuple, set)) else condition
+    return {domain_slug(value) for value in values}
+
+
+def select_partitions(collection: str, names: Sequence[str], filters: Filters) -> Optional[List[str]]:
+    """Partitions that can hold rows matching filters, or None when filters don't narrow them."""
+    if collection not in PARTITION_FIELDS or not isinstance(filters, Mapping):
+        return None
+    time_field, domain_field = PARTITION_FIELDS[collection]
+    after, before = _bounds(filters.get(time_field))
+    domains = _domains(filters.get(domain_field))
+    if after is None and before is None and domains is None:
+        return None
+    low = month_of(after) if after is not None else None
+    high = month_of(before) if before is not None else None
+
+    parsed = {name: parse_partition(name) for name in names}
+    if all(value is None for value in parsed.values()):
+        return None
+    selected = []
+    for name, value in parsed.items():
+        if value is None:
+            # _default and anything hand-made: cannot rule it out
+            selected.append(name)
+            continue
+        month, domain = value
+        if month is not None and (low or high):
+            if month == UNDATED:
+                continue
+            if (low and low != UNDATED and month < low) or (high and high != UNDATED and month > high):
+                continue
+        if domain is not None and domains is not None and domain not in domains:
+            continue
+        selected.append(name)
+    # Nothing pruned: search as if unfiltered, which keeps cold partitions cold
+    return None if len(selected) == len(parsed) else selected
+
+
+def hot_partitions(
+    names: Sequence[str], months: Optional[int] = None, today: Optional[date] = None
+) -> Optional[List[str]]:
+    """Partitions to keep loaded, or None to load everything."""
+    months = hot_months() if months is None else months
+    if months <= 0:
+        return None
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    cutoff = f"{index // 12:04d}{index % 12 + 1:02d}"
+    hot = []
+    for name in names:
+        value = parse_partition(name)
+        month = value[0] if value else None
+        if month is None or month == UNDATED or month >= cutoff:
+            hot.append(name)
+    return hot
+
+
+def release_cold_partitions(collection: str, months: Optional[int] = None, manager=None) -> List[str]:
+    """Release every loaded partition older than the hot window; returns their names."""
+    if manager is None:
+        from .milvus import milvus as manager
+    hot = hot_partitions(manager.partitions(collection), months)
+    if hot is None:
+        return []
+    cold = [name for name in manager.partitions(collection) if name not in hot]
+    manager.release_partitions(collection, cold)
+    return cold
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Release partitions older than the hot window from Milvus memory.")
+    parser.add_argument("collections", nargs="+")
+    parser.add_argument("--keep-months", type=int, default=None, help="default PARTITION_HOT_MONTHS")
+    args = parser.parse_args(argv)
+
+    for name in args.collections:
+        released = release_cold_partitions(name, args.keep_months)
+        listed = f" ({', '.join(released)})" if released else ""
+        print(f"[Partitions] {name}: released {len(released)} cold partitions{listed}")
+
+
+if __name__ == "__main__":
+    main()
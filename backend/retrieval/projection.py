@@ -0,0 +1,78 @@
+"""
+Lazy output-field projection for searches that rank more hits than they return.
+
+Hybrid, diversified and compressed searches pull several candidates for every
+hit they return. Asking Milvus for every scalar field on each candidate drags
+multi-KB plans and work notes across the wire only to throw most of them
+away. Those searches run in two phases instead (see RetrievalService):
+
+  1. the vector search returns primary keys and scores only, plus whatever
+     the ranking itself needs (the embedding for MMR);
+  2. one primary-key query fetches the requested fields for the hits that
+     survived ranking.
+
+TWO_PHASE_FETCH is 'auto' (two phases only when candidates outnumber the
+hits returned), 'always' or 'off'.
+
+Field budgets cap the characters kept per long-text field so a single ticket
+cannot flood a prompt. FIELD_BUDGETS overrides the defaults below as
+comma-separated name=chars pairs; 0 keeps a field whole.
+"""
+
+import os
+from typing import Any, Dict, Mapping, Optional
+
+TWO_PHASE_MODES = ("auto", "always", "off")
+
+DEFAULT_FIELD_BUDGETS = {
+    "description": 1500,
+    "correlation_display": 300,
+    "work_notes": 800,
+    "comments": 800,
+    "close_notes": 800,
+    "resolution_notes": 1200,
+    "justification": 600,
+    "implementation_plan": 1200,
+    "backout_plan": 800,
+    "test_plan": 800,
+    "change_plan": 1200,
+    "risk_impact_analysis": 800,
+}
+
+
+def two_phase_mode() -> str:
+    mode = os.getenv('TWO_PHASE_FETCH', "auto").strip().lower()
+    if mode not in TWO_PHASE_MODES:
+        raise ValueError(f"Unknown TWO_PHASE_FETCH '{mode}', expected one of {', '.join(TWO_PHASE_MODES)}")
+    return mode
+
+
+def two_phase(candidates: int, k: int) -> bool:
+    """Whether a search fetching candidates hits to return k should defer its fields."""
+    mode = two_phase_mode()
+    return mode == "always" or (mode == "auto" and candidates > k)
+
+
+def field_budgets() -> Dict[str, int]:
+    """Character budget per field: the defaults with FIELD_BUDGETS applied on top."""
+    budgets = dict(DEFAULT_FIELD_BUDGETS)
+    for pair in os.getenv('FIELD_BUDGETS', "").split(","):
+        if "=" in pair:
+            name, chars = pair.split("=", 1)
+            budgets[name.strip()] = int(chars)
+    return budgets
+
+
+def truncate(value: Any, budget: int) -> Any:
+    """value cut to budget characters on a word boundary, with a marker saying how much went."""
+    if not isinstance(value, str) or budget <= 0 or len(value) <= budget:
+        return value
+    cut = value.rfind(" ", 0, budget)
+    cut = cut if cut > budget // 2 else budget
+    return f"{value[:cut].rstrip()} … [{len(value) - cut} more chars]"
+
+
+def apply_budgets(fields: Mapping[str, Any], budgets: Optional[Mapping[str, int]]) -> Dict[str, Any]:
+    if not budgets:
+        return dict(fields)
+    return {name: truncate(value, budgets.get(name, 0)) for name, value in fields.items()}
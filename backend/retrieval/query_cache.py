@@ -0,0 +1,126 @@
+"""
+LRU/TTL cache of query embeddings.
+
+Users paste the same incident text again and again, and the enhancer re-embeds
+the same description on every retry and confirmation cycle. Queries are
+normalised (case, whitespace, ticket numbers masked) and the normalised text
+is both the cache key and what gets embedded, so those repeats skip the
+transformer entirely and the cached vector is the same whichever of them came
+first.
+
+The trade-off: the dense vector never sees ticket numbers, so "INC0012345"
+and "INC0099999" in otherwise equal queries embed the same. Exact identifiers
+are matched by the BM25 leg of a hybrid search, which ranks on the raw query
+text, and the semantic cache keeps hybrid results apart by that text.
+
+Hit/miss counters and the estimated encode time saved are exposed through
+stats().
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .batching import get_batcher
+from .embeddings import default_model_name
+
+TICKET_NUMBER_PATTERN = re.compile(
+    r"\b(INC|CHG|PRB|PTASK|RITM|REQ|SCTASK|CTASK|TASK|KB)\d{5,}\b", re.IGNORECASE
+)
+
+
+def normalize_query(text: str, mask_tickets: bool = True) -> str:
+    """Lower-case, collapse whitespace and mask ticket numbers (INC0012345 -> inc#).
+
+    mask_tickets=False keeps the numbers, for keys that must tell them apart.
+    """
+    if mask_tickets:
+        text = TICKET_NUMBER_PATTERN.sub(lambda match: f"{match.group(1)}#", text)
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of query vectors with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, vector = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def _store(self, key: Tuple[str, str], vector: np.ndarray, elapsed: float) -> None:
+        with self._lock:
+            self.misses += 1
+            self.encode_seconds += elapsed
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def encode(self, text: str, model_name: Optional[str] = None) -> np.ndarray:
+        """Return the embedding of the normalised query, computing it on a miss."""
+        name = model_name or default_model_name()
+        normalized = normalize_query(text)
+        key = (name, normalized)
+
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector
+
+        # Misses go through the batcher so concurrent requests share one encode call
+        started = time.perf_counter()
+        vector = get_batcher(name).encode(normalized)
+        vector.setflags(write=False)
+        self._store(key, vector, time.perf_counter() - started)
+        return vector
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_encode = self.encode_seconds / self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "size": len(self._entries),
+                "avg_encode_ms": round(avg_encode * 1000, 2),
+                "saved_ms": round(self.hits * avg_encode * 1000, 1),
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']:.0%} "
+            f"saved≈{stats['saved_ms']:.0f}ms"
+        )
+
+
+query_embedding_cache = QueryEmbeddingCache(
+    max_entries=int(os.getenv('QUERY_CACHE_SIZE', "1024")),
+    ttl_seconds=float(os.getenv('QUERY_CACHE_TTL', "3600")),
+)
@@ -0,0 +1,128 @@
+"""
+Resolution fast path over the structured RCA collection.
+
+rca_data_upload.py stores every known problem with its root cause,
+resolution steps and prevention as separate fields. A resolution request
+that closely matches one of them can be answered straight from those
+fields, without starting the Atlassian MCP server or asking Confluence.
+
+find_resolution() searches 'rca' with the request (or, when it names an
+incident number, that incident's description from incident_history) and
+returns the best RCA only when its cosine similarity reaches
+RCA_FAST_PATH_MIN_SCORE. Anything below falls through to the Confluence
+path as before. RCA_FAST_PATH=off disables the shortcut entirely.
+"""
+
+import asyncio
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from .filters import compile_filters
+from .service import CollectionNotFound, Hit, retrieval_service
+
+RCA_COLLECTION = "rca"
+RCA_FIELDS = ["title", "category", "severity", "symptoms", "root_cause_analysis", "resolution_steps", "prevention"]
+INCIDENT_NUMBER = re.compile(r"\bINC\d{5,}\b", re.IGNORECASE)
+
+
+def rca_fast_path_enabled() -> bool:
+    return os.getenv('RCA_FAST_PATH', "on").strip().lower() in ("1", "true", "on", "yes")
+
+
+def rca_min_score() -> float:
+    """Cosine similarity the best RCA needs before it answers on its own."""
+    return float(os.getenv('RCA_FAST_PATH_MIN_SCORE', "0.6"))
+
+
+_stats_lock = threading.Lock()
+_stats = {"answered": 0, "missed": 0, "errors": 0}
+
+
+def _count(outcome: str) -> None:
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def stats() -> Dict[str, float]:
+    with _stats_lock:
+        total = sum(_stats.values())
+        return {
+            "enabled": rca_fast_path_enabled(),
+            "min_score": rca_min_score(),
+            **_stats,
+            "answer_rate": round(_stats["answered"] / total, 3) if total else 0.0,
+        }
+
+
+def resolution_query(message: str) -> str:
+    """Text to match RCAs against: the named incident's description when there is one."""
+    match = INCIDENT_NUMBER.search(message)
+    if not match:
+        return message
+    try:
+        from .milvus import milvus
+
+        rows = milvus.query(
+            "incident_history",
+            compile_filters({"number": match.group(0).upper()}),
+            ["short_description", "description"],
+            limit=1,
+        )
+    except Exception as e:
+        print(f"[RCA] Incident lookup for {match.group(0)} failed: {e}")
+        return message
+    if not rows:
+        return message
+    row = rows[0]
+    return " ".join(str(row[name]) for name in ("short_description", "description") if row.get(name)) or message
+
+
+async def find_resolution(message: str) -> Tuple[Optional[Hit], str]:
+    """(best RCA if it clears the threshold, query text used); never raises."""
+    if not rca_fast_path_enabled():
+        return None, message
+    # The incident lookup is a blocking Milvus call; reconnect backoff must not stall the event loop
+    query = await asyncio.to_thread(resolution_query, message) if INCIDENT_NUMBER.search(message) else message
+    try:
+        hits = await retrieval_service.search(RCA_COLLECTION, query, k=1, fields=RCA_FIELDS, diversity=1.0, min_score=0.0)
+    except CollectionNotFound:
+        _count("missed")
+        return None, query
+    except Exception as e:
+        print(f"[RCA] Fast path search failed: {e}")
+        _count("errors")
+        return None, query
+
+    threshold = rca_min_score()
+    best = hits[0] if hits else None
+    if best is None or best.score < threshold:
+        score = f"{best.score:.2f}" if best else "none"
+        print(f"[RCA] No match above {threshold:.2f} (best {score}), consulting Confluence")
+        _count("missed")
+        return None, query
+    print(f"[RCA] {best.id} matched at {best.score:.2f}, answering from RCA")
+    _count("answered")
+    return best, query
+
+
+def format_resolution(hit: Hit) -> str:
+    """Markdown answer built only from the structured RCA fields."""
+    return f"""**Resolution from Root Cause Analysis {hit.id}** (match score: {hit.score:.2f})
+
+**Known Issue:** {hit.get('title', 'Unknown Issue')}
+- **Category**: {hit.get('category', 'General')}
+- **Severity**: {hit.get('severity', 'Unknown')}
+- **Symptoms**: {hit.get('symptoms', 'Not documented')}
+
+**Root Cause:**
+{hit.get('root_cause_analysis', 'Not documented')}
+
+**Resolution Steps:**
+{hit.get('resolution_steps', 'Not documented')}
+
+**Prevention:**
+{hit.get('prevention', 'Not documented')}
+
+If these steps do not resolve the issue, ask for a Confluence knowledge base search or escalate to the assignment group."""
@@ -0,0 +1,187 @@
+"""
+Cross-encoder re-ranking of retrieval candidates, under a hard time budget.
+
+MiniLM bi-encoder similarity is noisy on the short descriptions ITSM tickets
+tend to have. With RERANK=on, RetrievalService pulls RERANK_TOP_N candidates
+and scores each (query, ticket text) pair with a small cross-encoder on CPU
+before the final k are chosen; Hit.rerank_score carries the result. The
+model's logits go through a sigmoid, so rerank_score lies in [0, 1] like the
+cosine relevance MMR trades it against.
+
+Scoring runs in batches of RERANK_BATCH on one dedicated worker thread. The
+request waits at most RERANK_BUDGET_MS: past the deadline the worker stops
+before its next batch and the request keeps the bi-encoder order, so a busy
+CPU costs relevance, never latency. Latency, timeouts and errors are kept
+for stats() and the /health endpoints.
+
+The model loads on first use; call reranker.warmup() at boot so the first
+request does not spend its budget loading it.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# Ticket text the cross-encoder reads, in order; fields a collection lacks are skipped
+RERANK_TEXT_FIELDS = ("short_description", "title", "description", "root_cause_analysis")
+
+
+def rerank_enabled() -> bool:
+    return os.getenv('RERANK', "off").strip().lower() in ("1", "true", "on", "yes")
+
+
+def rerank_model_name() -> str:
+    return os.getenv('RERANK_MODEL', DEFAULT_RERANK_MODEL)
+
+
+def rerank_candidates() -> int:
+    return int(os.getenv('RERANK_TOP_N', "20"))
+
+
+def rerank_budget() -> float:
+    """Seconds a request may spend re-ranking."""
+    return float(os.getenv('RERANK_BUDGET_MS', "250")) / 1000
+
+
+def rerank_batch_size() -> int:
+    return int(os.getenv('RERANK_BATCH', "16"))
+
+
+def rerank_max_chars() -> int:
+    """Characters of ticket text per pair; the model truncates at 512 tokens anyway."""
+    return int(os.getenv('RERANK_MAX_CHARS', "1000"))
+
+
+def hit_text(fields: Dict[str, Any], text_fields: Sequence[str] = RERANK_TEXT_FIELDS) -> str:
+    return " ".join(str(fields[name]) for name in text_fields if fields.get(name))[:rerank_max_chars()]
+
+
+class CrossEncoderReranker:
+    """Owns the cross-encoder, its worker thread and its latency metrics."""
+
+    def __init__(self, model_name: Optional[str] = None, history: int = 1000):
+        self.model_name = model_name
+        self._model = None
+        self._load_lock = threading.Lock()
+        # One worker: the model is not shared between threads and torch already uses every core
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._stats_lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=history)
+        self.calls = 0
+        self.reranked = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.pairs = 0
+
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    import torch
+                    from sentence_transformers import CrossEncoder
+
+                    name = self.model_name or rerank_model_name()
+                    started = time.perf_counter()
+                    # ms-marco cross-encoders return raw logits unless told otherwise
+                    try:
+                        self._model = CrossEncoder(name, device="cpu", activation_fn=torch.nn.Sigmoid())
+                    except TypeError:
+                        # sentence-transformers < 4
+                        self._model = CrossEncoder(name, device="cpu", default_activation_function=torch.nn.Sigmoid())
+                    print(f"[Rerank] Loaded '{name}' in {time.perf_counter() - started:.2f}s")
+        return self._model
+
+    def warmup(self) -> None:
+        """Load and run the model once when re-ranking is enabled."""
+        if rerank_enabled():
+            self.model().predict([("warmup", "warmup")], show_progress_bar=False)
+
+    def _score(self, query: str, texts: List[str], deadline: float) -> Optional[np.ndarray]:
+        model = self.model()
+        batch_size = rerank_batch_size()
+        scores: List[float] = []
+        for begin in range(0, len(texts), batch_size):
+            if time.monotonic() > deadline:
+                return None
+            pairs = [(query, text) for text in texts[begin:begin + batch_size]]
+            scores.extend(model.predict(pairs, batch_size=batch_size, show_progress_bar=False))
+        return np.asarray(scores, dtype=np.float32)
+
+    def rerank(self, query: str, hits: List[Any], budget: Optional[float] = None) -> List[Any]:
+        """hits ordered by cross-encoder score, or unchanged when the budget ran out."""
+        if len(hits) < 2:
+            return hits
+        started = time.monotonic()
+        deadline = started + (rerank_budget() if budget is None else budget)
+        future = self._executor.submit(self._score, query, [hit_text(hit.fields) for hit in hits], deadline)
+
+        scores, outcome = None, "ok"
+        try:
+            scores = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            future.cancel()
+        except Exception as e:
+            print(f"[Rerank] Scoring failed: {e}")
+            outcome = "error"
+        if scores is None and outcome == "ok":
+            outcome = "timeout"
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self._record(outcome, len(hits), elapsed_ms)
+
+        if scores is None:
+            print(f"[Rerank] {len(hits)} candidates: {outcome} after {elapsed_ms:.0f}ms, keeping bi-encoder order")
+            return hits
+        for hit, score in zip(hits, scores):
+            hit.rerank_score = float(score)
+        order = np.argsort(-scores, kind="stable")
+        return [hits[i] for i in order]
+
+    def _record(self, outcome: str, pairs: int, elapsed_ms: float) -> None:
+        with self._stats_lock:
+            self.calls += 1
+            self.pairs += pairs
+            self._latencies.append(elapsed_ms)
+            if outcome == "ok":
+                self.reranked += 1
+            elif outcome == "timeout":
+                self.timeouts += 1
+            else:
+                self.errors += 1
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._latencies.clear()
+            self.calls = self.reranked = self.timeouts = self.errors = self.pairs = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            latencies = np.asarray(self._latencies) if self._latencies else np.zeros(1)
+            return {
+                "enabled": rerank_enabled(),
+                "calls": self.calls,
+                "reranked": self.reranked,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "timeout_rate": round(self.timeouts / self.calls, 3) if self.calls else 0.0,
+                "avg_candidates": round(self.pairs / self.calls, 1) if self.calls else 0.0,
+                "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+                "max_ms": round(float(latencies.max()), 1),
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"calls={stats['calls']} timeouts={stats['timeouts']} errors={stats['errors']} "
+            f"p50={stats['p50_ms']:.0f}ms p95={stats['p95_ms']:.0f}ms"
+        )
+
+
+reranker = CrossEncoderReranker()
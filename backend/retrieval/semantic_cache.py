@@ -0,0 +1,258 @@
+"""
+Process-wide semantic cache of retrieval results.
+
+The same incident gets described in slightly different words across sessions
+and confirmation retries. When a new query embedding lies within
+SEMANTIC_CACHE_MAX_DISTANCE (cosine distance) of a cached query against the
+same collection, with the same k, filters and fields, the cached hits are
+returned without a Milvus round trip.
+
+Entries are evicted LRU-first once either the entry count or the estimated
+memory footprint is exceeded. A collection's entries are dropped when:
+
+  * invalidate() is called in-process,
+  * an upload script calls mark_collection_changed() (a marker file under
+    RETRIEVAL_STATE_DIR, checked by refresh() before every search), or
+  * the collection id reported by Milvus changes, i.e. it was dropped and
+    recreated from another host (checked every SEMANTIC_CACHE_CHECK_SECONDS).
+
+An incremental upload from another host keeps the collection id and leaves
+no marker here, so every entry also expires SEMANTIC_CACHE_TTL_SECONDS
+after it was stored; that bounds how long deleted or updated tickets can be
+served.
+"""
+
+import copy
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from .milvus import MilvusConnectionManager, milvus
+
+
+def state_dir() -> str:
+    return os.getenv('RETRIEVAL_STATE_DIR', os.path.join(os.path.expanduser("~"), ".cache", "itsm-agent", "state"))
+
+
+def marker_path(collection: str) -> str:
+    return os.path.join(state_dir(), f"{collection}.changed")
+
+
+def mark_collection_changed(collection: str) -> None:
+    """Tell running agents on this host that a collection was rewritten."""
+    os.makedirs(state_dir(), exist_ok=True)
+    with open(marker_path(collection), "w", encoding="utf-8") as f:
+        f.write(f"{time.time():.3f}\n")
+
+
+def _marker_version(collection: str) -> int:
+    try:
+        return os.stat(marker_path(collection)).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _hits_nbytes(hits: List[Any]) -> int:
+    total = 0
+    for hit in hits:
+        total += 200 + sum(sys.getsizeof(value) for value in getattr(hit, "fields", {}).values())
+    return total
+
+
+def _detached(hit: Any) -> Any:
+    """Copy of a hit with its own fields dict, so trimming or re-ranking it leaves the cache alone."""
+    clone = copy.copy(hit)
+    clone.fields = dict(hit.fields)
+    return clone
+
+
+class _Entry:
+    __slots__ = ("scope", "vector", "hits", "nbytes", "stored_at")
+
+    def __init__(self, scope: Tuple[str, Hashable], vector: np.ndarray, hits: List[Any]):
+        self.scope = scope
+        self.vector = vector
+        self.hits = hits
+        self.nbytes = vector.nbytes + _hits_nbytes(hits)
+        self.stored_at = time.monotonic()
+
+
+class SemanticResultCache:
+    """LRU of (query vector -> hits) per collection and search scope, bounded by count and bytes."""
+
+    def __init__(
+        self,
+        max_distance: float = 0.05,
+        max_entries: int = 512,
+        max_bytes: int = 64 * 2**20,
+        check_interval: float = 60.0,
+        manager: Optional[MilvusConnectionManager] = None,
+        ttl: float = 600.0,
+    ):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self.manager = manager
+
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._by_scope: Dict[Tuple[str, Hashable], Dict[int, np.ndarray]] = {}
+        self._matrices: Dict[Tuple[str, Hashable], Tuple[List[int], np.ndarray]] = {}
+        self._next_id = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._marker_seen: Dict[str, int] = {}
+        self._collection_ids: Dict[str, Any] = {}
+        self._last_check: Dict[str, float] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+    def invalidate(self, collection: Optional[str] = None) -> None:
+        """Drop cached results for one collection, or for all of them."""
+        with self._lock:
+            for entry_id in [i for i, e in self._entries.items() if collection is None or e.scope[0] == collection]:
+                self._remove(entry_id)
+            self.invalidations += 1
+        if self.manager is not None:
+            for name in [collection] if collection else list(self._collection_ids):
+                self.manager.forget(name)
+
+    def refresh(self, collection: str) -> None:
+        """Drop a collection's entries if it was re-uploaded since the last check."""
+        version = _marker_version(collection)
+        seen = self._marker_seen.setdefault(collection, version)
+        if version != seen:
+            self._marker_seen[collection] = version
+            print(f"[Semantic Cache] '{collection}' was re-uploaded, dropping cached results")
+            self.invalidate(collection)
+
+        if self.manager is None or self.check_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_check.get(collection, 0.0) < self.check_interval:
+            return
+        self._last_check[collection] = now
+        try:
+            current = self.manager.collection_id(collection)
+        except Exception as e:
+            print(f"[Semantic Cache] Could not check '{collection}': {e}")
+            return
+        previous = self._collection_ids.setdefault(collection, current)
+        if current != previous:
+            self._collection_ids[collection] = current
+            print(f"[Semantic Cache] '{collection}' was recreated, dropping cached results")
+            self.invalidate(collection)
+
+    # ------------------------------------------------------------------
+    # Lookup and store
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _unit(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _matrix(self, scope: Tuple[str, Hashable]) -> Tuple[List[int], np.ndarray]:
+        cached = self._matrices.get(scope)
+        if cached is None:
+            vectors = self._by_scope[scope]
+            cached = (list(vectors), np.stack(list(vectors.values())))
+            self._matrices[scope] = cached
+        return cached
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        self._bytes -= entry.nbytes
+        scoped = self._by_scope[entry.scope]
+        del scoped[entry_id]
+        if not scoped:
+            del self._by_scope[entry.scope]
+        self._matrices.pop(entry.scope, None)
+
+    def lookup(self, collection: str, scope: Hashable, vector: np.ndarray) -> Optional[List[Any]]:
+        """Cached hits for a query within max_distance of this one, or None."""
+        if self.max_distance <= 0:
+            return None
+
+        key = (collection, scope)
+        query = self._unit(vector)
+        with self._lock:
+            if key not in self._by_scope:
+                self.misses += 1
+                return None
+            ids, matrix = self._matrix(key)
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if 1.0 - float(similarities[best]) > self.max_distance:
+                self.misses += 1
+                return None
+            entry_id = ids[best]
+            if self.ttl > 0 and time.monotonic() - self._entries[entry_id].stored_at > self.ttl:
+                self._remove(entry_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return [_detached(hit) for hit in self._entries[entry_id].hits]
+
+    def store(self, collection: str, scope: Hashable, vector: np.ndarray, hits: List[Any]) -> None:
+        if self.max_distance <= 0:
+            return
+        key = (collection, scope)
+        entry = _Entry(key, self._unit(vector), [_detached(hit) for hit in hits])
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_scope.setdefault(key, {})[entry_id] = entry.vector
+            self._matrices.pop(key, None)
+            self._bytes += entry.nbytes
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "size": len(self._entries),
+                "memory_mb": round(self._bytes / 2**20, 2),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']:.0%} "
+            f"size={stats['size']} mem={stats['memory_mb']:.1f}MB"
+        )
+
+
+semantic_cache = SemanticResultCache(
+    max_distance=float(os.getenv('SEMANTIC_CACHE_MAX_DISTANCE', "0.05")),
+    max_entries=int(os.getenv('SEMANTIC_CACHE_SIZE', "512")),
+    max_bytes=int(float(os.getenv('SEMANTIC_CACHE_MAX_MB', "64")) * 2**20),
+    check_interval=float(os.getenv('SEMANTIC_CACHE_CHECK_SECONDS', "60")),
+    manager=milvus,
+    ttl=float(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', "600")),
+)
@@ -0,0 +1,502 @@
+"""
+Unified retrieval service shared by all ITSM backends.
+
+search() embeds the query and runs the Milvus vector search on a dedicated
+thread pool, so async agents keep serving other requests during the round
+trip. Results come back as Hit objects; turning them into markdown is left to
+retrieval.formatting and happens only where a response is rendered.
+
+Collections ingested with a BM25 index (see retrieval.hybrid) are searched in
+hybrid mode by default: the dense and the BM25 search run in parallel and are
+fused with reciprocal rank fusion. A leg that misses its latency budget is
+abandoned and the other leg's ranking is used on its own.
+
+Collections stored compressed (see retrieval.compression) are over-fetched
+and re-ranked by exact cosine against the exported full-precision vectors.
+
+When Milvus is unreachable, searches are answered from the embedded indexes
+the upload scripts export (see retrieval.fallback), dense-only.
+
+Whatever answered, hits below the similarity floor are dropped and, when the
+caller asks for diversity, the k results are picked from an over-fetched
+candidate list by maximal marginal relevance (see retrieval.diversity). An
+optional cross-encoder re-orders the candidates first (see retrieval.rerank).
+
+Searches that rank more candidates than they return fetch the requested
+fields only for the final hits, in a second primary-key query, and long text
+is cut to per-field budgets (see retrieval.projection).
+
+Partitioned collections are searched only in the partitions the filters'
+time window and domain can match, or in the ones the caller names (see
+retrieval.partitions).
+"""
+
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .compression import (
+    BINARY_FIELD,
+    QUANTIZED_INDEX_TYPES,
+    binary_search_params,
+    full_precision_scores,
+    full_precision_vectors,
+    hamming_to_cosine,
+    pack_binary,
+    rerank_overfetch,
+)
+from .diversity import diversifies, mmr, mmr_overfetch, score_floor
+from .fallback import fallback_mode, fallback_store
+from .filters import Filters, compile_filters
+from .hybrid import BM25_SEARCH_PARAMS, SPARSE_FIELD, leg_budgets, overfetch, retrieval_mode, rrf_fuse
+from .milvus import MilvusConnectionManager, MilvusUnavailable, milvus
+from .partitions import select_partitions
+from .projection import apply_budgets, two_phase
+from .rerank import RERANK_TEXT_FIELDS, rerank_candidates, rerank_enabled, reranker
+from .query_cache import normalize_query, query_embedding_cache
+from .semantic_cache import semantic_cache
+from .tuning import VECTOR_FIELD, at_least_limit, search_params
+
+
+
+def cosine(query: np.ndarray, vector) -> float:
+    if vector is None:
+        return 0.0
+    vector = np.asarray(vector, dtype=np.float32)
+    denom = float(np.linalg.norm(query) * np.linalg.norm(vector))
+    return float(np.dot(query, vector)) / denom if denom else 0.0
+
+
+class CollectionNotFound(LookupError):
+    """Raised when the requested Milvus collection does not exist."""
+
+
+@dataclass(slots=True)
+class Hit:
+    """One search result: primary key, similarity score and the raw entity fields.
+
+    score is always the cosine similarity to the query; fused_score is the RRF
+    score that ordered a hybrid result and rerank_score the cross-encoder's,
+    in [0, 1]. Field values are exactly what Milvus returned, so callers infer
+    from them directly and render markdown (see retrieval.formatting) only
+    when building a response.
+    """
+
+    collection: str
+    id: Any
+    score: float
+    fields: Dict[str, Any] = field(default_factory=dict)
+    fused_score: Optional[float] = None
+    rerank_score: Optional[float] = None
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.fields.get(name, default)
+
+
+class RetrievalService:
+    """Embeds queries and searches Milvus collections off the event loop."""
+
+    def __init__(self, manager: MilvusConnectionManager = milvus, max_workers: Optional[int] = None):
+        self.manager = manager
+        workers = max_workers or int(os.getenv('RETRIEVAL_WORKERS', "8"))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieval")
+        # Hybrid legs get their own pool so a saturated request pool cannot starve them
+        self._leg_executor = ThreadPoolExecutor(max_workers=workers * 2, thread_name_prefix="retrieval-leg")
+
+    def supports_hybrid(self, collection: str) -> bool:
+        """True when the collection was ingested with a BM25 sparse field."""
+        return any(f.name == SPARSE_FIELD for f in self.manager.schema(collection).fields)
+
+    def storage(self, collection: str) -> str:
+        """'binary', 'sq8' (any quantized float index) or 'float'."""
+        if any(f.name == BINARY_FIELD for f in self.manager.schema(collection).fields):
+            return "binary"
+        if self.manager.index_type(collection, VECTOR_FIELD) in QUANTIZED_INDEX_TYPES:
+            return "sq8"
+        return "float"
+
+    def search_sync(
+        self,
+        collection: str,
+        text: str,
+        k: int = 3,
+        filters: Filters = None,
+        fields: Optional[Sequence[str]] = None,
+        model_name: Optional[str] = None,
+        mode: Optional[str] = None,
+        query_vector: Optional[np.ndarray] = None,
+        diversity: Optional[float] = None,
+        min_score: Optional[float] = None,
+        budgets: Optional[Mapping[str, int]] = None,
+        rerank: Optional[bool] = None,
+        partitions: Optional[Sequence[str]] = None,
+    ) -> List[Hit]:
+        """Blocking search; prefer search() from async code.
+
+        filters is a structured filter mapping (see retrieval.filters) or a raw
+        Milvus expression; either way it prunes candidates server-side before
+        the vector search. fields defaults to every scalar field of the
+        collection. mode is 'hybrid' or 'dense' (default RETRIEVAL_MODE);
+        hybrid quietly falls back to dense on collections without a BM25
+        index. Near-duplicate queries are answered from the semantic cache.
+        query_vector skips embedding when the caller already has one for text.
+        While Milvus is unreachable the exported fallback index answers instead.
+
+        diversity is the MMR relevance weight (see retrieval.diversity.mmr_lambda);
+        None or 1.0 returns the plain top-k, as does k=1. min_score overrides the
+        RETRIEVAL_MIN_SCORE similarity floor, 0 keeps every hit. budgets caps
+        the characters kept per field (see retrieval.projection.field_budgets).
+        rerank turns the cross-encoder stage on or off (default RERANK).
+        partitions restricts a Milvus search to those partitions; by default
+        they are picked from the filters' time window and domain.
+        """
+        floor = score_floor() if min_score is None else min_score
+        rerank = rerank_enabled() if rerank is None else rerank
+        # MMR's first pick is the top hit: for k=1 it would only cost the over-fetch and the vectors
+        if k <= 1:
+            diversity = None
+        local = functools.partial(
+            self._fallback_search, collection, text, k, filters, fields, model_name, query_vector, diversity, floor,
+            budgets, rerank,
+        )
+        if fallback_mode() == "always":
+            return local()
+        try:
+            return self._milvus_search(
+                collection, text, k, filters, fields, model_name, mode, query_vector, diversity, floor, budgets,
+                rerank, partitions,
+            )
+        except MilvusUnavailable as e:
+            if fallback_mode() == "off" or not fallback_store.available(collection):
+                raise
+            print(f"[Fallback] {e}; searching the local '{collection}' index")
+            return local()
+
+    def _fallback_search(
+        self, collection, text, k, filters, fields, model_name, query_vector, diversity, floor, budgets, rerank
+    ) -> List[Hit]:
+        if not fallback_store.available(collection):
+            raise CollectionNotFound(collection)
+        if query_vector is None:
+            query_vector = query_embedding_cache.encode(text, model_name)
+        fetch = k * mmr_overfetch() if diversifies(diversity) else k
+        search_fields = fields
+        if rerank:
+            fetch = max(fetch, rerank_candidates())
+            if fields is not None:
+                search_fields = list(fields) + [name for name in RERANK_TEXT_FIELDS if name not in fields]
+        hits = [
+            Hit(collection=collection, id=hit_id, score=score, fields=values)
+            for hit_id, score, values in fallback_store.search(collection, query_vector, fetch, filters, search_fields)
+        ]
+        hits = self._select(collection, text, hits, k, diversity, floor, rerank)
+        for hit in hits:
+            if fields is not None:
+                hit.fields = {name: hit.fields.get(name) for name in fields}
+            hit.fields = apply_budgets(hit.fields, budgets)
+        return hits
+
+    def _milvus_search(
+        self, collection, text, k, filters, fields, model_name, mode, query_vector, diversity, floor, budgets, rerank,
+        partitions,
+    ) -> List[Hit]:
+        # Re-uploaded collections drop their cached results and stale handles first
+        semantic_cache.refresh(collection)
+        if not self.manager.has_collection(collection):
+            raise CollectionNotFound(collection)
+
+        mode = mode or retrieval_mode()
+        if mode not in ("hybrid", "dense"):
+            raise ValueError(f"Unknown retrieval mode '{mode}', expected 'hybrid' or 'dense'")
+
+        schema_fields = [f.name for f in self.manager.schema(collection).fields]
+        expr = compile_filters(filters, schema_fields)
+        # Fields a collection lacks (uploaded before its schema gained them) come back missing
+        output_fields = (
+            [name for name in fields if name in schema_fields] if fields is not None
+            else self.manager.output_fields(collection)
+        )
+        if mode == "hybrid" and not self.supports_hybrid(collection):
+            mode = "dense"
+        partition_names = self._partition_names(collection, filters, partitions)
+        if partition_names == []:
+            return []
+
+        storage = self.storage(collection)
+        if storage == "binary" and VECTOR_FIELD in output_fields:
+            # Only the packed bits are in Milvus; diversify() reads the exported vectors instead
+            output_fields.remove(VECTOR_FIELD)
+        diversify = diversifies(diversity)
+        fetch = k * mmr_overfetch() if diversify else k
+        # MMR needs the candidates' embeddings; binary collections have none in Milvus
+        ranking_fields = [VECTOR_FIELD] if diversify and storage != "binary" else []
+        # ... and the cross-encoder their text
+        if rerank:
+            fetch = max(fetch, rerank_candidates())
+            ranking_fields += [name for name in RERANK_TEXT_FIELDS if name in schema_fields]
+        # Candidates that are ranked and dropped don't need their text: fetch it for the final hits only
+        if mode == "hybrid":
+            candidates = fetch * overfetch()
+        else:
+            candidates = fetch if storage == "float" else fetch * rerank_overfetch()
+        lazy = two_phase(candidates, k)
+        if lazy:
+            search_fields = ranking_fields
+        else:
+            search_fields = output_fields + [name for name in ranking_fields if name not in output_fields]
+
+        if query_vector is None:
+            query_vector = query_embedding_cache.encode(text, model_name)
+        scope = (
+            k, expr, tuple(output_fields), mode, model_name, diversity if diversify else None, floor,
+            tuple(sorted(budgets.items())) if budgets else None, rerank,
+            tuple(partition_names) if partition_names is not None else None,
+            # BM25 ranks on exact tokens: another hostname is another search
+            normalize_query(text, mask_tickets=False) if mode == "hybrid" else None,
+        )
+        cached = semantic_cache.lookup(collection, scope, query_vector)
+        if cached is not None:
+            return cached
+
+        if mode == "hybrid":
+            hits, complete = self._hybrid_search(
+                collection, text, query_vector, fetch, expr, search_fields, floor, partition_names
+            )
+        else:
+            hits = self._dense_search(collection, query_vector, fetch, expr, search_fields, floor, partition_names)
+            complete = True
+        hits = self._select(collection, text, hits, k, diversity, floor, rerank)
+        self._project(collection, hits, output_fields, budgets, lazy)
+        # A degraded hybrid ranking is served once but never cached
+        if complete:
+            semantic_cache.store(collection, scope, query_vector, hits)
+        return hits
+
+    def _partition_names(self, collection, filters, partitions) -> Optional[List[str]]:
+        """Partitions to search, or None for the whole collection."""
+        if partitions is not None:
+            unknown = [name for name in partitions if name not in self.manager.partitions(collection)]
+            if unknown:
+                raise ValueError(f"Unknown partitions for '{collection}': {', '.join(unknown)}")
+            selected = list(partitions)
+        else:
+            selected = select_partitions(collection, self.manager.partitions(collection), filters)
+        if selected is None:
+            # Without a window only the loaded partitions are searched; released ones stay cold
+            loaded = self.manager.loaded_partitions(collection)
+            everything = self.manager.partitions(collection)
+            return None if loaded.issuperset(everything) else [name for name in everything if name in loaded]
+        self.manager.load_partitions(collection, selected)
+        return selected
+
+    @staticmethod
+    def _select(
+        collection: str, text: str, hits: List[Hit], k: int, diversity: Optional[float], floor: float, rerank: bool
+    ) -> List[Hit]:
+        """Drop hits under the similarity floor, re-rank, then keep k of them (by MMR when diversifying)."""
+        if floor > 0:
+            hits = [hit for hit in hits if hit.score >= floor]
+        if rerank and len(hits) > 1:
+            hits = reranker.rerank(text, hits)
+        if not diversifies(diversity) or len(hits) <= k:
+            return hits[:k]
+        return RetrievalService.diversify(collection, hits, k, diversity)
+
+    @staticmethod
+    def diversify(collection: str, hits: List[Hit], k: int, diversity: float) -> List[Hit]:
+        """k of hits picked by MMR, without another search.
+
+        Embeddings come from hit.fields[VECTOR_FIELD] (request that field to get
+        them) or the exported full-precision vectors; the plain top-k is
+        returned when some hit has neither.
+        """
+        if len(hits) <= k:
+            return hits[:k]
+        vectors = {hit.id: hit.fields.get(VECTOR_FIELD) for hit in hits}
+        missing = [hit_id for hit_id, vector in vectors.items() if vector is None]
+        if missing:
+            vectors.update(full_precision_vectors(collection, missing))
+        if any(vectors[hit.id] is None for hit in hits):
+            print(f"[Retrieval] No embeddings for some '{collection}' hits, returning the plain top-{k}")
+            return hits[:k]
+        # A completed re-rank replaces the bi-encoder relevance; its sigmoid keeps both in [0, 1]
+        relevance = [hit.score if hit.rerank_score is None else hit.rerank_score for hit in hits]
+        order = mmr(relevance, [vectors[hit.id] for hit in hits], k, diversity)
+        return [hits[i] for i in order]
+
+    def _project(self, collection, hits, output_fields, budgets, lazy) -> None:
+        """Give every hit exactly output_fields, fetching them by primary key when the search was lazy."""
+        rows = {}
+        if lazy and hits and output_fields:
+            primary = self.manager.primary_field(collection)
+            expr = compile_filters({primary: [hit.id for hit in hits]})
+            rows = {row[primary]: row for row in self.manager.query(collection, expr, output_fields)}
+        for hit in hits:
+            source = rows.get(hit.id, {}) if lazy else hit.fields
+            hit.fields = apply_budgets({name: source.get(name) for name in output_fields}, budgets)
+
+    def _dense_search(
+        self, collection, query_vector, k, expr, output_fields, floor: float = 0.0, partition_names=None
+    ) -> List[Hit]:
+        storage = self.storage(collection)
+        limit = k if storage == "float" else k * rerank_overfetch()
+        if storage == "binary":
+            data, anns_field, params = pack_binary(query_vector), BINARY_FIELD, binary_search_params()
+        else:
+            data, anns_field = [query_vector.tolist()], VECTOR_FIELD
+            # Milvus rejects HNSW searches whose ef is below the limit
+            params = at_least_limit(search_params(collection), limit)
+            # Range search: Milvus drops the weak hits itself. Quantized scores are only
+            # approximate, so those are cut after the exact re-rank instead.
+            if storage == "float" and floor > 0:
+                params.setdefault("params", {})["radius"] = floor
+
+        results = self.manager.search(
+            collection,
+            data,
+            anns_field,
+            params,
+            limit=limit,
+            expr=expr,
+            output_fields=output_fields,
+            partition_names=partition_names,
+        )
+        hits = self._to_hits(collection, results[0], output_fields)
+        if storage == "float":
+            return hits
+
+        if storage == "binary":
+            for hit in hits:
+                hit.score = hamming_to_cosine(hit.score, len(query_vector))
+        exact = full_precision_scores(collection, query_vector, [hit.id for hit in hits])
+        for hit in hits:
+            hit.score = exact.get(hit.id, hit.score)
+        hits.sort(key=lambda hit: hit.score, reverse=True)
+        return hits[:k]
+
+    def _sparse_search(self, collection, text, k, expr, output_fields, partition_names=None) -> List[Hit]:
+        # Raw text on purpose: BM25 should see the exact ticket numbers and hostnames
+        results = self.manager.search(
+            collection,
+            [text],
+            SPARSE_FIELD,
+            BM25_SEARCH_PARAMS,
+            limit=k,
+            expr=expr,
+            output_fields=output_fields,
+            partition_names=partition_names,
+        )
+        return self._to_hits(collection, results[0], output_fields)
+
+    @staticmethod
+    def _to_hits(collection: str, results, output_fields: Sequence[str]) -> List[Hit]:
+        hits = []
+        for result in results:
+            entity = result.entity
+            hits.append(Hit(
+                collection=collection,
+                id=result.id,
+                score=float(result.score),
+                fields={name: entity.get(name) for name in output_fields},
+            ))
+        return hits
+
+    @staticmethod
+    def _leg_result(name: str, future: Future, deadline: float) -> Optional[List[Hit]]:
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            future.cancel()
+            print(f"[Hybrid] {name} search exceeded its budget, using the other ranking")
+        except Exception as e:
+            print(f"[Hybrid] {name} search failed: {e}")
+        return None
+
+    def _hybrid_search(
+        self, collection, text, query_vector, k, expr, output_fields, floor: float = 0.0, partition_names=None
+    ) -> Tuple[List[Hit], bool]:
+        """Fused hits, and whether both legs answered within budget."""
+        candidates = k * overfetch()
+        dense_budget, sparse_budget = leg_budgets()
+        started = time.monotonic()
+
+        dense_future = self._leg_executor.submit(
+            self._dense_search, collection, query_vector, candidates, expr, output_fields, floor, partition_names
+        )
+        # The dense vector comes back with BM25-only hits so they can be scored by cosine too;
+        # binary collections have none in Milvus and are scored from the exported vectors
+        binary = self.storage(collection) == "binary"
+        with_vector = binary or VECTOR_FIELD in output_fields
+        sparse_fields = output_fields if with_vector else output_fields + [VECTOR_FIELD]
+        sparse_future = self._leg_executor.submit(
+            self._sparse_search, collection, text, candidates, expr, sparse_fields, partition_names
+        )
+        dense_hits = self._leg_result("Dense", dense_future, started + dense_budget)
+        sparse_hits = self._leg_result("BM25", sparse_future, started + sparse_budget)
+
+        if dense_hits is None and sparse_hits is None:
+            return self._dense_search(collection, query_vector, k, expr, output_fields, floor, partition_names), False
+
+        complete = dense_hits is not None and sparse_hits is not None
+        dense_hits = dense_hits or []
+        sparse_hits = sparse_hits or []
+        dense_by_id = {hit.id: hit for hit in dense_hits}
+        sparse_by_id = {hit.id: hit for hit in sparse_hits}
+        sparse_vectors = {hit.id: hit.fields.get(VECTOR_FIELD) for hit in sparse_hits}
+        if VECTOR_FIELD not in output_fields:
+            for hit in sparse_hits:
+                hit.fields.pop(VECTOR_FIELD, None)
+        if binary:
+            sparse_only = [hit_id for hit_id in sparse_by_id if hit_id not in dense_by_id]
+            exact = full_precision_scores(collection, query_vector, sparse_only)
+
+        hits = []
+        for hit_id, fused_score in rrf_fuse([list(dense_by_id), list(sparse_by_id)])[:k]:
+            hit = dense_by_id.get(hit_id)
+            if hit is None:
+                hit = sparse_by_id[hit_id]
+                hit.score = exact.get(hit_id, 0.0) if binary else cosine(query_vector, sparse_vectors.get(hit_id))
+            hit.fused_score = fused_score
+            hits.append(hit)
+
+        print(
+            f"[Hybrid] {collection}: dense={len(dense_hits)} bm25={len(sparse_hits)} "
+            f"-> {len(hits)} in {(time.monotonic() - started) * 1000:.0f}ms"
+        )
+        return hits, complete
+
+    async def search(
+        self,
+        collection: str,
+        text: str,
+        k: int = 3,
+        filters: Filters = None,
+        fields: Optional[Sequence[str]] = None,
+        model_name: Optional[str] = None,
+        mode: Optional[str] = None,
+        diversity: Optional[float] = None,
+        min_score: Optional[float] = None,
+        budgets: Optional[Mapping[str, int]] = None,
+        rerank: Optional[bool] = None,
+        partitions: Optional[Sequence[str]] = None,
+    ) -> List[Hit]:
+        """Search a collection without blocking the running event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(
+                self.search_sync, collection, text, k, filters, fields, model_name, mode,
+                diversity=diversity, min_score=min_score, budgets=budgets, rerank=rerank,
+                partitions=partitions,
+            ),
+        )
+
+
+retrieval_service = RetrievalService()
@@ -0,0 +1,318 @@
+"""
+Dense index parameters per collection, and the tool that chooses them.
+
+Upload scripts build the embedding index with index_params(collection) and
+RetrievalService searches with search_params(collection). Both read
+RETRIEVAL_INDEX_CONFIG (a JSON file written by the tuner) and fall back to
+the historical IVF_FLAT nlist=128 / nprobe=10 when a collection has no
+entry.
+
+The tuner rebuilds the embedding index of a live collection with every
+candidate (FLAT, IVF_FLAT and IVF_SQ8 at several nlist, HNSW at several
+M / efConstruction), sweeps the search parameter of each, and compares the
+results for sampled stored vectors with brute-force ground truth computed in
+NumPy (each sample's own row left out of both). Recall is measured at the
+candidate limit RetrievalService actually sends for k (MMR, re-rank and
+hybrid over-fetch included), not at k itself, and HNSW ef is never swept
+below that limit. The fastest candidate by p99 whose recall reaches
+--target-recall is rebuilt and written to the config:
+
+    python -m retrieval.tuning incident_history --k 10 --queries 200 --target-recall 0.95
+
+The collection serves searches from a half-built index while it runs, so
+run it in a maintenance window.
+"""
+
+import argparse
+import copy
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_INDEX_PARAMS = {"index_type": "IVF_FLAT", "metric_type": "COSINE", "params": {"nlist": 128}}
+DEFAULT_SEARCH_PARAMS = {"metric_type": "COSINE", "params": {"nprobe": 10}}
+VECTOR_FIELD = "embedding"
+
+
+def index_config_path() -> str:
+    return os.getenv(
+        'RETRIEVAL_INDEX_CONFIG', os.path.join(os.path.expanduser("~"), ".cache", "itsm-agent", "index_config.json")
+    )
+
+
+_config_lock = threading.Lock()
+_config_cache: Tuple[Optional[str], int, Dict[str, Any]] = (None, 0, {})
+
+
+def index_config_version() -> Tuple[str, int]:
+    """(path, mtime) of the config file; changes whenever the tuner writes it."""
+    path = index_config_path()
+    try:
+        return path, os.stat(path).st_mtime_ns
+    except OSError:
+        return path, 0
+
+
+def load_index_config() -> Dict[str, Any]:
+    """Parsed config file, re-read when it changes; {} when there is none."""
+    global _config_cache
+    path = index_config_path()
+    try:
+        version = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    with _config_lock:
+        cached_path, cached_version, config = _config_cache
+        if cached_path != path or cached_version != version:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    config = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[Index Config] Ignoring unreadable {path}: {e}")
+                config = {}
+            _config_cache = (path, version, config)
+        return config
+
+
+def index_params(collection: str) -> Dict[str, Any]:
+    """Embedding index to build at ingest."""
+    entry = load_index_config().get("collections", {}).get(collection, {})
+    return copy.deepcopy(entry.get("index_params", DEFAULT_INDEX_PARAMS))
+
+
+def search_params(collection: str) -> Dict[str, Any]:
+    """Dense search parameters matching the collection's index."""
+    entry = load_index_config().get("collections", {}).get(collection, {})
+    return copy.deepcopy(entry.get("search_params", DEFAULT_SEARCH_PARAMS))
+
+
+def save_index_config(collection: str, entry: Dict[str, Any]) -> str:
+    config = dict(load_index_config())
+    config.setdefault("collections", {})[collection] = entry
+    path = index_config_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = f"{path}.tmp-{os.getpid()}"
+    with open(staging, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    os.replace(staging, path)
+    return path
+
+
+# ============================================================================
+# Candidates
+# ============================================================================
+
+def candidate_indexes(count: int) -> Iterator[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """(index params, search params to sweep) pairs sized for a collection of count vectors."""
+    yield {"index_type": "FLAT", "metric_type": "COSINE", "params": {}}, [{"metric_type": "COSINE", "params": {}}]
+
+    # IVF wants at least ~39 vectors per list to train; sqrt(N)-scaled nlist otherwise
+    base = max(1, int(4 * math.sqrt(count)))
+    nlists = sorted({max(1, min(n, count // 39 or 1, 65536)) for n in (base // 2, base, base * 2)})
+    for index_type in ("IVF_FLAT", "IVF_SQ8"):
+        for nlist in nlists:
+            nprobes = sorted({max(1, min(nlist, p)) for p in (1, 4, 8, 16, 32, 64)})
+            yield (
+                {"index_type": index_type, "metric_type": "COSINE", "params": {"nlist": nlist}},
+                [{"metric_type": "COSINE", "params": {"nprobe": p}} for p in nprobes],
+            )
+
+    for m in (8, 16, 32):
+        for ef_construction in (100, 200):
+            yield (
+                {"index_type": "HNSW", "metric_type": "COSINE", "params": {"M": m, "efConstruction": ef_construction}},
+                [{"metric_type": "COSINE", "params": {"ef": ef}} for ef in (16, 32, 64, 128, 256)],
+            )
+
+
+def candidate_limit(k: int) -> int:
+    """Largest dense search limit RetrievalService sends for a final k."""
+    from .diversity import mmr_overfetch
+    from .hybrid import overfetch
+    from .rerank import rerank_candidates, rerank_enabled
+
+    fetch = k * mmr_overfetch()
+    if rerank_enabled():
+        fetch = max(fetch, rerank_candidates())
+    return fetch * overfetch()
+
+
+def at_least_limit(search: Dict[str, Any], limit: int) -> Dict[str, Any]:
+    """search with HNSW ef raised to limit; Milvus rejects searches with ef < limit."""
+    if "ef" not in search.get("params", {}) or search["params"]["ef"] >= limit:
+        return search
+    return {**search, "params": {**search["params"], "ef": limit}}
+
+
+def describe(index: Dict[str, Any], search: Dict[str, Any]) -> str:
+    params = ", ".join(f"{k}={v}" for k, v in {**index["params"], **search["params"]}.items())
+    return f"{index['index_type']}({params})"
+
+
+# ============================================================================
+# Measurement
+# ============================================================================
+
+def fetch_vectors(collection, batch_size: int = 1000) -> Tuple[List[Any], np.ndarray]:
+    """Every primary key and embedding in the collection, unit-normalised."""
+    primary = collection.schema.primary_field.name
+    ids, vectors = [], []
+    iterator = collection.query_iterator(batch_size=batch_size, output_fields=[VECTOR_FIELD])
+    while True:
+        batch = iterator.next()
+        if not batch:
+            iterator.close()
+            break
+        ids.extend(row[primary] for row in batch)
+        vectors.extend(row[VECTOR_FIELD] for row in batch)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return ids, vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def ground_truth(
+    vectors: np.ndarray, queries: np.ndarray, k: int, exclude: Optional[Sequence[int]] = None, chunk: int = 256
+) -> np.ndarray:
+    """Row numbers of the exact top-k by cosine for every query, skipping exclude[i] for query i."""
+    truth = np.empty((len(queries), k), dtype=np.int64)
+    for begin in range(0, len(queries), chunk):
+        sims = queries[begin:begin + chunk] @ vectors.T
+        if exclude is not None:
+            sims[np.arange(len(sims)), np.asarray(exclude[begin:begin + chunk])] = -np.inf
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        truth[begin:begin + chunk] = top
+    return truth
+
+
+def measure(
+    collection, queries: np.ndarray, query_ids: Sequence[Any], truth_ids: List[set], k: int, search: Dict[str, Any]
+) -> Dict[str, float]:
+    """Recall@k and latency; each query's own row (always its top hit) is not counted."""
+    search = at_least_limit(search, k + 1)
+    latencies, recalls = [], []
+    for query, own, expected in zip(queries, query_ids, truth_ids):
+        started = time.perf_counter()
+        results = collection.search([query.tolist()], VECTOR_FIELD, search, limit=k + 1)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found = [hit.id for hit in results[0] if hit.id != own][:k]
+        recalls.append(len(set(found) & expected) / len(expected))
+    return {
+        "recall": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+    }
+
+
+def rebuild_index(collection, index: Dict[str, Any]) -> float:
+    started = time.perf_counter()
+    collection.release()
+    for existing in collection.indexes:
+        if existing.field_name == VECTOR_FIELD:
+            collection.drop_index(index_name=existing.index_name)
+    collection.create_index(field_name=VECTOR_FIELD, index_params=index)
+    collection.load()
+    return time.perf_counter() - started
+
+
+def tune(
+    name: str,
+    k: int = 10,
+    queries: int = 200,
+    target_recall: float = 0.95,
+    candidates: Optional[Sequence[Tuple[Dict[str, Any], List[Dict[str, Any]]]]] = None,
+    seed: int = 0,
+    apply: bool = True,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Benchmark every candidate on a live collection; return the config entry for the winner.
+
+    Recall is measured over the top limit results (candidate_limit(k) by
+    default). With apply=False the collection gets its original index back
+    afterwards.
+    """
+    from .milvus import milvus
+
+    collection = milvus.collection(name)
+    original = next((dict(i.params) for i in collection.indexes if i.field_name == VECTOR_FIELD), None)
+    ids, vectors = fetch_vectors(collection)
+    count = len(ids)
+    limit = max(1, min(limit or candidate_limit(k), count - 1))
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(count, size=min(queries, count), replace=False)
+    sample_ids = [ids[row] for row in sample]
+    truth = ground_truth(vectors, vectors[sample], limit, exclude=sample)
+    truth_ids = [{ids[row] for row in rows} for rows in truth]
+    print(
+        f"[Tuning] {name}: {count} vectors, {len(sample)} queries, "
+        f"recall@{limit} (search limit for k={k}) target {target_recall:.0%}"
+    )
+
+    results = []
+    for index, sweeps in candidates or list(candidate_indexes(count)):
+        build_s = rebuild_index(collection, index)
+        # ef below the limit is rejected by Milvus; the service raises it the same way
+        sweeps = list({json.dumps(s, sort_keys=True): s for s in (at_least_limit(s, limit) for s in sweeps)}.values())
+        for search in sweeps:
+            stats = measure(collection, vectors[sample], sample_ids, truth_ids, limit, search)
+            results.append({"index_params": index, "search_params": search, "build_s": round(build_s, 2), **stats})
+            print(
+                f"[Tuning] {describe(index, search):<45} recall={stats['recall']:.3f} "
+                f"p50={stats['p50_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms build={build_s:.1f}s"
+            )
+            # Larger search params only get slower once recall is perfect
+            if stats["recall"] >= 1.0:
+                break
+
+    passing = [r for r in results if r["recall"] >= target_recall]
+    if passing:
+        best = min(passing, key=lambda r: (r["p99_ms"], -r["recall"]))
+    else:
+        best = max(results, key=lambda r: (r["recall"], -r["p99_ms"]))
+        print(f"[Tuning] No candidate reached {target_recall:.0%} recall; keeping the most accurate one")
+
+    rebuild_index(collection, best["index_params"] if apply or original is None else original)
+    print(
+        f"[Tuning] Chose {describe(best['index_params'], best['search_params'])} for '{name}'"
+        + ("" if apply else ", original index restored")
+    )
+    return {
+        "index_params": best["index_params"],
+        "search_params": best["search_params"],
+        "measured": {
+            "count": count,
+            "k": k,
+            "limit": limit,
+            "queries": len(sample),
+            "recall": best["recall"],
+            "p50_ms": best["p50_ms"],
+            "p99_ms": best["p99_ms"],
+            "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "candidates": results,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Choose the dense index and search params for Milvus collections.")
+    parser.add_argument("collections", nargs="+")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--limit", type=int, help="search limit to measure recall at (default: what k turns into)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--dry-run", action="store_true", help="restore the original index and do not write the config")
+    args = parser.parse_args(argv)
+
+    for name in args.collections:
+        entry = tune(name, args.k, args.queries, args.target_recall, apply=not args.dry_run, limit=args.limit)
+        if args.dry_run:
+            print(json.dumps({k: v for k, v in entry.items() if k != "candidates"}, indent=2))
+        else:
+            print(f"[Tuning] Wrote {save_index_config(name, entry)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,15 +9,25 @@ Simplified ITSM ServiceNow Agent with Wipro AI
 - Proper tool calling implementation
 """
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, ToolMessage
 from langgraph.graph import MessagesState
 from langgraph.prebuilt import create_react_agent
 import os
 from dotenv import load_dotenv
 from langchain_core.tools import tool
-from pymilvus import connections, utility, Collection
-from sentence_transformers import SentenceTransformer
+from retrieval.compression import stats as compression_stats
+from retrieval.diversity import mmr_lambda, top_k
+from retrieval.embeddings import warmup
+from retrieval.fanout import fanout_search
+from retrieval.filters import change_filters, incident_filters
+from retrieval.formatting import CHANGE_LONG_TEXT_FIELDS, INCIDENT_LONG_TEXT_FIELDS, format_fanout, format_ticket_details
+from retrieval.milvus import milvus
+from retrieval.projection import field_budgets
+from retrieval.query_cache import query_embedding_cache
+from retrieval.rerank import reranker
+from retrieval.semantic_cache import semantic_cache
+from retrieval.service import CollectionNotFound, retrieval_service
 from langchain_mcp_adapters.client import MultiServerMCPClient
 import asyncio
 from flask import Flask, request, jsonify
@@ -54,153 +64,91 @@ current_attachment = None
 # ============================================================================
 
 @tool
-def search_similar_incidents(description: str) -> str:
+async def search_similar_incidents(
+    description: str,
+    category: Optional[str] = None,
+    state: Optional[str] = None,
+    exclude_closed: bool = False,
+    opened_after: Optional[str] = None,
+    opened_before: Optional[str] = None,
+) -> str:
     """Search for similar historical incidents in Milvus based on description.
-    Returns ALL available fields from the incident record."""
-    MILVUS_HOST = os.getenv('MILVUS_HOST', "172.17.204.5")
-    MILVUS_PORT = os.getenv('MILVUS_PORT', "19530")
-    COLLECTION_NAME = "incident_history"
-
+    Returns ALL available fields from the incident record.
+    Optional filters narrow the candidates before ranking: category, state,
+    exclude_closed (skip Closed/Resolved/Canceled) and opened_after /
+    opened_before dates (YYYY-MM-DD)."""
+    filters = incident_filters(category, state, exclude_closed, opened_after, opened_before)
     try:
-        connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
-        if not utility.has_collection(COLLECTION_NAME):
-            return "No incident history available."
-
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-
-        model = SentenceTransformer(os.getenv('EMBEDDING_MODEL', "all-MiniLM-L6-v2"))
-        query_embedding = model.encode([description]).tolist()
-
-        # Get ALL available fields from collection schema (except embedding and id)
-        schema = collection.schema
-        output_fields = [field.name for field in schema.fields if field.name not in ["embedding", "id"]]
-
-        print(f"[Milvus] Fetching ALL {len(output_fields)} fields for incidents")
-
-        results = collection.search(
-            query_embedding,
-            "embedding",
-            {"metric_type": "COSINE", "params": {"nprobe": 10}},
-            limit=3,
-            output_fields=output_fields
+        hits = await retrieval_service.search(
+            "incident_history", description, k=top_k(3), filters=filters, diversity=mmr_lambda(),
+            budgets=field_budgets(),
         )
-
-        if not results[0]:
-            return "No similar incidents found."
-
-        matches = []
-        for idx, hit in enumerate(results[0], 1):
-            entity = hit.entity
-            incident_number = entity.get('number', f'Incident #{idx}')
-
-            match_parts = [
-                f"{'='*70}",
-                f"SIMILAR INCIDENT #{idx}: {incident_number}",
-                f"Similarity Score: {hit.score:.2%}",
-                f"{'='*70}",
-                ""
-            ]
-
-            for field in output_fields:
-                if field == 'number':
-                    continue
-                
-                value = entity.get(field, 'NA')
-                field_name = field.replace('_', ' ').title()
-
-                long_text_fields = ['description', 'short_description', 'correlation_display', 
-                                   'work_notes', 'comments', 'close_notes', 'resolution_notes']
-                
-                if field in long_text_fields and value and value != 'NA' and len(str(value)) > 50:
-                    match_parts.append(f"\n**{field_name}**:")
-                    match_parts.append(f"{value}")
-                else:
-                    match_parts.append(f"**{field_name}**: {value}")
-
-            matches.append("\n".join(match_parts))
-
-        connections.disconnect("default")
-        return "\n\n".join(matches)
-
+    except CollectionNotFound:
+        return "No incident history available."
     except Exception as e:
         print(f"[Milvus Error] {e}")
         return f"Error searching incidents: {str(e)}"
 
+    print(f"[Embedding Cache] {query_embedding_cache.summary()}")
+    if not hits:
+        return "No similar incidents found."
+
+    print(f"[Milvus] Fetched ALL {len(hits[0].fields)} fields for incidents")
+    return format_ticket_details(hits, "SIMILAR INCIDENT", "Incident", INCIDENT_LONG_TEXT_FIELDS)
+
 
 @tool
-def search_similar_change_requests(description: str) -> str:
+async def search_similar_change_requests(
+    description: str,
+    configuration_item: Optional[str] = None,
+    change_type: Optional[str] = None,
+    state: Optional[str] = None,
+    exclude_closed: bool = False,
+    planned_after: Optional[str] = None,
+    planned_before: Optional[str] = None,
+) -> str:
     """Search for similar historical change requests in Milvus.
-    Returns ALL available fields from the change request record."""
-    MILVUS_HOST = os.getenv('MILVUS_HOST', "172.17.204.5")
-    MILVUS_PORT = os.getenv('MILVUS_PORT', "19530")
-    COLLECTION_NAME = "change_request_history"
-
+    Returns ALL available fields from the change request record.
+    Optional filters narrow the candidates before ranking: configuration_item,
+    change_type (Normal/Standard/Emergency), state, exclude_closed (skip
+    Closed/Canceled) and planned_after / planned_before dates (YYYY-MM-DD)."""
+    filters = change_filters(configuration_item, change_type, state, None, exclude_closed, planned_after, planned_before)
     try:
-        connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
-        if not utility.has_collection(COLLECTION_NAME):
-            return "No change request history available."
-
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-
-        model = SentenceTransformer(os.getenv('EMBEDDING_MODEL', "all-MiniLM-L6-v2"))
-        query_embedding = model.encode([description]).tolist()
-
-        schema = collection.schema
-        output_fields = [field.name for field in schema.fields if field.name not in ["embedding", "id"]]
-
-        print(f"[Milvus] Fetching ALL {len(output_fields)} fields for change requests")
-
-        results = collection.search(
-            query_embedding,
-            "embedding",
-            {"metric_type": "COSINE", "params": {"nprobe": 10}},
-            limit=3,
-            output_fields=output_fields
+        hits = await retrieval_service.search(
+            "change_request_history", description, k=top_k(3), filters=filters, diversity=mmr_lambda(),
+            budgets=field_budgets(),
         )
+    except CollectionNotFound:
+        return "No change request history available."
+    except Exception as e:
+        print(f"[Milvus Error] {e}")
+        return f"Error searching change requests: {str(e)}"
 
-        if not results[0]:
-            return "No similar change requests found."
-
-        matches = []
-        for idx, hit in enumerate(results[0], 1):
-            entity = hit.entity
-            change_number = entity.get('number', f'Change Request #{idx}')
-
-            match_parts = [
-                f"{'='*70}",
-                f"SIMILAR CHANGE REQUEST #{idx}: {change_number}",
-                f"Similarity Score: {hit.score:.2%}",
-                f"{'='*70}",
-                ""
-            ]
-
-            for field in output_fields:
-                if field == 'number':
-                    continue
-                
-                value = entity.get(field, 'NA')
-                field_name = field.replace('_', ' ').title()
-
-                long_text_fields = ['description', 'short_description', 'justification', 
-                                   'implementation_plan', 'backout_plan', 'test_plan', 
-                                   'risk_impact_analysis', 'change_plan']
-                
-                if field in long_text_fields and value and value != 'NA' and len(str(value)) > 50:
-                    match_parts.append(f"\n**{field_name}**:")
-                    match_parts.append(f"{value}")
-                else:
-                    match_parts.append(f"**{field_name}**: {value}")
+    print(f"[Embedding Cache] {query_embedding_cache.summary()}")
+    if not hits:
+        return "No similar change requests found."
 
-            matches.append("\n".join(match_parts))
+    print(f"[Milvus] Fetched ALL {len(hits[0].fields)} fields for change requests")
+    return format_ticket_details(hits, "SIMILAR CHANGE REQUEST", "Change Request", CHANGE_LONG_TEXT_FIELDS)
 
-        connections.disconnect("default")
-        return "\n\n".join(matches)
 
+@tool
+async def search_knowledge_base(description: str, exclude_closed: bool = False) -> str:
+    """Search similar incidents, change requests and root cause analyses in one call.
+    Use this instead of separate searches when a resolution or proposal needs
+    every source. exclude_closed skips closed incidents and change requests."""
+    filters = {
+        "incident_history": incident_filters(exclude_closed=exclude_closed),
+        "change_request_history": change_filters(exclude_closed=exclude_closed),
+    }
+    try:
+        result = await fanout_search(description, k=top_k(3), filters=filters, diversity=mmr_lambda())
     except Exception as e:
         print(f"[Milvus Error] {e}")
-        return f"Error searching change requests: {str(e)}"
+        return f"Error searching the knowledge base: {str(e)}"
+
+    print(f"[Embedding Cache] {query_embedding_cache.summary()}")
+    return format_fanout(result)
 
 
 # ============================================================================
@@ -267,8 +215,9 @@ async def main_agent(state: MessagesState, session_id: str = "default") -> Dict:
 - User asks: "resolution steps for INC123"
 - Step 1: Call get_record to fetch the incident
 - Step 2: Extract the description/problem from the incident
-- Step 3: Call searchConfluenceUsingCql with the description to find KB articles
-- Step 4: Present the resolution steps from the KB articles
+- Step 3: Call search_knowledge_base with the description to get similar incidents, change requests and root cause analyses in one call
+- Step 4: Call searchConfluenceUsingCql with the description to find KB articles
+- Step 5: Present the resolution steps from the root cause analyses and KB articles
 
 **Creating Incidents (FOLLOW THIS FORMAT EXACTLY):**
 When a user wants to create an incident:
@@ -433,7 +382,7 @@ Please review the proposed details and respond with:
             }
         }) as client:
             snow_tools = client.get_tools()
-            all_tools = snow_tools + [search_similar_incidents, search_similar_change_requests]
+            all_tools = snow_tools + [search_similar_incidents, search_similar_change_requests, search_knowledge_base]
 
             print(f"\n[Agent] Loaded {len(all_tools)} tools")
             print(f"[Agent] User message: {state['messages'][-1].content}")
@@ -501,7 +450,11 @@ def health():
         'status': 'healthy',
         'service': 'ITSM ServiceNow Agent with Wipro AI - FIXED VERSION',
         'timestamp': datetime.now().isoformat(),
-        'active_sessions': len(conversation_memory)
+        'active_sessions': len(conversation_memory),
+        'embedding_cache': query_embedding_cache.stats(),
+        'semantic_cache': semantic_cache.stats(),
+        'rerank': reranker.stats(),
+        'full_precision_rerank': compression_stats()
     })
 
 
@@ -650,4 +603,9 @@ if __name__ == '__main__':
     print("  - GET /sessions - List active sessions")
     print("=" * 60)
 
+    # Load the embedding model and Milvus collections once before the first chat request needs them
+    warmup()
+    reranker.warmup()
+    milvus.preload()
+
     app.run(debug=True, host='0.0.0.0', port=5019)
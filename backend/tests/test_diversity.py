@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pymilvus")  # the retrieval package imports the Milvus client on load
+
+from retrieval.diversity import mmr
+
+
+def test_mmr_with_lambda_one_is_plain_top_k():
+    relevance = [0.2, 0.9, 0.5, 0.7]
+    vectors = np.eye(4)
+    assert mmr(relevance, vectors, 3, 1.0) == [1, 3, 2]
+
+
+def test_mmr_skips_near_duplicates():
+    # 0 and 1 are the same ticket; 2 is less relevant but different
+    vectors = [[1.0, 0.0], [1.0, 0.01], [0.0, 1.0]]
+    assert mmr([0.9, 0.89, 0.6], vectors, 2, 0.5) == [0, 2]
+
+
+def test_mmr_never_picks_a_candidate_twice():
+    vectors = np.random.default_rng(0).normal(size=(10, 8))
+    picked = mmr(np.linspace(1, 0, 10), vectors, 10, 0.3)
+    assert sorted(picked) == list(range(10))
+
+
+def test_mmr_handles_short_and_empty_inputs():
+    assert mmr([0.5], [[1.0, 0.0]], 3, 0.7) == [0]
+    assert mmr([], [], 3, 0.7) == []
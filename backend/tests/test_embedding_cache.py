@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pymilvus")  # the retrieval package imports the Milvus client on load
+
+from retrieval.embedding_cache import KEY_BYTES, DiskEmbeddingCache
+
+
+def _cache(directory):
+    return DiskEmbeddingCache("test-model", backend="torch", directory=str(directory))
+
+
+def test_put_and_lookup_survive_reopening(tmp_path):
+    cache = _cache(tmp_path)
+    keys = [cache.key(text) for text in ("a", "b", "c")]
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    cache.put(keys, vectors)
+    cache.put(keys[:1], vectors[:1] + 1)  # already cached, not appended again
+
+    reopened = _cache(tmp_path)
+    rows = reopened.lookup(keys + [reopened.key("d")])
+    assert rows.tolist() == [0, 1, 2, -1]
+    np.testing.assert_array_equal(reopened.vectors(rows[:3]), vectors)
+    assert reopened.count == 3
+    assert (reopened.hits, reopened.misses) == (3, 1)
+
+
+def test_keys_depend_on_model_and_backend(tmp_path):
+    a = DiskEmbeddingCache("model-a", backend="torch", directory=str(tmp_path))
+    b = DiskEmbeddingCache("model-b", backend="torch", directory=str(tmp_path))
+    c = DiskEmbeddingCache("model-a", backend="onnx", directory=str(tmp_path))
+    assert len({a.key("text"), b.key("text"), c.key("text")}) == 3
+    assert len(a.key("text")) == KEY_BYTES
+
+
+@pytest.mark.parametrize("torn_file, extra", [("vectors.f32", 6), ("keys.bin", KEY_BYTES + 3)])
+def test_open_trims_a_torn_tail(tmp_path, torn_file, extra):
+    cache = _cache(tmp_path)
+    keys = [cache.key("a"), cache.key("b")]
+    vectors = np.ones((2, 4), dtype=np.float32)
+    cache.put(keys, vectors)
+    # An append interrupted part way through one of the two files
+    with open(cache._file(torn_file), "ab") as f:
+        f.write(b"\x01" * extra)
+
+    reopened = _cache(tmp_path)
+    assert reopened.count == 2
+    assert (tmp_path / "test-model-torch" / "vectors.f32").stat().st_size == 2 * 4 * 4
+    assert (tmp_path / "test-model-torch" / "keys.bin").stat().st_size == 2 * KEY_BYTES
+    reopened.put([reopened.key("c")], np.full((1, 4), 2, dtype=np.float32))
+    assert reopened.lookup([reopened.key("c")]).tolist() == [2]
+    np.testing.assert_array_equal(reopened.vectors([2]), [[2, 2, 2, 2]])
+
+
+def test_put_rejects_another_dimension(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put([cache.key("a")], np.ones((1, 4), dtype=np.float32))
+    with pytest.raises(ValueError):
+        cache.put([cache.key("b")], np.ones((1, 3), dtype=np.float32))
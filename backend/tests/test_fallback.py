@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pymilvus")  # the retrieval package imports the Milvus client on load
+
+from retrieval.fallback import FallbackIndex, build_graph, export_fallback_index
+
+
+@pytest.fixture(autouse=True)
+def fallback_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("RETRIEVAL_FALLBACK_DIR", str(tmp_path))
+
+
+def test_export_round_trips_ids_and_columns():
+    vectors = np.eye(3, dtype=np.float32)
+    columns = {"number": ["INC1", "INC2", "INC3"], "notes": ['line one\\n"quoted"', "é", None]}
+    index = FallbackIndex(export_fallback_index("tickets", vectors, columns, ids=[11, 12, 13]))
+
+    assert list(index.ids) == [11, 12, 13]
+    assert index.rows([13, 99]) == [2, -1]
+    assert index.record(1) == {"number": "INC2", "notes": "é"}
+    assert index.search([0, 1, 0], k=1, fields=["number"]) == [(12, pytest.approx(1.0), {"number": "INC2"})]
+
+
+def test_filters_on_list_valued_columns():
+    vectors = np.eye(3, dtype=np.float32)
+    columns = {"tags": [["vpn", "network"], ["disk"], ["vpn", "network"]], "state": ["New", "Closed", "New"]}
+    index = FallbackIndex(export_fallback_index("tagged", vectors, columns))
+
+    hits = index.search([1, 1, 1], k=3, filters={"tags": [["disk"]]})
+    assert [hit_id for hit_id, _, _ in hits] == [1]
+    hits = index.search([1, 1, 1], k=3, filters={"state": "New", "tags": {"ne": ["disk"]}})
+    assert sorted(hit_id for hit_id, _, _ in hits) == [0, 2]
+
+
+def test_graph_search_finds_the_nearest_vectors():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(400, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = FallbackIndex(export_fallback_index("graph", vectors, {"row": list(range(400))}, kind="graph"))
+
+    for query in vectors[:20]:
+        exact = np.argsort(-(vectors @ query))[:5].tolist()
+        assert [hit_id for hit_id, _, _ in index.search(query, k=5, ef=64)] == exact
+
+
+@pytest.mark.parametrize("exact_below", [10_000, 0])
+def test_build_graph_lists_neighbours_without_self(exact_below):
+    vectors = np.random.default_rng(1).normal(size=(300, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    graph = build_graph(vectors, degree=8, exact_below=exact_below)
+
+    assert graph.shape == (300, 16)
+    assert not (graph == np.arange(300)[:, None]).any()
+    truth = np.argsort(-(vectors @ vectors.T), axis=1)[:, 1:9]
+    recall = np.mean([len(set(row[:8]) & set(expected)) / 8 for row, expected in zip(graph.tolist(), truth.tolist())])
+    assert recall > 0.9
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("pymilvus")  # the retrieval package imports the Milvus client on load
+
+from retrieval.filters import compile_filters, incident_filters, matches
+
+
+def test_compile_equality_membership_and_operators():
+    expr = compile_filters({
+        "configuration_item": "SAP ERP",
+        "category": ["Network", "Database"],
+        "state": {"ne": "Closed"},
+        "priority": None,
+    })
+    assert expr == 'configuration_item == "SAP ERP" and category in ["Network", "Database"] and state != "Closed"'
+
+
+def test_compile_passes_strings_through_and_drops_empty_filters():
+    assert compile_filters('state == "New"') == 'state == "New"'
+    assert compile_filters(None) is None
+    assert compile_filters({}) is None
+    assert compile_filters({"state": None}) is None
+
+
+def test_compile_normalises_date_bounds():
+    expr = compile_filters({"opened": {"gte": "01/15/2025", "lte": "2025-03-31"}})
+    assert expr == 'opened >= "2025-01-15T00:00:00" and opened <= "2025-03-31T23:59:59"'
+
+
+def test_compile_escapes_quotes():
+    assert compile_filters({"short_description": 'say "hi"\\'}) == 'short_description == "say \\"hi\\"\\\\"'
+
+
+def test_compile_rejects_bad_fields_and_operators():
+    with pytest.raises(ValueError):
+        compile_filters({"state; drop": "x"})
+    with pytest.raises(ValueError):
+        compile_filters({"state": "New"}, fields=["category"])
+    with pytest.raises(ValueError):
+        compile_filters({"state": {"like": "New"}})
+
+
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        ({"state": "New"}, True),
+        ({"state": "Closed"}, False),
+        ({"state": {"not_in": ["Closed", "Resolved"]}}, True),
+        ({"category": ["Network", "Database"]}, True),
+        ({"opened": {"gte": "2025-01-01", "lte": "2025-01-15"}}, True),
+        ({"opened": {"lte": "2025-01-14"}}, False),
+        ({"priority": {"gt": 2}}, False),
+        ({"missing": {"gt": 2}}, False),
+        ({"state": None}, True),
+        (None, True),
+    ],
+)
+def test_matches_agrees_with_compiled_semantics(filters, expected):
+    record = {"state": "New", "category": "Network", "opened": "2025-01-15T10:30:00", "priority": 2}
+    assert matches(record, filters) is expected
+
+
+def test_matches_rejects_raw_expressions():
+    with pytest.raises(ValueError):
+        matches({"state": "New"}, 'state == "New"')
+
+
+def test_incident_filters_exclude_closed_unless_state_given():
+    assert incident_filters(exclude_closed=True) == {"state": {"not_in": ["Closed", "Resolved", "Canceled"]}}
+    assert incident_filters(state="New", exclude_closed=True) == {"state": "New"}
@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip("pymilvus")  # the retrieval package imports the Milvus client on load
+
+from retrieval.hybrid import rrf_fuse
+
+
+def test_rrf_scores_sum_reciprocal_ranks():
+    fused = dict(rrf_fuse([["a", "b"], ["b", "c"]], k=60))
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["c"] == pytest.approx(1 / 62)
+
+
+def test_rrf_ranks_documents_found_by_both_legs_first():
+    fused = rrf_fuse([["dense-only", "both"], ["sparse-only", "both"]])
+    assert fused[0][0] == "both"
+    assert [doc for doc, _ in fused[1:]] == ["dense-only", "sparse-only"]
+
+
+def test_rrf_of_nothing_is_empty():
+    assert rrf_fuse([]) == []
+    assert rrf_fuse([[], []]) == []
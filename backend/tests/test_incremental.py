@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pymilvus")  # the retrieval package imports the Milvus client on load
+
+from retrieval.incremental import HASH_FIELD, IncrementalSync, content_hash
+
+
+def test_content_hash_ignores_key_order_and_the_stored_hash():
+    row = {"number": "INC1", "state": "New"}
+    reordered = {"state": "New", "number": "INC1", HASH_FIELD: "stale"}
+    assert content_hash(row, "text") == content_hash(reordered, "text")
+
+
+def test_content_hash_changes_with_row_or_text():
+    row = {"number": "INC1", "state": "New"}
+    assert content_hash(row, "text") != content_hash(row, "other text")
+    assert content_hash(row, "text") != content_hash({**row, "state": "Closed"}, "text")
+
+
+def _sync(existing):
+    # Only the schema is read when nothing has to be loaded from Milvus
+    collection = SimpleNamespace(schema=SimpleNamespace(primary_field=SimpleNamespace(name="pk")))
+    sync = IncrementalSync(collection, "number", incremental=False)
+    sync.existing = existing
+    return sync
+
+
+def _normalize(record):
+    if not record.get("number"):
+        return None
+    return {"number": record["number"], "state": record["state"]}, record["text"]
+
+
+def test_changes_yields_only_new_and_changed_records():
+    unchanged = {"number": "INC1", "state": "New", "text": "same"}
+    unchanged_hash = content_hash(*_normalize(unchanged))
+    sync = _sync({
+        "INC1": [(101, unchanged_hash)],
+        "INC2": [(102, "old hash")],
+        "INC3": [(103, "gone")],
+    })
+    records = [
+        unchanged,
+        {"number": "INC2", "state": "Closed", "text": "edited"},
+        {"number": "INC4", "state": "New", "text": "brand new"},
+        {"number": "", "state": "New", "text": "no key"},
+    ]
+
+    rows = list(sync.changes(records, _normalize))
+
+    assert [row["number"] for row, _ in rows] == ["INC2", "INC4"]
+    assert all(row[HASH_FIELD] == content_hash(row, text) for row, text in rows)
+    assert sync.kept == [101]
+    assert sync.replaced == {"INC2": [102]}
+    report = sync.report
+    assert (report.inserted, report.updated, report.unchanged, report.skipped) == (1, 1, 1, 1)
+    assert "INC3" not in sync.seen
+
+
+def test_changes_rewrites_keys_with_duplicate_rows():
+    row = {"number": "INC1", "state": "New", "text": "same"}
+    digest = content_hash(*_normalize(row))
+    sync = _sync({"INC1": [(1, digest), (2, digest)]})
+    assert len(list(sync.changes([row], _normalize))) == 1
+    assert sync.replaced == {"INC1": [1, 2]}
+
+
+def test_changes_keeps_the_first_record_of_a_repeated_key():
+    sync = _sync({})
+    records = [{"number": "INC1", "state": "New", "text": "a"}, {"number": "INC1", "state": "Closed", "text": "b"}]
+    rows = list(sync.changes(records, _normalize))
+    assert [row["state"] for row, _ in rows] == ["New"]
+    assert (sync.report.inserted, sync.report.duplicates) == (1, 1)
+
+
+def test_export_with_a_repeated_key_is_unchanged_on_the_next_sync():
+    export = [
+        {"number": "INC1", "state": "New", "text": "first"},
+        {"number": "INC2", "state": "New", "text": "other"},
+        {"number": "INC1", "state": "New", "text": "second"},
+    ]
+    first = _sync({})
+    written = list(first.changes(export, _normalize))
+    # What the first run left in Milvus
+    existing = {row["number"]: [(pk, row[HASH_FIELD])] for pk, (row, _) in enumerate(written)}
+
+    second = _sync(existing)
+    assert list(second.changes(export, _normalize)) == []
+    report = second.report
+    assert (report.inserted, report.updated, report.unchanged, report.duplicates) == (0, 0, 2, 1)
+    assert second.replaced == {}
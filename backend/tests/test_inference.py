@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pymilvus")  # the retrieval package imports the Milvus client on load
+
+from retrieval.inference import weighted_vote
+
+
+def test_weighted_vote_heavier_neighbour_wins():
+    labels = np.array([[0, 1, 1]])
+    weights = np.array([[1.0, 0.2, 0.2]])
+    winners, confidence = weighted_vote(labels, weights, 2)
+    assert winners.tolist() == [0]
+    assert confidence[0] == pytest.approx(1.0 / 1.4)
+
+
+def test_weighted_vote_abstentions_lower_confidence():
+    winners, confidence = weighted_vote(np.array([[1, -1, -1]]), np.ones((1, 3)), 2)
+    assert winners.tolist() == [1]
+    assert confidence[0] == pytest.approx(1 / 3)
+
+
+def test_weighted_vote_all_abstain():
+    winners, confidence = weighted_vote(np.array([[-1, -1]]), np.ones((1, 2)), 3)
+    assert winners.tolist() == [-1]
+    assert confidence.tolist() == [0.0]
+
+
+def test_weighted_vote_rows_are_independent():
+    labels = np.array([[0, 0, 1], [2, 1, 1]])
+    weights = np.ones((2, 3))
+    winners, confidence = weighted_vote(labels, weights, 3)
+    assert winners.tolist() == [0, 1]
+    assert confidence == pytest.approx([2 / 3, 2 / 3])
+
+
+def test_weighted_vote_matches_a_python_loop():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(-1, 4, size=(50, 7))
+    weights = rng.random((50, 7))
+    winners, confidence = weighted_vote(labels, weights, 4)
+    for row in range(50):
+        totals = np.zeros(4)
+        for label, weight in zip(labels[row], weights[row]):
+            if label >= 0:
+                totals[label] += weight
+        if totals.max() > 0:
+            assert winners[row] == totals.argmax()
+            assert confidence[row] == pytest.approx(totals.max() / weights[row].sum())
+        else:
+            assert winners[row] == -1
@@ -0,0 +1,75 @@
+import io
+import json
+
+import pytest
+
+pytest.importorskip("pymilvus")  # the retrieval package imports the Milvus client on load
+
+from retrieval.ingest import _JsonStream, chunk_ranges, read_records
+
+RECORDS = [
+    {"number": "INC0010001", "short_description": "VPN drops é \"quoted\"", "priority": 1500.25},
+    {"number": "INC0010002", "nested": {"tags": ["a", "b"], "empty": []}, "count": 15},
+    {"number": "INC0010003", "flag": True, "none": None, "negative": -3e-5},
+]
+
+
+@pytest.mark.parametrize("block", [1, 2, 3, 7, 64, 1 << 16])
+def test_json_stream_array_at_any_block_size(block):
+    text = json.dumps(RECORDS, indent=1)
+    assert list(_JsonStream(io.StringIO(text), block).array()) == RECORDS
+
+
+@pytest.mark.parametrize("block", [1, 5])
+def test_json_stream_numbers_split_across_blocks(block):
+    numbers = [1, 15, 1500.0, -2.5e10, 123456789]
+    assert list(_JsonStream(io.StringIO(json.dumps(numbers)), block).array()) == numbers
+
+
+def test_json_stream_reports_malformed_input():
+    with pytest.raises(ValueError):
+        list(_JsonStream(io.StringIO('{"a": 1}'), 4).array())
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        json.dumps(RECORDS),
+        json.dumps({"meta": {"exported": "today"}, "records": RECORDS}),
+        "\n".join(json.dumps(record) for record in RECORDS),
+    ],
+)
+@pytest.mark.parametrize("block", [3, 1 << 16])
+def test_read_records_layouts(tmp_path, document, block):
+    path = tmp_path / "export.json"
+    path.write_text(document, encoding="utf-8")
+    assert list(read_records(str(path), block=block)) == RECORDS
+
+
+def test_read_records_single_object(tmp_path):
+    path = tmp_path / "export.json"
+    path.write_text(json.dumps(RECORDS[0]), encoding="utf-8")
+    assert list(read_records(str(path), block=4)) == [RECORDS[0]]
+
+
+def test_chunk_ranges_by_rows():
+    entities = [list(range(10)), ["x"] * 10]
+    assert chunk_ranges(entities, max_rows=4, max_bytes=1 << 20) == [(0, 4), (4, 8), (8, 10)]
+
+
+def test_chunk_ranges_by_bytes():
+    entities = [["a" * 100] * 5]
+    ranges = chunk_ranges(entities, max_rows=100, max_bytes=250)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 5
+    assert all(end - begin <= 2 for begin, end in ranges)
+    assert all(prev_end == begin for (_, prev_end), (begin, _) in zip(ranges, ranges[1:]))
+
+
+def test_chunk_ranges_keeps_an_oversized_row_alone():
+    entities = [["a" * 1000, "b", "c"]]
+    assert chunk_ranges(entities, max_rows=100, max_bytes=10)[0] == (0, 1)
+
+
+def test_chunk_ranges_of_nothing():
+    assert chunk_ranges([[]], max_rows=4, max_bytes=100) == []
+    assert chunk_ranges([], max_rows=4, max_bytes=100) == []
@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pymilvus")  # the retrieval package imports the Milvus client on load
+
+from retrieval import query_cache
+from retrieval.query_cache import QueryEmbeddingCache, normalize_query
+
+
+def test_normalize_query_masks_ticket_numbers():
+    assert normalize_query("  VPN down   since INC0012345 ") == "vpn down since inc#"
+
+
+def test_cached_vector_is_the_embedding_of_its_key(monkeypatch):
+    encoded = []
+
+    def encode(text):
+        encoded.append(text)
+        return np.full(4, len(encoded), dtype=np.float32)
+
+    monkeypatch.setattr(query_cache, "get_batcher", lambda name: SimpleNamespace(encode=encode))
+    cache = QueryEmbeddingCache()
+    first = cache.encode("VPN down since INC0012345", "model")
+    second = cache.encode("vpn down since  INC0099999", "model")
+
+    assert encoded == ["vpn down since inc#"]
+    np.testing.assert_array_equal(first, second)
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pymilvus")  # the retrieval package imports the Milvus client on load
+
+from retrieval import service
+from retrieval.hybrid import SPARSE_FIELD
+from retrieval.semantic_cache import SemanticResultCache
+from retrieval.service import Hit, RetrievalService
+
+
+def _manager():
+    # Just enough of MilvusConnectionManager for a search that never reaches Milvus
+    fields = [SimpleNamespace(name=name) for name in ("number", SPARSE_FIELD)]
+    return SimpleNamespace(
+        has_collection=lambda name: True,
+        schema=lambda name: SimpleNamespace(fields=fields),
+        output_fields=lambda name: ["number"],
+        index_type=lambda name, field_name: "HNSW",
+        partitions=lambda name: ["_default"],
+        loaded_partitions=lambda name: {"_default"},
+    )
+
+
+@pytest.fixture
+def retrieval(monkeypatch, tmp_path):
+    monkeypatch.setenv("RETRIEVAL_STATE_DIR", str(tmp_path))
+    monkeypatch.setenv("RETRIEVAL_FALLBACK", "off")
+    monkeypatch.setenv("TWO_PHASE_FETCH", "off")
+    monkeypatch.setattr(service, "semantic_cache", SemanticResultCache(manager=None))
+    searches = []
+
+    def hybrid_search(collection, text, query_vector, k, expr, output_fields, floor=0.0, partition_names=None):
+        searches.append(text)
+        return [Hit(collection=collection, id=text, score=0.9, fields={"number": text})], True
+
+    retrieval = RetrievalService(manager=_manager(), max_workers=1)
+    monkeypatch.setattr(retrieval, "_hybrid_search", hybrid_search)
+    return retrieval, searches
+
+
+def _search(retrieval, text, mode, vector):
+    hits = retrieval.search_sync(
+        "incident_history", text, k=1, fields=["number"], mode=mode, query_vector=vector, min_score=0, rerank=False
+    )
+    return [hit.id for hit in hits]
+
+
+def test_hybrid_queries_with_other_keywords_are_not_served_from_the_cache(retrieval):
+    retrieval, searches = retrieval
+    vector = np.ones(8, dtype=np.float32)
+    near = vector + np.float32(1e-3)
+
+    assert _search(retrieval, "Disk full on srv-db01", "hybrid", vector) == ["Disk full on srv-db01"]
+    assert _search(retrieval, "Disk full on srv-db02", "hybrid", near) == ["Disk full on srv-db02"]
+    assert searches == ["Disk full on srv-db01", "Disk full on srv-db02"]
+
+
+def test_hybrid_repeats_of_the_same_text_are_cached(retrieval):
+    retrieval, searches = retrieval
+    vector = np.ones(8, dtype=np.float32)
+
+    _search(retrieval, "Disk full on srv-db01", "hybrid", vector)
+    repeat = _search(retrieval, "disk full on  SRV-DB01", "hybrid", vector + np.float32(1e-3))
+    assert repeat == ["Disk full on srv-db01"]
+    assert len(searches) == 1